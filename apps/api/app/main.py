@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import UTC, datetime
 
 from fastapi import Depends, FastAPI, HTTPException, Query, Request
@@ -10,7 +12,7 @@ from starlette.middleware.sessions import SessionMiddleware
 
 from .auth import get_or_create_current_user
 from .db import get_db
-from .models import GoogleAccount
+from .models import GoogleAccount, User
 from .oauth import build_google_flow, fetch_google_userinfo
 from .schemas.messages import AccountMessage
 from .security import TokenEncryptionError, encrypt_refresh_token
@@ -19,12 +21,23 @@ from .services.account_messages_service import (
     AccountMessagesService,
     AccountNotFoundOrNotOwnedError,
     AccountTokenInvalidError,
+    GmailRequestError,
 )
 from .services.gmail_client import GmailClientFactory
 
 
 settings = get_settings()
-app = FastAPI(title="gmail-cleanup API")
+_gmail_client_factory: GmailClientFactory | None = None
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    yield
+    if _gmail_client_factory is not None:
+        await _gmail_client_factory.aclose()
+
+
+app = FastAPI(title="gmail-cleanup API", lifespan=lifespan)
 app.add_middleware(
     SessionMiddleware,
     secret_key=settings.app_session_secret,
@@ -121,6 +134,7 @@ def oauth_google_callback(
 
     db.commit()
     db.refresh(account)
+    evict_gmail_client(account.id)
 
     return RedirectResponse(url="http://localhost:3000/accounts", status_code=302)
 
@@ -158,10 +172,21 @@ def logout(request: Request) -> JSONResponse:
 
 
 def get_gmail_client_factory() -> GmailClientFactory:
-    return GmailClientFactory(
-        client_id=settings.google_client_id,
-        client_secret=settings.google_client_secret,
-    )
+    # One factory per process: its pooled HTTP connections and per-account
+    # limits are shared by every request.
+    global _gmail_client_factory
+    if _gmail_client_factory is None:
+        _gmail_client_factory = GmailClientFactory(
+            client_id=settings.google_client_id,
+            client_secret=settings.google_client_secret,
+        )
+    return _gmail_client_factory
+
+
+def evict_gmail_client(account_id: int) -> None:
+    # Drop the account's cached access token/client after it is deleted or relinked.
+    if _gmail_client_factory is not None:
+        _gmail_client_factory.evict(account_id)
 
 
 def get_account_messages_service(
@@ -175,20 +200,25 @@ def get_account_messages_service(
     )
 
 
+def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+    # A sync dependency, so FastAPI runs the lookup on its threadpool.
+    return get_or_create_current_user(request, db)
+
+
 @app.get("/accounts/{account_id}/messages", response_model=list[AccountMessage])
-def list_account_messages(
+async def list_account_messages(
     account_id: int,
-    request: Request,
-    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
     service: AccountMessagesService = Depends(get_account_messages_service),
 ) -> list[AccountMessage]:
-    current_user = get_or_create_current_user(request, db)
     try:
-        return service.list_messages(current_user_id=current_user.id, account_id=account_id)
+        return await service.list_messages(current_user_id=current_user.id, account_id=account_id)
     except AccountNotFoundOrNotOwnedError as exc:
         raise HTTPException(status_code=404, detail="Account not found") from exc
     except AccountTokenInvalidError as exc:
         raise HTTPException(status_code=400, detail="Account token invalid") from exc
+    except GmailRequestError as exc:
+        raise HTTPException(status_code=502, detail="Gmail request failed") from exc
 
 
 @app.delete("/accounts/{account_id}")
@@ -207,4 +237,5 @@ def delete_account(account_id: int, request: Request, db: Session = Depends(get_
 
     db.delete(account)
     db.commit()
+    evict_gmail_client(account_id)
     return {"deleted": True}
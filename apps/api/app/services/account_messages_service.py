@@ -3,6 +3,8 @@ from __future__ import annotations
 from datetime import UTC, datetime
 from email.utils import parsedate_to_datetime
 
+import httpx
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
@@ -20,6 +22,10 @@ class AccountTokenInvalidError(ValueError):
     pass
 
 
+class GmailRequestError(RuntimeError):
+    pass
+
+
 class AccountMessagesService:
     def __init__(
         self,
@@ -32,18 +38,14 @@ class AccountMessagesService:
         self._token_enc_key = token_enc_key
         self._gmail_client_factory = gmail_client_factory
 
-    def list_messages(
+    async def list_messages(
         self,
         *,
         current_user_id: int,
         account_id: int,
     ) -> list[AccountMessage]:
-        account = self._db.execute(
-            select(GoogleAccount).where(
-                GoogleAccount.id == account_id,
-                GoogleAccount.user_id == current_user_id,
-            )
-        ).scalar_one_or_none()
+        # The session is synchronous: query it on the threadpool, not the event loop.
+        account = await run_in_threadpool(self._owned_account, current_user_id, account_id)
         if account is None:
             raise AccountNotFoundOrNotOwnedError("Account not found")
 
@@ -51,17 +53,42 @@ class AccountMessagesService:
             raise AccountTokenInvalidError("Account refresh token is missing.")
 
         try:
-            refresh_token = decrypt_refresh_token(self._token_enc_key, account.token_encrypted)
-        except TokenEncryptionError as exc:
-            raise AccountTokenInvalidError("Account refresh token is invalid.") from exc
+            raw_messages = await self._fetch_messages(account)
+        except GmailClientAuthError:
+            # A cached access token can be revoked before it expires: retry once from scratch.
+            self._gmail_client_factory.evict(account.id)
+            try:
+                raw_messages = await self._fetch_messages(account)
+            except GmailClientAuthError as exc:
+                raise AccountTokenInvalidError("Gmail rejected the account's token.") from exc
+        return [self._to_account_message(m) for m in raw_messages[:10]]
 
+    def _owned_account(self, current_user_id: int, account_id: int) -> GoogleAccount | None:
+        return self._db.execute(
+            select(GoogleAccount).where(
+                GoogleAccount.id == account_id,
+                GoogleAccount.user_id == current_user_id,
+            )
+        ).scalar_one_or_none()
+
+    async def _fetch_messages(self, account: GoogleAccount) -> list[dict]:
         try:
-            gmail_client = self._gmail_client_factory.create(refresh_token=refresh_token)
+            gmail_client = await self._gmail_client_factory.client_for_account(
+                account_id=account.id,
+                token_encrypted=account.token_encrypted,
+                decrypt=lambda token: decrypt_refresh_token(self._token_enc_key, token),
+            )
+        except TokenEncryptionError as exc:
+            raise AccountTokenInvalidError("Account refresh token is invalid.") from exc
         except GmailClientAuthError as exc:
             raise AccountTokenInvalidError("Failed to authenticate Gmail account.") from exc
 
-        raw_messages = gmail_client.list_messages(max_results=10)
-        return [self._to_account_message(m) for m in raw_messages[:10]]
+        try:
+            return await gmail_client.list_messages(max_results=10)
+        except httpx.HTTPStatusError as exc:
+            raise GmailRequestError(f"Gmail returned HTTP {exc.response.status_code}.") from exc
+        except httpx.HTTPError as exc:
+            raise GmailRequestError("Gmail request failed.") from exc
 
     def _to_account_message(self, raw: dict) -> AccountMessage:
         payload = raw.get("payload", {}) or {}
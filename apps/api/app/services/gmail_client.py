@@ -1,17 +1,42 @@
 from __future__ import annotations
 
-from typing import Protocol
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Protocol
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import httpx
 
-from ..oauth import OAUTH_SCOPES
+from gmail_cleanup.concurrency import RATE_LIMIT_REASONS, RETRYABLE_STATUSES, jittered_backoff
+from gmail_cleanup.quota import QuotaScheduler, scheduler_for_account
+
+GMAIL_API_URL = "https://gmail.googleapis.com/gmail/v1/users/me"
+TOKEN_URL = "https://oauth2.googleapis.com/token"
+# Google only compresses responses for clients whose User-Agent mentions gzip.
+USER_AGENT = "gmail-cleanup-api (gzip)"
+METADATA_HEADERS = ["Subject", "From", "Date"]
+# Partial responses: only what AccountMessagesService maps into AccountMessage.
+LIST_FIELDS = "messages/id"
+METADATA_FIELDS = "id,snippet,internalDate,payload/headers"
+
+
+@dataclass(frozen=True)
+class TransportDefaults:
+    max_connections: int = 100
+    max_keepalive_connections: int = 50
+    keepalive_expiry: float = 30.0
+    timeout_seconds: float = 30.0
+    per_account_concurrency: int = 10  # concurrent Gmail calls per linked account
+    max_attempts: int = 5
+    expiry_margin_seconds: float = 300.0  # drop cached access tokens this long before they expire
+
+
+DEFAULTS = TransportDefaults()
 
 
 class GmailClient(Protocol):
-    def list_messages(self, *, max_results: int) -> list[dict]:
+    async def list_messages(self, *, max_results: int) -> list[dict]:
         ...
 
 
@@ -19,55 +44,228 @@ class GmailClientAuthError(ValueError):
     pass
 
 
+def new_async_http(defaults: TransportDefaults = DEFAULTS) -> httpx.AsyncClient:
+    """
+    Pooled keep-alive HTTP client shared by every account's Gmail client.
+    httpx negotiates and decodes gzip itself.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=defaults.max_connections,
+            max_keepalive_connections=defaults.max_keepalive_connections,
+            keepalive_expiry=defaults.keepalive_expiry,
+        ),
+        timeout=defaults.timeout_seconds,
+        headers={"user-agent": USER_AGENT, "accept-encoding": "gzip"},
+    )
+
+
+def _is_retryable(response: httpx.Response) -> bool:
+    if response.status_code in RETRYABLE_STATUSES:
+        return True
+    if response.status_code == 403:
+        body = response.text.lower()
+        return any(reason in body for reason in RATE_LIMIT_REASONS)
+    return False
+
+
 class GmailApiClient:
-    def __init__(self, service: object) -> None:
-        self._service = service
-
-    def list_messages(self, *, max_results: int) -> list[dict]:
-        listing = (
-            self._service.users()
-            .messages()
-            .list(userId="me", maxResults=max_results)
-            .execute()
+    """
+    Async Gmail REST client. Calls share the factory's pooled connection,
+    run under the account's semaphore and are paced by its quota scheduler;
+    429/5xx/rate-limit 403 responses are retried with jittered backoff.
+    """
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        access_token: str,
+        *,
+        semaphore: asyncio.Semaphore,
+        scheduler: Optional[QuotaScheduler] = None,
+        max_attempts: int = DEFAULTS.max_attempts,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self._http = http
+        self._headers = {"authorization": f"Bearer {access_token}"}
+        self._semaphore = semaphore
+        self._scheduler = scheduler
+        self._max_attempts = max_attempts
+        self._sleep = sleep
+
+    async def list_messages(self, *, max_results: int) -> list[dict]:
+        listing = await self._get(
+            "messages", "gmail.users.messages.list", {"maxResults": max_results, "fields": LIST_FIELDS}
         )
         refs = listing.get("messages", []) or []
-        messages: list[dict] = []
-        for ref in refs:
-            message_id = ref.get("id")
-            if not message_id:
-                continue
-            message = (
-                self._service.users()
-                .messages()
-                .get(
-                    userId="me",
-                    id=message_id,
-                    format="metadata",
-                    metadataHeaders=["Subject", "From", "Date"],
+        message_ids = [ref["id"] for ref in refs if ref.get("id")]
+        return list(await asyncio.gather(*(self._get_metadata(mid) for mid in message_ids)))
+
+    async def _get_metadata(self, message_id: str) -> dict:
+        params = [
+            ("format", "metadata"),
+            ("fields", METADATA_FIELDS),
+            *(("metadataHeaders", h) for h in METADATA_HEADERS),
+        ]
+        return await self._get(f"messages/{message_id}", "gmail.users.messages.get", params)
+
+    async def _get(self, path: str, method_id: str, params) -> dict:
+        attempt = 0
+        while True:
+            attempt += 1
+            async with self._semaphore:
+                if self._scheduler is not None:
+                    wait = self._scheduler.reserve(method_id)
+                    if wait > 0:
+                        await self._sleep(wait)
+                response = await self._http.get(
+                    f"{GMAIL_API_URL}/{path}", params=params, headers=self._headers
                 )
-                .execute()
-            )
-            messages.append(message)
-        return messages
+
+            if response.status_code == 401:
+                raise GmailClientAuthError("Gmail rejected the access token.")
+            if _is_retryable(response) and attempt < self._max_attempts:
+                await self._sleep(jittered_backoff(attempt))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+
+@dataclass(frozen=True)
+class _CachedClient:
+    client: GmailClient
+    token_encrypted: str
+    expires_at: float
 
 
 class GmailClientFactory:
-    def __init__(self, *, client_id: str, client_secret: str) -> None:
+    """
+    Creates Gmail clients on one shared, pooled async HTTP client.
+    Keep a single factory per process (see app.main.get_gmail_client_factory)
+    and close it on shutdown.
+
+    client_for_account() caches each account's client until shortly before
+    its access token expires. The cache is keyed by the stored encrypted
+    token, so a hit skips both decryption and the token exchange, and
+    concurrent misses for one account share a single refresh.
+    """
+
+    def __init__(
+        self,
+        *,
+        client_id: str,
+        client_secret: str,
+        http: Optional[httpx.AsyncClient] = None,
+        defaults: TransportDefaults = DEFAULTS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
         self._client_id = client_id
         self._client_secret = client_secret
+        self._http = http
+        self._defaults = defaults
+        self._clock = clock
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._clients: dict[int, _CachedClient] = {}
+        self._refresh_locks: dict[int, asyncio.Lock] = {}
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = new_async_http(self._defaults)
+        return self._http
+
+    async def create(self, *, refresh_token: str) -> GmailClient:
+        client, _expires_in = await self._create(refresh_token)
+        return client
+
+    async def client_for_account(
+        self,
+        *,
+        account_id: int,
+        token_encrypted: str,
+        decrypt: Callable[[str], str],
+    ) -> GmailClient:
+        """
+        Return the account's cached client, or build one (decrypting the
+        refresh token and exchanging it for an access token) on a miss.
+        """
+        cached = self._cached(account_id, token_encrypted)
+        if cached is not None:
+            return cached
+
+        lock = self._refresh_locks.setdefault(account_id, asyncio.Lock())
+        async with lock:
+            # Another request may have refreshed while this one waited.
+            cached = self._cached(account_id, token_encrypted)
+            if cached is not None:
+                return cached
+            client, expires_in = await self._create(decrypt(token_encrypted))
+            self._clients[account_id] = _CachedClient(
+                client=client,
+                token_encrypted=token_encrypted,
+                expires_at=self._clock() + expires_in,
+            )
+            return client
+
+    def evict(self, account_id: int) -> None:
+        """
+        Forget an account's cached client (account deleted, token replaced or rejected).
+        """
+        self._clients.pop(account_id, None)
+
+    def _cached(self, account_id: int, token_encrypted: str) -> Optional[GmailClient]:
+        entry = self._clients.get(account_id)
+        if entry is None:
+            return None
+        if entry.token_encrypted != token_encrypted:
+            self._clients.pop(account_id, None)
+            return None
+        if entry.expires_at - self._clock() <= self._defaults.expiry_margin_seconds:
+            self._clients.pop(account_id, None)
+            return None
+        return entry.client
+
+    async def _create(self, refresh_token: str) -> tuple[GmailClient, float]:
+        access_token, expires_in = await self._refresh(refresh_token)
+        # One quota budget and one concurrency cap per linked account, shared across requests.
+        account_key = hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()
+        client = GmailApiClient(
+            self.http,
+            access_token,
+            semaphore=self._semaphore_for(account_key),
+            scheduler=scheduler_for_account(f"api:{account_key}"),
+            max_attempts=self._defaults.max_attempts,
+        )
+        return client, expires_in
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
-    def create(self, *, refresh_token: str) -> GmailClient:
+    def _semaphore_for(self, account_key: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(account_key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._defaults.per_account_concurrency)
+            self._semaphores[account_key] = semaphore
+        return semaphore
+
+    async def _refresh(self, refresh_token: str) -> tuple[str, float]:
         try:
-            creds = Credentials(
-                token=None,
-                refresh_token=refresh_token,
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=self._client_id,
-                client_secret=self._client_secret,
-                scopes=OAUTH_SCOPES,
+            response = await self.http.post(
+                TOKEN_URL,
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": refresh_token,
+                    "client_id": self._client_id,
+                    "client_secret": self._client_secret,
+                },
             )
-            creds.refresh(Request())
-            service = build("gmail", "v1", credentials=creds, cache_discovery=False)
-            return GmailApiClient(service)
-        except (HttpError, ValueError) as exc:
+        except httpx.HTTPError as exc:
             raise GmailClientAuthError("Failed to authenticate Gmail client.") from exc
+
+        body = response.json() if response.status_code == 200 else {}
+        access_token = body.get("access_token")
+        if not access_token:
+            raise GmailClientAuthError("Failed to authenticate Gmail client.")
+        return access_token, float(body.get("expires_in", 3600))
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+# Kept free of Google client imports so commands that only inspect local files
+# (doctor, config, --help) start quickly.
+
+SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]  # safe for later (trash/label), still dry-run now
+
+
+def _app_data_dir() -> Path:
+    """
+    Store token outside the repo to keep public repo clean.
+    Windows: %APPDATA%/gmail-cleanup/
+    macOS/Linux: ~/.config/gmail-cleanup/
+    """
+    appdata = os.environ.get("APPDATA")
+    if appdata:
+        return Path(appdata) / "gmail-cleanup"
+    return Path.home() / ".config" / "gmail-cleanup"
+
+
+def credentials_path() -> Path:
+    return _app_data_dir() / "credentials.json"
+
+
+def token_path() -> Path:
+    return _app_data_dir() / "token.json"
+
+
+def ensure_app_dir() -> Path:
+    d = _app_data_dir()
+    d.mkdir(parents=True, exist_ok=True)
+    return d
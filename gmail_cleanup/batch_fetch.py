@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from gmail_cleanup.concurrency import AdaptiveConcurrency, is_retryable, jittered_backoff
+from gmail_cleanup.quota import reserve_batch
+
+
+# Partial responses for metadata gets. METADATA_FIELDS is everything the local
+# cache stores; HEADER_FIELDS is enough for callers that only read headers.
+METADATA_FIELDS = "id,threadId,labelIds,snippet,internalDate,sizeEstimate,payload/headers"
+HEADER_FIELDS = "id,payload/headers"
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FetchDefaults:
+    batch_size: int = 100  # Gmail batch endpoint accepts at most 100 calls per request
+    max_attempts: int = 5
+    backoff_seconds: float = 1.0
+
+
+DEFAULTS = FetchDefaults()
+
+
+def iter_message_metadata(
+    service: Resource,
+    message_ids: Iterable[str],
+    headers: Sequence[str],
+    batch_size: int = DEFAULTS.batch_size,
+    max_attempts: int = DEFAULTS.max_attempts,
+    backoff_seconds: float = DEFAULTS.backoff_seconds,
+    sleep: Callable[[float], None] = time.sleep,
+    controller: Optional[AdaptiveConcurrency] = None,
+    fields: str = METADATA_FIELDS,
+) -> Iterator[dict]:
+    """
+    Yield messages().get(format="metadata") responses for message IDs,
+    grouping the calls into Gmail HTTP batch requests.
+
+    Args:
+      service: Gmail API service
+      message_ids: any iterable of message IDs (consumed lazily)
+      headers: metadataHeaders to request
+      batch_size: calls per HTTP batch (max 100)
+      max_attempts: attempts per sub-request before giving up
+      backoff_seconds: base of the jittered exponential delay between retry rounds
+      controller: optional AIMD controller; when given, it sets how many gets
+        go into each batch and is told about throttled and successful rounds
+      fields: partial-response mask for each get
+
+    Yields:
+      message resources, in the same order as message_ids; messages deleted
+      since they were listed (404) are skipped
+    """
+    chunk: list[str] = []
+
+    for msg_id in message_ids:
+        chunk.append(msg_id)
+        if len(chunk) >= _batch_size(batch_size, controller):
+            yield from _fetch_chunk(
+                service, chunk, headers, max_attempts, backoff_seconds, sleep, controller, fields
+            )
+            chunk = []
+
+    if chunk:
+        yield from _fetch_chunk(
+            service, chunk, headers, max_attempts, backoff_seconds, sleep, controller, fields
+        )
+
+
+def _batch_size(batch_size: int, controller: Optional[AdaptiveConcurrency]) -> int:
+    size = min(batch_size, DEFAULTS.batch_size)
+    if controller is not None:
+        size = min(size, controller.limit)
+    return max(1, size)
+
+
+def _fetch_chunk(
+    service: Resource,
+    chunk: list[str],
+    headers: Sequence[str],
+    max_attempts: int,
+    backoff_seconds: float,
+    sleep: Callable[[float], None],
+    controller: Optional[AdaptiveConcurrency],
+    fields: str = METADATA_FIELDS,
+) -> list[dict]:
+    """
+    Fetch one batch worth of messages. Only the sub-requests that failed with a
+    retryable error are re-sent, and a retryable failure of the whole batch
+    request re-sends all of them, with the same backoff. 404s (deleted since
+    listing) are skipped; any other error is raised immediately.
+    """
+    results: dict[int, dict] = {}
+    missing = 0
+    pending = list(range(len(chunk)))
+    attempt = 0
+
+    while pending:
+        attempt += 1
+        failures: dict[int, BaseException] = {}
+
+        def _on_response(request_id: str, response: dict, exception: BaseException | None) -> None:
+            idx = int(request_id)
+            if exception is None:
+                results[idx] = response
+            else:
+                failures[idx] = exception
+
+        batch = service.new_batch_http_request(callback=_on_response)
+        requests = []
+        for idx in pending:
+            request = service.users().messages().get(
+                userId="me",
+                id=chunk[idx],
+                format="metadata",
+                metadataHeaders=list(headers),
+                fields=fields,
+            )
+            batch.add(request, request_id=str(idx))
+            requests.append(request)
+        reserve_batch(requests)
+        try:
+            batch.execute()
+        except HttpError as exc:
+            if not is_retryable(exc):
+                raise
+            failures = {idx: exc for idx in pending if idx not in results}
+
+        for idx, exc in list(failures.items()):
+            if isinstance(exc, HttpError) and exc.resp.status == 404:
+                missing += 1
+                del failures[idx]
+            elif not is_retryable(exc):
+                raise exc
+        if controller is not None:
+            if failures:
+                controller.on_throttle()
+            else:
+                controller.on_success(len(requests))
+        if failures and attempt >= max_attempts:
+            raise next(iter(failures.values()))
+
+        pending = sorted(failures)
+        if pending:
+            sleep(jittered_backoff(attempt, base=backoff_seconds))
+
+    if missing:
+        log.warning("Skipped %d message(s) deleted since they were listed", missing)
+    return [results[idx] for idx in range(len(chunk)) if idx in results]
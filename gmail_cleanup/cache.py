@@ -0,0 +1,456 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from gmail_cleanup.batch_fetch import HEADER_FIELDS, iter_message_metadata
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+from gmail_cleanup.appdata import _app_data_dir
+from gmail_cleanup.gmail_iter import iter_message_ids
+from gmail_cleanup.query_plan import plan_query
+
+CACHE_HEADERS = ["From", "To", "Subject", "Date"]
+# A full sync lists messages like a search does, which leaves out spam and trash.
+EXCLUDED_LABELS = {"SPAM", "TRASH"}
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+# Partial response for history.list: the IDs and label lists replayed below.
+HISTORY_FIELDS = (
+    "history(messagesAdded/message/id,messagesDeleted/message/id,"
+    "labelsAdded/message(id,labelIds),labelsRemoved/message(id,labelIds)),"
+    "historyId,nextPageToken"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    label_ids TEXT,
+    internal_date INTEGER,
+    size_estimate INTEGER,
+    from_addr TEXT,
+    to_addr TEXT,
+    subject TEXT,
+    date TEXT,
+    snippet TEXT
+);
+CREATE TABLE IF NOT EXISTS message_labels (
+    label_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    PRIMARY KEY (label_id, message_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS message_labels_by_message ON message_labels (message_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COLUMNS = "id, thread_id, label_ids, internal_date, size_estimate, from_addr, to_addr, subject, date, snippet"
+
+
+def cache_path() -> Path:
+    return _app_data_dir() / "cache.sqlite3"
+
+
+class MessageCache:
+    """
+    Local SQLite store of message metadata (no bodies), kept current with
+    users.history.list.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or cache_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._backfill_label_index()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "MessageCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @property
+    def history_id(self) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'history_id'").fetchone()
+        return row[0] if row else None
+
+    @history_id.setter
+    def history_id(self, value: Optional[str]) -> None:
+        with self._db:
+            if value is None:
+                self._db.execute("DELETE FROM meta WHERE key = 'history_id'")
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('history_id', ?)", (str(value),)
+                )
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM messages")
+            self._db.execute("DELETE FROM message_labels")
+            self._db.execute("DELETE FROM meta")
+
+    def upsert(self, msgs: Iterable[dict]) -> int:
+        rows = [_to_row(m) for m in msgs]
+        with self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO messages ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._index_labels({row[0]: row[2].split() for row in rows})
+        return len(rows)
+
+    def delete(self, ids: Iterable[str]) -> int:
+        params = [(i,) for i in ids]
+        with self._db:
+            cur = self._db.executemany("DELETE FROM messages WHERE id = ?", params)
+            deleted = cur.rowcount
+            self._db.executemany("DELETE FROM message_labels WHERE message_id = ?", params)
+        return deleted
+
+    def update_labels(self, labels_by_id: dict[str, list[str]]) -> None:
+        with self._db:
+            self._db.executemany(
+                "UPDATE messages SET label_ids = ? WHERE id = ?",
+                [(" ".join(labels), mid) for mid, labels in labels_by_id.items()],
+            )
+            self._index_labels(labels_by_id)
+
+    def ids_with_labels(self, label_ids: Sequence[str], limit: int = 0) -> list[str]:
+        """
+        IDs of cached messages carrying every label in `label_ids`, newest
+        first like messages.list, read from the label index.
+        """
+        sql, params = self._labels_query(label_ids)
+        if limit:
+            sql, params = f"{sql} LIMIT ?", [*params, limit]
+        return [row[0] for row in self._db.execute(sql, params)]
+
+    def count_with_labels(self, label_ids: Sequence[str]) -> int:
+        sql, params = self._labels_query(label_ids)
+        return self._db.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+    def _labels_query(self, label_ids: Sequence[str]) -> tuple[str, list]:
+        marks = ",".join("?" * len(label_ids))
+        sql = (
+            "SELECT m.id FROM message_labels l JOIN messages m ON m.id = l.message_id "
+            f"WHERE l.label_id IN ({marks}) GROUP BY m.id HAVING COUNT(*) = ? "
+            "ORDER BY m.internal_date DESC, m.id DESC"
+        )
+        return sql, [*label_ids, len(label_ids)]
+
+    def _index_labels(self, labels_by_id: dict[str, list[str]]) -> None:
+        self._db.executemany(
+            "DELETE FROM message_labels WHERE message_id = ?", [(mid,) for mid in labels_by_id]
+        )
+        self._db.executemany(
+            "INSERT OR IGNORE INTO message_labels (label_id, message_id) VALUES (?, ?)",
+            [(label, mid) for mid, labels in labels_by_id.items() for label in labels],
+        )
+
+    def _backfill_label_index(self) -> None:
+        # Caches written before the label index existed only have messages.label_ids.
+        (missing,) = self._db.execute(
+            "SELECT EXISTS (SELECT 1 FROM messages) AND NOT EXISTS (SELECT 1 FROM message_labels)"
+        ).fetchone()
+        if missing:
+            with self._db:
+                rows = self._db.execute("SELECT id, label_ids FROM messages").fetchall()
+                self._index_labels({mid: (labels or "").split() for mid, labels in rows})
+
+    def contains(self, ids: Iterable[str]) -> set[str]:
+        found: set[str] = set()
+        for chunk in _chunks(list(ids), 500):
+            marks = ",".join("?" * len(chunk))
+            found.update(r[0] for r in self._db.execute(f"SELECT id FROM messages WHERE id IN ({marks})", chunk))
+        return found
+
+    def get_many(self, ids: Sequence[str]) -> dict[str, dict]:
+        """
+        Return cached messages keyed by ID, shaped like metadata API responses.
+        """
+        found: dict[str, dict] = {}
+        for chunk in _chunks(list(ids), 500):
+            marks = ",".join("?" * len(chunk))
+            for row in self._db.execute(f"SELECT {_COLUMNS} FROM messages WHERE id IN ({marks})", chunk):
+                found[row[0]] = _to_message(row)
+        return found
+
+
+def _chunks(items: list[str], size: int) -> Iterator[list[str]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _to_row(msg: dict) -> tuple:
+    headers = {
+        h.get("name", "").lower(): h.get("value", "")
+        for h in msg.get("payload", {}).get("headers", [])
+    }
+    return (
+        msg["id"],
+        msg.get("threadId"),
+        " ".join(msg.get("labelIds", [])),
+        int(msg.get("internalDate", 0) or 0),
+        int(msg.get("sizeEstimate", 0) or 0),
+        headers.get("from", ""),
+        headers.get("to", ""),
+        headers.get("subject", ""),
+        headers.get("date", ""),
+        msg.get("snippet", ""),
+    )
+
+
+def _to_message(row: tuple) -> dict:
+    mid, thread_id, label_ids, internal_date, size_estimate, frm, to, subject, date, snippet = row
+    return {
+        "id": mid,
+        "threadId": thread_id,
+        "labelIds": label_ids.split() if label_ids else [],
+        "internalDate": str(internal_date),
+        "sizeEstimate": size_estimate,
+        "snippet": snippet,
+        "payload": {
+            "headers": [
+                {"name": "From", "value": frm},
+                {"name": "To", "value": to},
+                {"name": "Subject", "value": subject},
+                {"name": "Date", "value": date},
+            ]
+        },
+    }
+
+
+@dataclass(frozen=True)
+class SyncResult:
+    mode: str  # "full" or "incremental"
+    added: int
+    deleted: int
+    relabeled: int
+    history_id: str
+
+
+def full_sync(
+    service: Resource,
+    cache: MessageCache,
+    controller: Optional[AdaptiveConcurrency] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+    list_workers: int = 1,
+) -> SyncResult:
+    """
+    Replace the cache with metadata for every message in the mailbox. With
+    list_workers > 1 the mailbox is listed in time windows that many at a
+    time (see sharded_iter).
+    """
+    # Read the historyId first: changes made while listing are replayed by the next sync.
+    history_id = str(service.users().getProfile(userId="me", fields="historyId").execute()["historyId"])
+    cache.clear()
+
+    added = 0
+    batch: list[dict] = []
+    if list_workers > 1:
+        # Imported here: sharded_iter plans windows through histogram and
+        # preview, which import this module.
+        from gmail_cleanup.sharded_iter import iter_sharded_ids
+
+        ids = iter_sharded_ids(service, "", workers=list_workers)
+    else:
+        ids = iter_message_ids(service, "")
+    for msg in iter_message_metadata(service, ids, headers=CACHE_HEADERS, controller=controller):
+        batch.append(msg)
+        if len(batch) >= 500:
+            added += cache.upsert(batch)
+            batch = []
+            if on_progress is not None:
+                on_progress(added)
+    added += cache.upsert(batch)
+
+    cache.history_id = history_id
+    return SyncResult(mode="full", added=added, deleted=0, relabeled=0, history_id=history_id)
+
+
+def incremental_sync(
+    service: Resource,
+    cache: MessageCache,
+    controller: Optional[AdaptiveConcurrency] = None,
+) -> SyncResult:
+    """
+    Apply changes since the cache's historyId. Raises HttpError 404 when Gmail
+    no longer has history that old (use sync() to fall back to a full sync).
+    """
+    start = cache.history_id
+    if not start:
+        raise ValueError("Cache has no historyId; run a full sync first.")
+
+    added: set[str] = set()
+    deleted: set[str] = set()
+    labels: dict[str, list[str]] = {}
+    latest = start
+    token: Optional[str] = None
+
+    while True:
+        resp = service.users().history().list(
+            userId="me",
+            startHistoryId=start,
+            historyTypes=HISTORY_TYPES,
+            pageToken=token,
+            fields=HISTORY_FIELDS,
+        ).execute()
+
+        for record in resp.get("history", []):
+            for item in record.get("messagesAdded", []):
+                mid = item["message"]["id"]
+                added.add(mid)
+                deleted.discard(mid)
+            for item in record.get("messagesDeleted", []):
+                mid = item["message"]["id"]
+                deleted.add(mid)
+                added.discard(mid)
+                labels.pop(mid, None)
+            for key in ("labelsAdded", "labelsRemoved"):
+                for item in record.get(key, []):
+                    msg = item["message"]
+                    if msg["id"] not in deleted:
+                        labels[msg["id"]] = msg.get("labelIds", [])
+
+        latest = str(resp.get("historyId", latest))
+        token = resp.get("nextPageToken")
+        if not token:
+            break
+
+    # Mirror the full sync: spam/trash leave the cache, anything else is (re)added.
+    for mid, label_ids in labels.items():
+        if EXCLUDED_LABELS.intersection(label_ids):
+            deleted.add(mid)
+            added.discard(mid)
+    relabeled = {mid: lbls for mid, lbls in labels.items() if mid not in deleted and mid not in added}
+    cached = cache.contains(relabeled)
+    added.update(mid for mid in relabeled if mid not in cached)
+    relabeled = {mid: lbls for mid, lbls in relabeled.items() if mid in cached}
+
+    deleted_n = cache.delete(deleted)
+    cache.update_labels(relabeled)
+
+    # A message added and then deleted again before this sync is gone now;
+    # the fetch skips it (404).
+    msgs = iter_message_metadata(service, sorted(added), headers=CACHE_HEADERS, controller=controller)
+    added_n = cache.upsert(m for m in msgs if not EXCLUDED_LABELS.intersection(m.get("labelIds", [])))
+
+    cache.history_id = latest
+    return SyncResult(
+        mode="incremental",
+        added=added_n,
+        deleted=deleted_n,
+        relabeled=len(relabeled),
+        history_id=latest,
+    )
+
+
+def sync(
+    service: Resource,
+    cache: MessageCache,
+    full: bool = False,
+    controller: Optional[AdaptiveConcurrency] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+    list_workers: int = 1,
+) -> SyncResult:
+    """
+    Incremental sync when the cache has a historyId Gmail still knows,
+    otherwise a full sync.
+    """
+    if not full and cache.history_id:
+        try:
+            return incremental_sync(service, cache, controller=controller)
+        except HttpError as exc:
+            if exc.resp.status != 404:
+                raise
+    return full_sync(
+        service, cache, controller=controller, on_progress=on_progress, list_workers=list_workers
+    )
+
+
+def cached_ids(
+    service: Resource, query: str, cache: Optional[MessageCache], limit: int = 0
+) -> Optional[list[str]]:
+    """
+    IDs matching `query` from the cache's label index, or None when the cache
+    cannot answer it: it was never synced, or the query is more than label
+    filters (see plan_query) or lists Spam/Trash, which the cache leaves out.
+    """
+    if cache is None or not cache.history_id:
+        return None
+    plan = plan_query(service, query)
+    if plan is None or plan.include_spam_trash:
+        return None
+    return cache.ids_with_labels(plan.label_ids, limit=limit)
+
+
+def iter_ids(
+    service: Resource, query: str, cache: Optional[MessageCache] = None, limit: int = 0
+) -> Iterator[str]:
+    """
+    Message IDs matching `query`: from the cache when it can answer (see
+    cached_ids), otherwise listed from Gmail.
+    """
+    ids = cached_ids(service, query, cache, limit=limit)
+    return iter(ids) if ids is not None else iter_message_ids(service, query, limit=limit)
+
+
+def iter_metadata(
+    service: Resource,
+    message_ids: Iterable[str],
+    headers: Sequence[str],
+    cache: Optional[MessageCache] = None,
+    controller: Optional[AdaptiveConcurrency] = None,
+    fields: str = HEADER_FIELDS,
+) -> Iterator[dict]:
+    """
+    Metadata for message IDs, in order. Without a cache this is the batched
+    fetch engine, asking only for `fields`; with one, cached messages are read
+    locally and only misses are fetched (and stored, with every cached field).
+    Cached messages carry CACHE_HEADERS only.
+    """
+    if cache is None:
+        yield from iter_message_metadata(
+            service, message_ids, headers=headers, controller=controller, fields=fields
+        )
+        return
+
+    chunk: list[str] = []
+    for mid in message_ids:
+        chunk.append(mid)
+        if len(chunk) >= 500:
+            yield from _read_through(service, cache, chunk, controller)
+            chunk = []
+    if chunk:
+        yield from _read_through(service, cache, chunk, controller)
+
+
+def _read_through(
+    service: Resource,
+    cache: MessageCache,
+    ids: list[str],
+    controller: Optional[AdaptiveConcurrency],
+) -> list[dict]:
+    found = cache.get_many(ids)
+    missing = [mid for mid in ids if mid not in found]
+    if missing:
+        fetched = list(iter_message_metadata(service, missing, headers=CACHE_HEADERS, controller=controller))
+        cache.upsert(fetched)
+        found.update((m["id"], m) for m in fetched)
+    return [found[mid] for mid in ids if mid in found]
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+from gmail_cleanup.appdata import _app_data_dir
+from gmail_cleanup.gmail_iter import DEFAULTS as ITER_DEFAULTS, MessagePage, iter_pages
+from gmail_cleanup.write_batch import DEFAULTS as WRITE_DEFAULTS, ChunkResult, WriteBatcher
+
+# Operations whose writes remove messages from their own query (trash moves
+# messages out of `label:x`, label-clear removes `x`). Page tokens recorded
+# against a shrinking result set would skip messages, so these resume by
+# re-listing from the first page and skipping processed IDs instead.
+SHRINKING_OPERATIONS = {"trash", "label-clear"}
+
+
+def checkpoints_dir() -> Path:
+    return _app_data_dir() / "checkpoints"
+
+
+def query_fingerprint(operation: str, query: str, target: str = "") -> str:
+    raw = "\0".join([operation, query, target]).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+@dataclass
+class Checkpoint:
+    operation: str
+    query: str
+    target: str = ""
+    page_token: Optional[str] = None  # first page not fully committed
+    done: int = 0
+    processed: set[str] = field(default_factory=set)
+    output_bytes: Optional[int] = None  # output file size when `done` was committed
+
+    @property
+    def fingerprint(self) -> str:
+        return query_fingerprint(self.operation, self.query, self.target)
+
+    @property
+    def path(self) -> Path:
+        return checkpoints_dir() / f"{self.fingerprint}.json"
+
+    @property
+    def start_token(self) -> Optional[str]:
+        if self.operation in SHRINKING_OPERATIONS:
+            return None
+        return self.page_token
+
+    def save(self) -> None:
+        """
+        Write the checkpoint atomically (temp file + rename) so a crash while
+        saving never leaves a truncated file behind.
+        """
+        path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "operation": self.operation,
+            "query": self.query,
+            "target": self.target,
+            "fingerprint": self.fingerprint,
+            "page_token": self.page_token,
+            "done": self.done,
+            "processed": encode_ids(self.processed),
+            "output_bytes": self.output_bytes,
+        }
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def open_checkpoint(operation: str, query: str, target: str = "", resume: bool = False) -> Checkpoint:
+    """
+    Return the saved checkpoint for this operation/query/target when resuming,
+    otherwise (or if none was saved) a fresh one.
+    """
+    fresh = Checkpoint(operation=operation, query=query, target=target)
+    if not resume or not fresh.path.exists():
+        return fresh
+
+    try:
+        raw = json.loads(fresh.path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return fresh
+    if raw.get("fingerprint") != fresh.fingerprint:
+        return fresh
+
+    return Checkpoint(
+        operation=operation,
+        query=query,
+        target=target,
+        page_token=raw.get("page_token"),
+        done=int(raw.get("done", 0)),
+        processed=decode_ids(raw.get("processed", "")),
+        output_bytes=raw.get("output_bytes"),
+    )
+
+
+def encode_ids(ids: Iterable[str]) -> str:
+    """
+    Compact encoding for a set of message IDs. Gmail IDs are 16-digit hex, so
+    they are packed as sorted 8-byte integers and zlib-compressed.
+    """
+    ids = sorted(ids)
+    if all(_is_packable(i) for i in ids):
+        packed = b"".join(int(i, 16).to_bytes(8, "big") for i in ids)
+        return "x:" + base64.b64encode(zlib.compress(packed)).decode("ascii")
+    joined = "\n".join(ids).encode("utf-8")
+    return "s:" + base64.b64encode(zlib.compress(joined)).decode("ascii")
+
+
+def decode_ids(encoded: str) -> set[str]:
+    if not encoded:
+        return set()
+    kind, _, payload = encoded.partition(":")
+    raw = zlib.decompress(base64.b64decode(payload))
+    if kind == "x":
+        return {f"{int.from_bytes(raw[i:i + 8], 'big'):016x}" for i in range(0, len(raw), 8)}
+    return set(raw.decode("utf-8").split("\n")) if raw else set()
+
+
+def _is_packable(value: str) -> bool:
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    # Only canonical 16-digit lowercase IDs survive the integer round-trip.
+    return len(value) == 16 and value == value.lower()
+
+
+def resume_pages(
+    service: Resource,
+    query: str,
+    checkpoint: Checkpoint,
+    prefetch: int = ITER_DEFAULTS.prefetch,
+) -> Iterator[MessagePage]:
+    """
+    List pages starting at the checkpoint's page token. If Gmail rejects the
+    saved token before any page was read, fall back to the first page.
+    """
+    token = checkpoint.start_token
+    started = False
+    try:
+        for page in iter_pages(service, query, prefetch=prefetch, page_token=token):
+            started = True
+            yield page
+    except HttpError as exc:
+        if token is None or started or exc.resp.status != 400:
+            raise
+        yield from iter_pages(service, query, prefetch=prefetch)
+
+
+def run_checkpointed(
+    pages: Iterable[MessagePage],
+    write: Callable[[list[str]], None],
+    checkpoint: Checkpoint,
+    limit: int = 0,
+    chunk_size: int = WRITE_DEFAULTS.chunk_size,
+    on_chunk: Optional[Callable[[ChunkResult], None]] = None,
+    controller: Optional[AdaptiveConcurrency] = None,
+    workers: int = 1,
+) -> int:
+    """
+    Write pages through a WriteBatcher, skipping IDs the checkpoint already
+    processed and saving the checkpoint after every committed chunk.
+
+    Args:
+      limit: max messages overall, counting those done in earlier runs (0 = no limit)
+      workers: chunks written at once (see WriteBatcher); the checkpoint only
+        ever covers a contiguous run of written chunks
+
+    Returns:
+      total messages done, including earlier runs
+    """
+    # Pages whose IDs are not all committed yet: [page_token, uncommitted, next_page_token]
+    open_pages: deque[list] = deque()
+
+    def _commit(ids: list[str]) -> None:
+        checkpoint.processed.update(ids)
+        checkpoint.done += len(ids)
+        remaining = len(ids)
+        while remaining and open_pages:
+            head = open_pages[0]
+            taken = min(remaining, head[1])
+            head[1] -= taken
+            remaining -= taken
+            if head[1] == 0:
+                open_pages.popleft()
+                checkpoint.page_token = head[2]
+        checkpoint.save()
+
+    with WriteBatcher(
+        write,
+        chunk_size=chunk_size,
+        on_chunk=on_chunk,
+        controller=controller,
+        workers=workers,
+        on_commit=_commit,
+    ) as batcher:
+        for page in pages:
+            new_ids = [i for i in page.ids if i not in checkpoint.processed]
+            if limit:
+                new_ids = new_ids[: max(0, limit - checkpoint.done - batcher.pending)]
+            if new_ids:
+                open_pages.append([page.page_token, len(new_ids), page.next_page_token])
+                batcher.add(new_ids)
+            elif not open_pages:
+                checkpoint.page_token = page.next_page_token
+            if limit and checkpoint.done + batcher.pending >= limit:
+                break
+
+    return checkpoint.done
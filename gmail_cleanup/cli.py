@@ -1,30 +1,39 @@
 import click
 import typer
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 import platform
+import time
+from typing import TYPE_CHECKING
 
 from rich.console import Console
 from rich.table import Table
-from rich.progress import Progress
 
-from gmail_cleanup.gmail import (
-    get_gmail_service,
+# Gmail, cache, export and config modules pull in google-api-python-client,
+# google-auth and yaml, so commands import them when they run: `--help`,
+# `doctor` and `config` never load them (see tests/cli/test_startup.py).
+from gmail_cleanup.appdata import (
     credentials_path,
     token_path,
     _app_data_dir,
     SCOPES,
 )
-from gmail_cleanup.preview import count_messages, sample_messages
-from gmail_cleanup.labels import get_or_create_label_id, apply_label_to_messages
-from gmail_cleanup.exporter import fetch_message_row, write_csv, write_json
-from gmail_cleanup.trash import trash_message_ids
-from gmail_cleanup.label_clear import remove_label
-from gmail_cleanup.stats import collect_sender_counts_and_dates
-from gmail_cleanup.config import load_config, config_path, write_template
-from gmail_cleanup.gmail_iter import iter_message_id_pages
 from gmail_cleanup.query_builder import QueryOptions, build_query
 
-CFG = load_config()
+if TYPE_CHECKING:
+    from gmail_cleanup.checkpoint import Checkpoint
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.config import AppConfig
+
+
+@lru_cache(maxsize=1)
+def _cfg() -> "AppConfig":
+    from gmail_cleanup.config import load_config
+
+    return load_config()
+
+
 console = Console()
 app = typer.Typer(add_completion=False, invoke_without_command=True)
 
@@ -53,7 +62,7 @@ def main(
 # QUERY HELPERS
 # ──────────────────────────────────────────────────────────────
 
-def build_query_or_exit(
+def query_options_or_exit(
     *,
     q: str | None,
     from_: str | None,
@@ -71,7 +80,7 @@ def build_query_or_exit(
     no_attachment: bool,
     larger: str | None,
     smaller: str | None,
-) -> str:
+) -> QueryOptions:
     if has_attachment and no_attachment:
         raise typer.BadParameter("Choose only one: --has-attachment or --no-attachment")
 
@@ -95,18 +104,24 @@ def build_query_or_exit(
         smaller=smaller,
     )
 
-    built = build_query(opts)
-
-    if not built:
+    if not build_query(opts):
         console.print("[bold red]Refusing to run an empty query.[/bold red]")
         console.print("Tip: provide --from, --subject, --older-than, or --q.")
         raise typer.Exit(code=2)
 
-    return built
+    return opts
+
+
+def build_query_or_exit(**kwargs) -> str:
+    return build_query(query_options_or_exit(**kwargs))
 
 
 def build_query_from_locals(d: dict) -> str:
-    return build_query_or_exit(
+    return build_query(query_options_from_locals(d))
+
+
+def query_options_from_locals(d: dict) -> QueryOptions:
+    return query_options_or_exit(
         q=d.get("q"),
         from_=d.get("from_"),
         to=d.get("to"),
@@ -126,6 +141,75 @@ def build_query_from_locals(d: dict) -> str:
     )
 
 
+def run_resumable(
+    checkpoint: "Checkpoint",
+    pages,
+    write,
+    *,
+    limit: int = 0,
+    chunk_size: int | None = None,
+    on_chunk=None,
+    controller: "AdaptiveConcurrency | None" = None,
+    workers: int = 1,
+) -> int:
+    """
+    Run a checkpointed write loop; drop the checkpoint once it completes.
+    """
+    from gmail_cleanup.checkpoint import run_checkpointed
+    from gmail_cleanup.write_batch import DEFAULTS as WRITE_DEFAULTS
+
+    chunk_size = chunk_size if chunk_size is not None else WRITE_DEFAULTS.chunk_size
+    try:
+        done = run_checkpointed(
+            pages,
+            write,
+            checkpoint,
+            limit=limit,
+            chunk_size=chunk_size,
+            on_chunk=on_chunk,
+            controller=controller,
+            workers=workers,
+        )
+    except BaseException:
+        if checkpoint.done:
+            console.print(
+                f"\n[bold yellow]Stopped after {checkpoint.done} messages.[/bold yellow] "
+                "Re-run with --resume to continue."
+            )
+        raise
+    checkpoint.clear()
+    return done
+
+
+@contextmanager
+def cache_if(service, cached: bool):
+    """
+    Yield the local message cache (brought up to date first if it was synced
+    before) when --cached is set, otherwise None.
+    """
+    if not cached:
+        yield None
+        return
+
+    from gmail_cleanup.cache import MessageCache, sync as sync_cache
+
+    with MessageCache() as cache:
+        if cache.history_id:
+            result = sync_cache(service, cache)
+            console.print(
+                f"Cache: {result.mode} sync, +{result.added} -{result.deleted} "
+                f"~{result.relabeled} ({cache.count()} cached)"
+            )
+        yield cache
+
+
+CACHED_HELP = (
+    "Use the local cache (see `sync`): label-only queries (label:, in:, is:, category:) "
+    "are answered from it without listing; other queries are listed from Gmail. "
+    "Metadata is read from the cache, fetching only misses."
+)
+
+
 # ──────────────────────────────────────────────────────────────
 # QUERY
 # ──────────────────────────────────────────────────────────────
@@ -149,29 +233,52 @@ def query(
     larger: str = typer.Option(None),
     smaller: str = typer.Option(None),
     sample: int | None = typer.Option(None),
+    cached: bool = typer.Option(False, "--cached", help=CACHED_HELP),
 ):
-    sample = sample if sample is not None else CFG.default_sample
+    sample = sample if sample is not None else _cfg().default_sample
     built = build_query_from_locals(locals())
 
     console.print("\n[bold]Gmail query:[/bold]")
     console.print(built)
 
-    service = get_gmail_service()
+    from rich.live import Live
 
-    total = count_messages(service, built)
-    with_att = count_messages(service, f"{built} has:attachment")
-    without_att = count_messages(service, f"{built} -has:attachment")
+    from gmail_cleanup.gmail import get_gmail_service
+    from gmail_cleanup.preview import BackgroundCount, estimate_messages, sample_messages
 
-    table = Table(title="Query Summary (dry-run)")
-    table.add_column("Metric")
-    table.add_column("Count", justify="right")
-    table.add_row("Total", str(total))
-    table.add_row("With attachments", str(with_att))
-    table.add_row("Without attachments", str(without_att))
-    console.print(table)
+    service = get_gmail_service()
+
+    queries = {
+        "Total": built,
+        "With attachments": f"{built} has:attachment",
+        "Without attachments": f"{built} -has:attachment",
+    }
+    # Exact counts page through every ID, so they run in the background while
+    # the single-call estimates are shown.
+    counts = {name: BackgroundCount(service, q) for name, q in queries.items()}
+    estimates = {name: estimate_messages(service, q) for name, q in queries.items()}
+
+    def _summary() -> Table:
+        table = Table(title="Query Summary (dry-run)")
+        table.add_column("Metric")
+        table.add_column("Count", justify="right")
+        for name, counter in counts.items():
+            if counter.done:
+                table.add_row(name, str(counter.result()))
+            else:
+                table.add_row(name, f"~{estimates[name]} (estimate)")
+        return table
+
+    with Live(_summary(), console=console, auto_refresh=False) as live:
+        while not all(c.done for c in counts.values()):
+            time.sleep(0.2)
+            live.update(_summary(), refresh=True)
+        live.update(_summary(), refresh=True)
+    total = counts["Total"].result()
 
     if sample > 0 and total > 0:
-        rows = sample_messages(service, built, limit=sample)
+        with cache_if(service, cached) as cache:
+            rows = sample_messages(service, built, limit=sample, cache=cache)
         st = Table()
         st.add_column("Date")
         st.add_column("From")
@@ -205,15 +312,27 @@ def label(
     smaller: str = typer.Option(None),
     target_label: str | None = typer.Option(None),
     limit: int = typer.Option(0),
+    resume: bool = typer.Option(
+        False, "--resume", help="Continue an interrupted run from its checkpoint."
+    ),
+    workers: int = typer.Option(
+        1, "--workers", min=1, help="Write chunks in flight, each on its own connection."
+    ),
 ):
-    target_label = target_label or CFG.default_target_label
+    target_label = target_label or _cfg().default_target_label
     built = build_query_from_locals(locals())
 
     console.print("\n[bold]Gmail query:[/bold]")
     console.print(built)
     console.print(f"\n[bold]Target label:[/bold] {target_label}")
 
-    service = get_gmail_service()
+    from gmail_cleanup.checkpoint import open_checkpoint, resume_pages
+    from gmail_cleanup.gmail import get_service_pool
+    from gmail_cleanup.labels import apply_label_to_messages, get_or_create_label_id
+    from gmail_cleanup.preview import count_messages
+
+    pool = get_service_pool()
+    service = pool.primary
     label_id = get_or_create_label_id(service, target_label)
 
     total = count_messages(service, built)
@@ -225,11 +344,19 @@ def label(
     if confirm != "YES":
         raise typer.Exit(code=1)
 
-    done = 0
-    for ids in iter_message_id_pages(service, built, limit=limit):
-        apply_label_to_messages(service, label_id, ids)
-        done += len(ids)
-        console.print(f"Labeled {done}/{total if not limit else min(total, limit)}")
+    checkpoint = open_checkpoint("label", built, target=target_label, resume=resume)
+    if checkpoint.done:
+        console.print(f"Resuming: {checkpoint.done} messages already labeled.")
+
+    target_n = total if not limit else min(total, limit)
+    run_resumable(
+        checkpoint,
+        resume_pages(service, built, checkpoint),
+        lambda ids: apply_label_to_messages(pool.service(), label_id, ids),
+        limit=limit,
+        on_chunk=lambda _r: console.print(f"Labeled {checkpoint.done}/{target_n}"),
+        workers=workers,
+    )
 
 
 # ──────────────────────────────────────────────────────────────
@@ -255,28 +382,130 @@ def export(
     larger: str = typer.Option(None),
     smaller: str = typer.Option(None),
     out: Path = typer.Option(Path("reports/report.csv")),
-    fmt: str = typer.Option("csv", "--format", help="csv or json"),
-    limit: int | None = typer.Option(None),
+    fmt: str = typer.Option("csv", "--format", help="csv, json or ndjson (one JSON object per line)"),
+    limit: int | None = typer.Option(None, help="Max messages to export (0 = no limit)."),
+    resume: bool = typer.Option(
+        False, "--resume", help="Continue an interrupted csv/ndjson export from its checkpoint."
+    ),
+    cached: bool = typer.Option(False, "--cached", help=CACHED_HELP),
+    compress: str | None = typer.Option(
+        None, "--compress", help="gzip, bz2, xz or none (default: from the --out extension)."
+    ),
+    compress_level: int | None = typer.Option(
+        None, "--compress-level", help="Compression level (gzip/bz2 1-9, xz 0-9)."
+    ),
+    workers: int = typer.Option(
+        1, "--workers", min=1, help="Metadata batches fetched at once, each on its own connection."
+    ),
 ):
-    limit = limit if limit is not None else CFG.default_export_limit
+    limit = limit if limit is not None else _cfg().default_export_limit
+    if fmt not in ("csv", "json", "ndjson"):
+        raise typer.BadParameter("--format must be csv, json or ndjson")
+    if limit < 0:
+        raise typer.BadParameter("--limit must be >= 0 (0 = no limit)")
+    if resume and fmt == "json":
+        raise typer.BadParameter("--resume is only supported with --format csv or ndjson")
     built = build_query_from_locals(locals())
 
-    service = get_gmail_service()
-    total = count_messages(service, built)
-    export_n = min(total, limit)
+    from gmail_cleanup.exporter import compress_level_for, compression_for
+
+    try:
+        codec = compression_for(out, compress)
+        level = compress_level_for(codec, compress_level) if codec else None
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    sink = {"compress": codec or "none", "compress_level": level}
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from gmail_cleanup.cache import cached_ids
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.gmail import get_service_pool
+    from gmail_cleanup.preview import count_messages
+
+    pool = get_service_pool()
+    service = pool.primary
+    controller = AdaptiveConcurrency()
+
+    # One set of fetch threads (and their connections) for the whole export.
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gmail-export")
+    with cache_if(service, cached) as cache, executor:
+        # Label-only queries come straight from the cache's label index (None otherwise).
+        ids = cached_ids(service, built, cache, limit=limit)
+        total = len(ids) if ids is not None else count_messages(service, built)
+        export_n = min(total, limit) if limit else total
+        fetch = {"controller": controller, "cache": cache, "workers": workers, "pool": pool, "executor": executor}
+        if fmt == "json":
+            _export_json(service, built, out, export_n, ids, fetch, sink)
+        else:
+            _export_appendable(service, built, out, fmt, export_n, resume, ids, fetch, sink)
+
+
+def _export_appendable(service, built, out, fmt, export_n, resume, ids, fetch, sink) -> None:
+    from rich.progress import Progress
+
+    from gmail_cleanup.batch_fetch import DEFAULTS as FETCH_DEFAULTS
+    from gmail_cleanup.checkpoint import open_checkpoint, resume_pages
+    from gmail_cleanup.exporter import append_rows, fetch_message_rows, truncate_export
+    from gmail_cleanup.gmail_iter import MessagePage
+
+    # csv/ndjson rows are appended batch by batch, so the run can be checkpointed.
+    checkpoint = open_checkpoint("export", built, target=str(out), resume=resume)
+    if not checkpoint.done:
+        out.unlink(missing_ok=True)
+    elif checkpoint.output_bytes is not None:
+        # Drop whatever a crash left after the last committed chunk.
+        truncate_export(out, checkpoint.output_bytes)
+
+    # Rows must land in the file in order, so chunks are written one at a
+    # time; `workers` parallelizes the fetch inside each chunk instead. A
+    # chunk is fetched in full before any of it is written, and the file size
+    # is saved with the checkpoint that commits it.
+    def _append_rows(ids: list[str]) -> None:
+        rows = list(fetch_message_rows(service, ids, **fetch))
+        append_rows(rows, out, fmt, **sink)
+        checkpoint.output_bytes = out.stat().st_size
+
+    if ids is None:
+        pages = resume_pages(service, built, checkpoint)
+    else:
+        # One page without tokens: a resume re-reads the cache and skips processed IDs.
+        pages = [MessagePage(ids=ids, page_token=None, next_page_token=None)]
 
-    rows = []
     with Progress() as progress:
-        task = progress.add_task("Exporting", total=export_n)
-        for ids in iter_message_id_pages(service, built, limit=export_n):
-            for msg_id in ids:
-                rows.append(fetch_message_row(service, msg_id))
-                progress.update(task, advance=1)
+        task = progress.add_task("Exporting", total=export_n, completed=checkpoint.done)
+        run_resumable(
+            checkpoint,
+            pages,
+            _append_rows,
+            limit=export_n,
+            chunk_size=FETCH_DEFAULTS.batch_size * fetch["workers"],
+            on_chunk=lambda _r: progress.update(
+                task,
+                completed=checkpoint.done,
+                description=f"Exporting (concurrency {fetch['controller'].limit})",
+            ),
+        )
 
-    if fmt == "csv":
-        write_csv(rows, out)
-    else:
-        write_json(rows, out)
+
+def _export_json(service, built, out, export_n, ids, fetch, sink) -> None:
+    from rich.progress import Progress
+
+    from gmail_cleanup.exporter import RowWriter, fetch_message_rows
+    from gmail_cleanup.gmail_iter import iter_message_ids
+
+    # Rows are streamed into the array as they arrive; nothing is held in memory.
+    with Progress() as progress, RowWriter(out, "json", **sink) as writer:
+        task = progress.add_task("Exporting", total=export_n)
+        if ids is None:
+            ids = iter_message_ids(service, built, limit=export_n)
+        for row in fetch_message_rows(service, ids, **fetch):
+            writer.write(row)
+            progress.update(
+                task,
+                advance=1,
+                description=f"Exporting (concurrency {fetch['controller'].limit})",
+            )
 
 
 # ──────────────────────────────────────────────────────────────
@@ -308,6 +537,14 @@ def trash(
         "--force",
         help="Override safety limit from config.",
     ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Continue an interrupted trash run from its checkpoint.",
+    ),
+    workers: int = typer.Option(
+        1, "--workers", min=1, help="Write chunks in flight, each on its own connection."
+    ),
 ):
     """
     Move messages to Trash. Safety: requires a cleanup/* label and explicit --execute.
@@ -319,24 +556,34 @@ def trash(
         raise typer.Exit(code=2)
 
     # default sample from config (CLI overrides)
-    sample = sample if sample is not None else CFG.default_sample
+    sample = sample if sample is not None else _cfg().default_sample
 
     built = f"label:{label}"
     console.print("\n[bold]Trash scope query:[/bold]")
     console.print(built)
 
-    service = get_gmail_service()
+    from gmail_cleanup.checkpoint import open_checkpoint, resume_pages
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.gmail import get_service_pool
+    from gmail_cleanup.preview import BackgroundCount, estimate_messages, sample_messages
+    from gmail_cleanup.trash import trash_message_ids
 
-    total = count_messages(service, built)
-    if total == 0:
-        console.print("\nNo matching messages. Nothing to trash.")
-        raise typer.Exit()
+    pool = get_service_pool()
+    service = pool.primary
 
-    console.print(f"\nMatched {total} messages in label:{label}")
+    checkpoint = open_checkpoint("trash", built, resume=resume)
+    if checkpoint.done:
+        console.print(f"\nResuming: {checkpoint.done} messages already trashed.")
 
-    if sample > 0:
+    # The safety limit below needs the exact count; show the estimate and the
+    # sample while it is computed.
+    counter = BackgroundCount(service, built)
+    estimate = estimate_messages(service, built)
+    console.print(f"\nMatched ~{estimate} messages in label:{label} (estimate)")
+
+    rows = sample_messages(service, built, limit=sample) if sample > 0 else []
+    if rows:
         console.print("\n[bold]Sample messages:[/bold]")
-        rows = sample_messages(service, built, limit=sample)
         st = Table()
         st.add_column("Date")
         st.add_column("From")
@@ -345,12 +592,26 @@ def trash(
             st.add_row(r["date"], r["from"], r["subject"])
         console.print(st)
 
-    target_n = min(total, limit) if limit else total
+    with console.status("Counting matching messages..."):
+        total = counter.result()
+    if total == 0:
+        checkpoint.clear()
+        console.print("\nNo matching messages. Nothing to trash.")
+        raise typer.Exit()
+
+    console.print(f"\nExact count: {total} messages in label:{label}")
 
-    if target_n > CFG.max_trash_without_force and not force:
+    # With --resume, trashed messages have already left the label and `limit`
+    # counts what earlier runs did.
+    if limit:
+        target_n = min(total, max(0, limit - checkpoint.done))
+    else:
+        target_n = total
+
+    if target_n > _cfg().max_trash_without_force and not force:
         console.print(
             f"[bold red]Refusing.[/bold red] Attempting to trash {target_n} messages, "
-            f"but config max_trash_without_force is {CFG.max_trash_without_force}.\n"
+            f"but config max_trash_without_force is {_cfg().max_trash_without_force}.\n"
             f"Use --force if you are absolutely sure."
         )
         raise typer.Exit(code=2)
@@ -371,11 +632,19 @@ def trash(
         console.print("Cancelled.")
         raise typer.Exit(code=1)
 
-    done = 0
-    for ids in iter_message_id_pages(service, built, limit=target_n):
-        trash_message_ids(service, ids)
-        done += len(ids)
-        console.print(f"Trashed {done}/{target_n}")
+    controller = AdaptiveConcurrency()
+    goal = checkpoint.done + target_n
+    run_resumable(
+        checkpoint,
+        resume_pages(service, built, checkpoint),
+        lambda ids: trash_message_ids(pool.service(), ids),
+        limit=goal,
+        on_chunk=lambda _r: console.print(
+            f"Trashed {checkpoint.done}/{goal} (concurrency {controller.limit})"
+        ),
+        controller=controller,
+        workers=workers,
+    )
 
     console.print("\nDone. Messages moved to Trash.")
 
@@ -434,13 +703,31 @@ def doctor():
 def label_clear(
     label: str = typer.Option(..., "--label", help="Label to remove (must start with cleanup/)."),
     limit: int = typer.Option(0, help="Limit how many messages to update (0 = all)."),
+    resume: bool = typer.Option(
+        False, "--resume", help="Continue an interrupted run from its checkpoint."
+    ),
+    workers: int = typer.Option(
+        1, "--workers", min=1, help="Write chunks in flight, each on its own connection."
+    ),
 ):
-    service = get_gmail_service()
+    from gmail_cleanup.checkpoint import open_checkpoint, resume_pages
+    from gmail_cleanup.gmail import get_service_pool
+    from gmail_cleanup.label_clear import remove_label
+    from gmail_cleanup.labels import get_or_create_label_id
+
+    pool = get_service_pool()
+    service = pool.primary
     label_id = get_or_create_label_id(service, label)
     query = f"label:{label}"
 
-    for ids in iter_message_id_pages(service, query, limit=limit):
-        remove_label(service, label_id, ids)
+    checkpoint = open_checkpoint("label-clear", query, target=label, resume=resume)
+    run_resumable(
+        checkpoint,
+        resume_pages(service, query, checkpoint),
+        lambda ids: remove_label(pool.service(), label_id, ids),
+        limit=limit,
+        workers=workers,
+    )
 
 
 # ──────────────────────────────────────────────────────────────
@@ -465,23 +752,323 @@ def stats(
     no_attachment: bool = typer.Option(False),
     larger: str = typer.Option(None),
     smaller: str = typer.Option(None),
-    scan_limit: int | None = typer.Option(None),
+    scan_limit: int | None = typer.Option(None, help="Messages to scan (0 = all matches)."),
     top: int = typer.Option(10),
+    by: str = typer.Option("address", "--by", help="Group senders by address, domain or registrable domain."),
+    histogram: str | None = typer.Option(
+        None,
+        "--histogram",
+        help="Bucket messages and bytes by day, week, month or year (from internalDate).",
+    ),
+    sample: int | None = typer.Option(
+        None,
+        "--sample",
+        min=1,
+        help="Estimate from a random sample of this many messages instead of the first --scan-limit.",
+    ),
+    stratified: bool = typer.Option(
+        False, "--stratified", help="With --sample: draw proportionally from each year."
+    ),
+    seed: int | None = typer.Option(None, "--seed", help="Random seed for --sample."),
+    cached: bool = typer.Option(False, "--cached", help=CACHED_HELP),
 ):
-    scan_limit = scan_limit if scan_limit is not None else CFG.default_scan_limit
-    built = build_query_from_locals(locals())
+    scan_limit = scan_limit if scan_limit is not None else _cfg().default_scan_limit
+    if by not in ("address", "domain", "registrable"):
+        raise typer.BadParameter("--by must be address, domain or registrable")
+    if histogram is not None and histogram not in ("day", "week", "month", "year"):
+        raise typer.BadParameter("--histogram must be day, week, month or year")
+    if histogram is not None and sample is not None:
+        raise typer.BadParameter("Choose only one: --histogram or --sample")
+    base = query_options_from_locals(locals())
+    built = build_query(base)
+
+    if histogram is not None:
+        _volume_histogram(built, histogram, scan_limit, by, top, cached)
+        return
+    if sample is not None:
+        _sampled_stats(base, sample, "stratified" if stratified else "uniform", by, top, seed, cached)
+        return
+
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.gmail import get_gmail_service
+    from gmail_cleanup.stats import DATE_FORMAT, collect_sender_stats
 
     service = get_gmail_service()
-    senders, oldest, newest = collect_sender_counts_and_dates(
-        service, built, scan_limit=scan_limit
-    )
+    controller = AdaptiveConcurrency()
+    with cache_if(service, cached) as cache:
+        sender_stats = collect_sender_stats(
+            service, built, scan_limit=scan_limit, controller=controller, cache=cache
+        )
 
-    table = Table(title="Top senders")
+    hits = sender_stats.top(top, by=by)
+    approximate = any(hit.error for hit in hits)
+    table = Table(title=f"Top senders by {by} ({sender_stats.scanned} messages scanned)")
     table.add_column("Sender")
     table.add_column("Count", justify="right")
-    for sender, cnt in senders.most_common(top):
-        table.add_row(sender, str(cnt))
+    if approximate:
+        table.add_column("At least", justify="right")
+    for hit in hits:
+        row = [hit.key, str(hit.count)]
+        if approximate:
+            row.append(str(hit.guaranteed))
+        table.add_row(*row)
+    console.print(table)
+    if sender_stats.oldest is not None and sender_stats.newest is not None:
+        console.print(
+            f"Oldest: {sender_stats.oldest.strftime(DATE_FORMAT)}  "
+            f"Newest: {sender_stats.newest.strftime(DATE_FORMAT)}"
+        )
+    console.print(f"Fetch concurrency: {controller.limit}")
+
+
+def _volume_histogram(built, granularity, scan_limit, by, top, cached) -> None:
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.gmail import get_gmail_service
+    from gmail_cleanup.volume import collect_volume
+
+    service = get_gmail_service()
+    controller = AdaptiveConcurrency()
+    with cache_if(service, cached) as cache:
+        volume = collect_volume(
+            service, built, granularity, scan_limit=scan_limit, by=by, controller=controller, cache=cache
+        )
+
+    table = Table(title=f"Volume by {granularity} ({volume.overall.total} messages)")
+    table.add_column("Bucket")
+    table.add_column("Messages", justify="right")
+    table.add_column("Size", justify="right")
+    for bucket in volume.overall.buckets():
+        table.add_row(bucket.label, str(bucket.count), format_bytes(bucket.size_bytes))
+    console.print(table)
+
+    senders = Table(title=f"Top senders by {by}, per {granularity}")
+    senders.add_column("Sender")
+    senders.add_column("Bucket")
+    senders.add_column("Messages", justify="right")
+    senders.add_column("Size", justify="right")
+    for sender, sender_histogram in volume.top_senders(top):
+        for bucket in sender_histogram.buckets():
+            senders.add_row(sender, bucket.label, str(bucket.count), format_bytes(bucket.size_bytes))
+            sender = ""
+    console.print(senders)
+    if volume.skipped:
+        console.print(f"Skipped {volume.skipped} messages without an internalDate.")
+    console.print(f"Fetch concurrency: {controller.limit}")
+
+
+def _sampled_stats(base, size, mode, by, top, seed, cached) -> None:
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.gmail import get_gmail_service
+    from gmail_cleanup.sampling import sample_sender_stats
+
+    service = get_gmail_service()
+    controller = AdaptiveConcurrency()
+    with cache_if(service, cached) as cache:
+        with console.status("Listing matches and sampling..."):
+            estimate = sample_sender_stats(
+                service, base, size=size, mode=mode, by=by, seed=seed, controller=controller, cache=cache
+            )
+
+    ci = f"{estimate.confidence:.0%} CI"
+    table = Table(
+        title=f"Estimated top senders by {by} ({mode} sample of {estimate.sampled} "
+        f"from {estimate.population} messages)"
+    )
+    table.add_column("Sender")
+    table.add_column("Messages (est.)", justify="right")
+    table.add_column(ci, justify="right")
+    table.add_column("Byte share", justify="right")
+    table.add_column(ci, justify="right")
+    for row in estimate.top(top):
+        messages, size_share = row.messages, row.bytes
+        table.add_row(
+            row.key,
+            f"{messages.estimate * estimate.population:,.0f}",
+            f"{messages.low * estimate.population:,.0f} - {messages.high * estimate.population:,.0f}",
+            f"{size_share.estimate:.1%}",
+            f"{size_share.low:.1%} - {size_share.high:.1%}",
+        )
     console.print(table)
+    total = estimate.total_bytes()
+    console.print(
+        f"Total size (est.): {format_bytes(int(total.estimate))} "
+        f"({ci}: {format_bytes(int(total.low))} - {format_bytes(int(total.high))})"
+    )
+    console.print(f"Fetch concurrency: {controller.limit}")
+
+
+def format_bytes(n: int) -> str:
+    size = float(n)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{n} B" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+# ──────────────────────────────────────────────────────────────
+# STORAGE
+# ──────────────────────────────────────────────────────────────
+
+@app.command()
+def storage(
+    q: str = typer.Option(None),
+    from_: str = typer.Option(None, "--from"),
+    to: str = typer.Option(None),
+    subject: str = typer.Option(None),
+    has_words: str = typer.Option(None),
+    not_has_words: str = typer.Option(None),
+    label_filter: str = typer.Option(None, "--label"),
+    inbox: bool = typer.Option(False),
+    after: str = typer.Option(None),
+    before: str = typer.Option(None),
+    older_than: str = typer.Option(None),
+    newer_than: str = typer.Option(None),
+    has_attachment: bool = typer.Option(False),
+    no_attachment: bool = typer.Option(False),
+    larger: str = typer.Option(None),
+    smaller: str = typer.Option(None),
+    scan_limit: int | None = typer.Option(None, help="Messages to scan (0 = all matches)."),
+    top: int = typer.Option(10),
+    by: list[str] | None = typer.Option(
+        None, "--by", help="sender, domain, registrable, label or age (repeatable; default: all)."
+    ),
+    cached: bool = typer.Option(False, "--cached", help=CACHED_HELP),
+):
+    """
+    Report which senders, domains, labels and ages hold the most bytes, with a query per row.
+    """
+    scan_limit = scan_limit if scan_limit is not None else _cfg().default_scan_limit
+    groups = by or ["sender", "domain", "registrable", "label", "age"]
+    for group in groups:
+        if group not in ("sender", "domain", "registrable", "label", "age"):
+            raise typer.BadParameter("--by must be sender, domain, registrable, label or age")
+    base = query_options_from_locals(locals())
+
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.gmail import get_gmail_service
+    from gmail_cleanup.storage_report import collect_storage_report
+
+    service = get_gmail_service()
+    controller = AdaptiveConcurrency()
+    with cache_if(service, cached) as cache:
+        report = collect_storage_report(
+            service, base, scan_limit=scan_limit, controller=controller, cache=cache
+        )
+
+    console.print(
+        f"Scanned {report.messages} messages, {format_bytes(report.size_bytes)} in total."
+    )
+    for group in groups:
+        table = Table(title=f"Storage by {group}")
+        table.add_column(group.capitalize())
+        table.add_column("Messages", justify="right")
+        table.add_column("Size", justify="right")
+        table.add_column("Query")
+        for row in report.top(group, top):
+            table.add_row(row.key, str(row.messages), format_bytes(row.size_bytes), row.query)
+        console.print(table)
+    console.print(f"Fetch concurrency: {controller.limit}")
+
+
+# ──────────────────────────────────────────────────────────────
+# HISTOGRAM
+# ──────────────────────────────────────────────────────────────
+
+@app.command()
+def histogram(
+    q: str = typer.Option(None),
+    from_: str = typer.Option(None, "--from"),
+    to: str = typer.Option(None),
+    subject: str = typer.Option(None),
+    has_words: str = typer.Option(None),
+    not_has_words: str = typer.Option(None),
+    label_filter: str = typer.Option(None, "--label"),
+    inbox: bool = typer.Option(False),
+    after: str = typer.Option(None),
+    before: str = typer.Option(None),
+    older_than: str = typer.Option(None),
+    newer_than: str = typer.Option(None),
+    has_attachment: bool = typer.Option(False),
+    no_attachment: bool = typer.Option(False),
+    larger: str = typer.Option(None),
+    smaller: str = typer.Option(None),
+    by: str = typer.Option("size", "--by", help="Bucket by size (larger:/smaller:) or date (after:/before:)."),
+    workers: int = typer.Option(8, min=1, help="Estimate calls in flight."),
+    max_calls: int = typer.Option(400, min=1, help="List calls to spend, refinement included."),
+):
+    """
+    Size or date distribution of a query from match estimates only (no messages fetched).
+    """
+    if by not in ("size", "date"):
+        raise typer.BadParameter("--by must be size or date")
+    base = query_options_from_locals(locals())
+
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.gmail import get_gmail_service
+    from gmail_cleanup.histogram import count_histogram, day_to_date
+
+    service = get_gmail_service()
+    controller = AdaptiveConcurrency()
+    with console.status("Estimating bucket counts..."):
+        result = count_histogram(
+            service, base, by=by, workers=workers, max_calls=max_calls, controller=controller
+        )
+
+    def _edge(value: int | None) -> str:
+        if value is None:
+            return ""
+        return format_bytes(value) if by == "size" else day_to_date(value).isoformat()
+
+    table = Table(title=f"Messages by {by} (~{result.total} matches, {result.calls} list calls)")
+    table.add_column("From")
+    table.add_column("To")
+    table.add_column("Messages (est.)", justify="right")
+    table.add_column("Query")
+    for bucket in result.buckets:
+        table.add_row(_edge(bucket.lo), _edge(bucket.hi), str(bucket.estimate), bucket.query)
+    console.print(table)
+
+
+# ──────────────────────────────────────────────────────────────
+# SYNC
+# ──────────────────────────────────────────────────────────────
+
+@app.command("sync")
+def sync_command(
+    full: bool = typer.Option(
+        False, "--full", help="Rebuild the cache instead of applying changes since the last sync."
+    ),
+    list_workers: int = typer.Option(
+        1, "--list-workers", min=1, help="On a full sync, list this many time windows at once."
+    ),
+):
+    """
+    Sync the local message-metadata cache (incremental via Gmail history when possible).
+    """
+    from gmail_cleanup.cache import MessageCache, sync as sync_cache
+    from gmail_cleanup.concurrency import AdaptiveConcurrency
+    from gmail_cleanup.gmail import get_gmail_service
+
+    service = get_gmail_service()
+    controller = AdaptiveConcurrency()
+
+    with MessageCache() as cache:
+        if full or not cache.history_id:
+            console.print("Running full sync (this lists and fetches every message once)...")
+        result = sync_cache(
+            service,
+            cache,
+            full=full,
+            controller=controller,
+            on_progress=lambda n: console.print(f"Cached {n} messages"),
+            list_workers=list_workers,
+        )
+        console.print(
+            f"{result.mode.capitalize()} sync done: +{result.added} -{result.deleted} "
+            f"~{result.relabeled} relabeled. {cache.count()} messages cached "
+            f"(historyId {result.history_id})."
+        )
 
 
 # ──────────────────────────────────────────────────────────────
@@ -490,6 +1077,8 @@ def stats(
 
 @app.command()
 def config(init: bool = typer.Option(False)):
+    from gmail_cleanup.config import config_path, load_config, write_template
+
     path = config_path()
     if init:
         write_template(overwrite=False)
@@ -501,3 +1090,5 @@ def config(init: bool = typer.Option(False)):
     console.print(f"default_export_limit: {cfg.default_export_limit}")
     console.print(f"default_scan_limit: {cfg.default_scan_limit}")
     console.print(f"default_sample: {cfg.default_sample}")
+    console.print(f"quota_units_per_second: {cfg.quota_units_per_second}")
+    console.print(f"quota_burst: {cfg.quota_burst}")
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from googleapiclient.errors import HttpError
+
+T = TypeVar("T")
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"ratelimitexceeded", "userratelimitexceeded"}
+
+
+@dataclass(frozen=True)
+class AimdDefaults:
+    initial: int = 10
+    minimum: int = 1
+    maximum: int = 100
+    increase: float = 1.0  # added to the limit per window of successful calls
+    decrease: float = 0.5  # limit multiplier on throttling
+    backoff_base: float = 1.0
+    backoff_cap: float = 32.0
+    max_attempts: int = 5
+
+
+DEFAULTS = AimdDefaults()
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    True for HttpErrors Gmail expects clients to retry: 429, 5xx and
+    403 rateLimitExceeded / userRateLimitExceeded.
+    """
+    if not isinstance(exc, HttpError):
+        return False
+
+    status = exc.resp.status
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status == 403:
+        content = exc.content or b""
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", errors="replace")
+        return any(reason in content.lower() for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def jittered_backoff(
+    attempt: int,
+    base: float = DEFAULTS.backoff_base,
+    cap: float = DEFAULTS.backoff_cap,
+    rng: Callable[[], float] = random.random,
+) -> float:
+    """
+    "Full jitter" exponential backoff: uniform in [0, min(cap, base * 2**(attempt-1))].
+    """
+    return rng() * min(cap, base * (2 ** max(attempt - 1, 0)))
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight Gmail requests.
+
+    The limit grows by `increase` for every `limit` successful calls (about +1
+    per round of requests) and is multiplied by `decrease` when Gmail throttles
+    (429, 403 rateLimitExceeded, 5xx). `limit` can be read at any time to
+    report the current concurrency.
+    """
+
+    def __init__(
+        self,
+        initial: int = DEFAULTS.initial,
+        minimum: int = DEFAULTS.minimum,
+        maximum: int = DEFAULTS.maximum,
+        increase: float = DEFAULTS.increase,
+        decrease: float = DEFAULTS.decrease,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self._increase = increase
+        self._decrease = decrease
+        self._rng = rng
+        self._window = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._window)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self, calls: int = 1) -> None:
+        with self._cond:
+            for _ in range(calls):
+                self._window = min(self.maximum, self._window + self._increase / self._window)
+            self._cond.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            self._window = max(self.minimum, self._window * self._decrease)
+
+    def backoff(self, attempt: int) -> float:
+        return jittered_backoff(attempt, rng=self._rng)
+
+    def run(
+        self,
+        fn: Callable[[], T],
+        max_attempts: int = DEFAULTS.max_attempts,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> T:
+        """
+        Call fn() in a concurrency slot, retrying throttled calls with jittered
+        backoff. Non-retryable errors, and the last retryable one, are raised.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            with self.slot():
+                try:
+                    result = fn()
+                except Exception as exc:
+                    if not is_retryable(exc) or attempt >= max_attempts:
+                        raise
+                    self.on_throttle()
+                else:
+                    self.on_success()
+                    return result
+            sleep(self.backoff(attempt))
+
+
+class _Failure:
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+_WORKER_DONE = object()
+
+
+def produce_in_threads(
+    sources: Iterable[Callable[[], Iterable[T]]],
+    workers: int = 1,
+    buffer: int = 1,
+    thread_name: str = "gmail-producer",
+) -> Iterator[T]:
+    """
+    Drain every source on one of `workers` threads and yield the items as
+    they arrive, with at most `buffer` items waiting for the consumer.
+
+    A source is a callable returning an iterable; it is called on the worker
+    thread. One source keeps its order, several interleave. Errors in a
+    source are re-raised here. When the consumer stops early (break,
+    exception, close) the workers stop at their next item and are joined
+    before this generator finishes.
+    """
+    items: queue.Queue = queue.Queue(maxsize=max(1, buffer))
+    stop = threading.Event()
+    pending = iter(sources)
+    pending_lock = threading.Lock()
+
+    def _put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _work() -> None:
+        try:
+            while not stop.is_set():
+                with pending_lock:
+                    source = next(pending, None)
+                if source is None:
+                    break
+                for item in source():
+                    if not _put(item):
+                        return
+            _put(_WORKER_DONE)
+        except BaseException as exc:
+            _put(_Failure(exc))
+
+    n = max(1, workers)
+    threads = [
+        threading.Thread(target=_work, name=thread_name if n == 1 else f"{thread_name}_{i}", daemon=True)
+        for i in range(n)
+    ]
+    for thread in threads:
+        thread.start()
+    running = n
+    try:
+        while running:
+            item = items.get()
+            if item is _WORKER_DONE:
+                running -= 1
+                continue
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -4,9 +4,7 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Optional
 
-import yaml
-
-from gmail_cleanup.gmail import _app_data_dir
+from gmail_cleanup.appdata import _app_data_dir
 
 
 @dataclass(frozen=True)
@@ -16,6 +14,8 @@ class AppConfig:
     default_export_limit: int = 200
     default_scan_limit: int = 500
     default_sample: int = 10
+    quota_units_per_second: float = 250
+    quota_burst: float = 250
 
 
 def config_path() -> Path:
@@ -27,6 +27,8 @@ def load_config() -> AppConfig:
     if not path.exists():
         return AppConfig()
 
+    import yaml  # only needed once a config file exists
+
     raw = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
     if not isinstance(raw, dict):
         return AppConfig()
@@ -37,6 +39,8 @@ def load_config() -> AppConfig:
         default_export_limit=int(raw.get("default_export_limit", 200)),
         default_scan_limit=int(raw.get("default_scan_limit", 500)),
         default_sample=int(raw.get("default_sample", 10)),
+        quota_units_per_second=float(raw.get("quota_units_per_second", 250)),
+        quota_burst=float(raw.get("quota_burst", 250)),
     )
 
 
@@ -52,6 +56,10 @@ def write_template(overwrite: bool = False) -> Path:
         "default_export_limit": 200,
         "default_scan_limit": 500,
         "default_sample": 10,
+        "quota_units_per_second": 250,
+        "quota_burst": 250,
     }
+    import yaml
+
     path.write_text(yaml.safe_dump(data, sort_keys=False), encoding="utf-8")
     return path
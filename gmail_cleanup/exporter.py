@@ -1,14 +1,26 @@
 from __future__ import annotations
 
+import bz2
 import csv
+import gzip
 import json
+import lzma
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional
 
 from googleapiclient.discovery import Resource
 
+from gmail_cleanup.batch_fetch import DEFAULTS as FETCH_DEFAULTS
+from gmail_cleanup.cache import MessageCache, iter_metadata
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+from gmail_cleanup.gmail import ServicePool
 from gmail_cleanup.gmail_iter import iter_message_ids
 
+EXPORT_HEADERS = ["Date", "From", "To", "Subject"]
+
 
 def _get_headers(msg: dict) -> Dict[str, str]:
     headers = msg.get("payload", {}).get("headers", [])
@@ -21,33 +33,257 @@ def _get_headers(msg: dict) -> Dict[str, str]:
     }
 
 
-def fetch_message_row(service: Resource, msg_id: str) -> Dict[str, str]:
-    msg = service.users().messages().get(
-        userId="me",
-        id=msg_id,
-        format="metadata",
-        metadataHeaders=["Date", "From", "To", "Subject"],
-    ).execute()
+def fetch_message_rows(
+    service: Resource,
+    message_ids: Iterable[str],
+    controller: Optional[AdaptiveConcurrency] = None,
+    cache: Optional[MessageCache] = None,
+    workers: int = 1,
+    pool: Optional[ServicePool] = None,
+    executor: Optional[ThreadPoolExecutor] = None,
+) -> Iterator[Dict[str, str]]:
+    """
+    Yield export rows for message IDs, fetched in HTTP batches (or read from
+    `cache` when given), in input order.
+
+    With workers > 1 (and no cache, which is bound to its thread), that many
+    batches are fetched at once, each thread on its own service from `pool`.
+    Callers fetching chunk by chunk should pass one `pool` and `executor` for
+    the whole run so threads and connections are reused (see ServicePool.imap).
+    """
+    if workers > 1 and cache is None:
+        def _fetch(svc: Resource, chunk: list[str]) -> list[dict]:
+            return list(iter_metadata(svc, chunk, headers=EXPORT_HEADERS, controller=controller))
+
+        pool = pool or ServicePool(service)
+        chunks = _chunked(message_ids, FETCH_DEFAULTS.batch_size)
+        batches = pool.imap(_fetch, chunks, workers, executor=executor)
+        msgs: Iterable[dict] = (msg for batch in batches for msg in batch)
+    else:
+        msgs = iter_metadata(service, message_ids, headers=EXPORT_HEADERS, cache=cache, controller=controller)
+    for msg in msgs:
+        yield {"id": msg["id"], **_get_headers(msg)}
+
+
+def _chunked(ids: Iterable[str], size: int) -> Iterator[list[str]]:
+    chunk: list[str] = []
+    for mid in ids:
+        chunk.append(mid)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-    h = _get_headers(msg)
-    return {"id": msg_id, **h}
+
+def fetch_message_row(service: Resource, msg_id: str) -> Dict[str, str]:
+    return next(fetch_message_rows(service, [msg_id]))
 
 
 def export_rows(service: Resource, query: str, limit: int = 200) -> List[Dict[str, str]]:
-    rows: List[Dict[str, str]] = []
-    for msg_id in iter_message_ids(service, query, limit=limit):
-        rows.append(fetch_message_row(service, msg_id))
-    return rows
+    return list(fetch_message_rows(service, iter_message_ids(service, query, limit=limit)))
+
+
+CSV_FIELDS = ["id", "date", "from", "to", "subject"]
+EXPORT_FORMATS = ("csv", "json", "ndjson")
+# Formats that can be appended to, batch by batch (and so resumed).
+APPENDABLE_FORMATS = ("csv", "ndjson")
+
+
+# Stream compressors by name, with the file extension that selects them.
+COMPRESSIONS = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz"}
+COMPRESS_LEVELS = {"gzip": range(1, 10), "bz2": range(1, 10), "xz": range(0, 10)}
+# zlib's and xz's own speed/size defaults; gzip.open would use the slow level 9.
+DEFAULT_COMPRESS_LEVELS = {"gzip": 6, "bz2": 9, "xz": 6}
+
+
+def compression_for(out_path: Path, compress: Optional[str] = None) -> Optional[str]:
+    """
+    Compressor for an export: `compress` when given ("none" disables),
+    else picked from the file extension (.gz, .bz2, .xz).
+    """
+    if compress is not None:
+        if compress == "none":
+            return None
+        if compress not in COMPRESSIONS:
+            raise ValueError(f"compress must be one of: none, {', '.join(COMPRESSIONS)}")
+        return compress
+    suffix = out_path.suffix.lower()
+    return next((name for name, ext in COMPRESSIONS.items() if ext == suffix), None)
+
+
+def compress_level_for(compress: str, level: Optional[int] = None) -> int:
+    """
+    Validate a level for `compress`, defaulting to DEFAULT_COMPRESS_LEVELS.
+    """
+    if level is None:
+        return DEFAULT_COMPRESS_LEVELS[compress]
+    levels = COMPRESS_LEVELS[compress]
+    if level not in levels:
+        raise ValueError(f"{compress} compress level must be {levels.start}-{levels.stop - 1}")
+    return level
+
+
+def _open_text(out_path: Path, mode: str, compress: Optional[str], level: Optional[int]) -> IO[str]:
+    text = {"encoding": "utf-8", "newline": ""}
+    if compress is None:
+        return out_path.open(mode, **text)
+
+    level = compress_level_for(compress, level)
+    # Each appended batch starts a new compressed stream; gzip, bz2 and xz
+    # all read concatenated streams back as one file.
+    if compress == "xz":
+        return lzma.open(out_path, mode + "t", preset=level, **text)
+    opener = gzip.open if compress == "gzip" else bz2.open
+    return opener(out_path, mode + "t", compresslevel=level, **text)
+
+
+@dataclass(frozen=True)
+class ExportDefaults:
+    flush_rows: int = 500  # flush to disk at least every N rows...
+    flush_seconds: float = 2.0  # ...and at least this often, so the file can be tailed
+
+
+DEFAULTS = ExportDefaults()
+
+
+class RowWriter:
+    """
+    Streams export rows to `out_path` one at a time, flushing periodically,
+    so memory stays flat and the file can be read while it is written.
+
+    JSON output is a single array with the same layout as json.dumps(rows,
+    indent=2); csv and ndjson can also append to an existing file. With
+    `compress` (or a .gz/.bz2/.xz `out_path`) rows go through the stdlib
+    stream compressor as they are written.
+    """
+
+    def __init__(
+        self,
+        out_path: Path,
+        fmt: str = "csv",
+        *,
+        append: bool = False,
+        compress: Optional[str] = None,
+        compress_level: Optional[int] = None,
+        defaults: ExportDefaults = DEFAULTS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"fmt must be one of: {', '.join(EXPORT_FORMATS)}")
+        if append and fmt not in APPENDABLE_FORMATS:
+            raise ValueError(f"Cannot append to a {fmt} export.")
+
+        self.fmt = fmt
+        self.compress = compression_for(out_path, compress)
+        self.written = 0
+        self._defaults = defaults
+        self._clock = clock
+
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        new_file = not append or not out_path.exists() or out_path.stat().st_size == 0
+        self._f = _open_text(out_path, "a" if append else "w", self.compress, compress_level)
+        self._pending = 0
+        self._last_flush = clock()
+
+        self._csv: Optional[csv.DictWriter] = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(self._f, fieldnames=CSV_FIELDS)
+            if new_file:
+                self._csv.writeheader()
+        elif fmt == "json":
+            self._f.write("[")
+
+    def write(self, row: Dict[str, str]) -> None:
+        if self._csv is not None:
+            self._csv.writerow(row)
+        elif self.fmt == "ndjson":
+            self._f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            item = json.dumps(row, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            self._f.write(("," if self.written else "") + "\n  " + item)
+        self.written += 1
+
+        self._pending += 1
+        if (
+            self._pending >= self._defaults.flush_rows
+            or self._clock() - self._last_flush >= self._defaults.flush_seconds
+        ):
+            self.flush()
+
+    def write_all(self, rows: Iterable[Dict[str, str]]) -> int:
+        for row in rows:
+            self.write(row)
+        return self.written
+
+    def flush(self) -> None:
+        self._f.flush()
+        self._pending = 0
+        self._last_flush = self._clock()
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        if self.fmt == "json":
+            self._f.write("\n]" if self.written else "]")
+        self._f.close()
+
+    def __enter__(self) -> "RowWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def stream_rows(
+    rows: Iterable[Dict[str, str]],
+    out_path: Path,
+    fmt: str = "csv",
+    *,
+    append: bool = False,
+    compress: Optional[str] = None,
+    compress_level: Optional[int] = None,
+) -> int:
+    """
+    Write rows as they arrive; returns how many were written.
+    """
+    with RowWriter(out_path, fmt, append=append, compress=compress, compress_level=compress_level) as writer:
+        return writer.write_all(rows)
+
+
+def write_csv(rows: Iterable[Dict[str, str]], out_path: Path) -> None:
+    stream_rows(rows, out_path, "csv")
+
+
+def append_csv(rows: Iterable[Dict[str, str]], out_path: Path) -> None:
+    """
+    Append rows to a CSV export, writing the header first if the file is new or empty.
+    """
+    stream_rows(rows, out_path, "csv", append=True)
+
+
+def append_rows(
+    rows: Iterable[Dict[str, str]],
+    out_path: Path,
+    fmt: str = "csv",
+    compress: Optional[str] = None,
+    compress_level: Optional[int] = None,
+) -> int:
+    """
+    Append rows to a csv or ndjson export (one resumable batch).
+    """
+    return stream_rows(rows, out_path, fmt, append=True, compress=compress, compress_level=compress_level)
 
 
-def write_csv(rows: List[Dict[str, str]], out_path: Path) -> None:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with out_path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=["id", "date", "from", "to", "subject"])
-        w.writeheader()
-        w.writerows(rows)
+def truncate_export(out_path: Path, size: int) -> None:
+    """
+    Cut a csv or ndjson export back to `size` bytes, dropping rows (or a
+    partly written compressed stream) appended after that point.
+    """
+    if out_path.exists() and out_path.stat().st_size > size:
+        with out_path.open("r+b") as fh:
+            fh.truncate(size)
 
 
-def write_json(rows: List[Dict[str, str]], out_path: Path) -> None:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+def write_json(rows: Iterable[Dict[str, str]], out_path: Path) -> None:
+    stream_rows(rows, out_path, "json")
@@ -1,43 +1,32 @@
 from __future__ import annotations
 
-import json
-import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
 
+import google_auth_httplib2
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import Resource, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import HttpRequest, build_http
 
+from gmail_cleanup.appdata import (  # noqa: F401  (re-exported)
+    SCOPES,
+    _app_data_dir,
+    credentials_path,
+    ensure_app_dir,
+    token_path,
+)
+from gmail_cleanup.config import load_config
+from gmail_cleanup.quota import scheduler_for_account
 
-SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]  # safe for later (trash/label), still dry-run now
-
-
-def _app_data_dir() -> Path:
-    """
-    Store token outside the repo to keep public repo clean.
-    Windows: %APPDATA%/gmail-cleanup/
-    macOS/Linux: ~/.config/gmail-cleanup/
-    """
-    appdata = os.environ.get("APPDATA")
-    if appdata:
-        return Path(appdata) / "gmail-cleanup"
-    return Path.home() / ".config" / "gmail-cleanup"
-
-
-def credentials_path() -> Path:
-    return _app_data_dir() / "credentials.json"
-
-
-def token_path() -> Path:
-    return _app_data_dir() / "token.json"
-
-
-def ensure_app_dir() -> Path:
-    d = _app_data_dir()
-    d.mkdir(parents=True, exist_ok=True)
-    return d
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def ensure_credentials_file_in_app_dir(project_root_credentials: Path = Path("credentials.json")) -> Path:
@@ -62,7 +51,174 @@ def ensure_credentials_file_in_app_dir(project_root_credentials: Path = Path("cr
     )
 
 
-def get_gmail_service():
+_DISCOVERY_DOC: Optional[str] = None
+_SERVICES: dict[str, Resource] = {}
+_POOLS: dict[str, "ServicePool"] = {}
+_SERVICES_LOCK = threading.Lock()
+
+
+def gmail_discovery_document() -> str:
+    """
+    Gmail v1 discovery document bundled with google-api-python-client, read
+    once per process. Building from it never touches the network.
+    """
+    global _DISCOVERY_DOC
+    if _DISCOVERY_DOC is None:
+        doc = get_static_doc("gmail", "v1")
+        if doc is None:
+            raise RuntimeError("google-api-python-client does not bundle the Gmail v1 discovery document.")
+        _DISCOVERY_DOC = doc
+    return _DISCOVERY_DOC
+
+
+class SharedCredentials:
+    """
+    Credentials shared by many transports (one per thread). Refreshes are
+    serialized, and a thread whose token was already replaced by another
+    thread's refresh reuses the new token instead of refreshing again.
+    Everything else is delegated to the wrapped credentials.
+    """
+
+    def __init__(self, credentials) -> None:
+        self._credentials = credentials
+        self._lock = threading.Lock()
+        self._used = threading.local()  # token each thread last sent
+        self.refreshes = 0
+
+    def __getattr__(self, name: str):
+        return getattr(self._credentials, name)
+
+    def before_request(self, request, method, url, headers) -> None:
+        if not self._credentials.valid:
+            self.refresh(request)
+        self._used.token = self._credentials.token
+        self._credentials.before_request(request, method, url, headers)
+
+    def refresh(self, request) -> None:
+        stale = getattr(self._used, "token", None)
+        with self._lock:
+            if self._credentials.valid and self._credentials.token != stale:
+                return
+            self._credentials.refresh(request)
+            self.refreshes += 1
+
+
+def build_gmail_service(creds, request_builder=HttpRequest) -> Resource:
+    if not isinstance(creds, SharedCredentials):
+        creds = SharedCredentials(creds)
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=build_http())
+    return build_from_document(gmail_discovery_document(), http=http, requestBuilder=request_builder)
+
+
+class ServicePool:
+    """
+    Gmail services for worker threads. httplib2 connections are not
+    thread-safe, so every thread gets its own service and transport, all
+    authorized by the primary service's SharedCredentials (one coordinated
+    token refresh) and built with its request builder (one quota budget).
+
+    The thread that creates the pool uses `primary` itself. Services without
+    credentials (e.g. test doubles) are handed out as-is to every thread.
+    """
+
+    def __init__(self, primary: Resource) -> None:
+        self.primary = primary
+        self.credentials = getattr(getattr(primary, "_http", None), "credentials", None)
+        self._request_builder = getattr(primary, "_requestBuilder", HttpRequest)
+        self._local = threading.local()
+        self._local.service = primary
+
+    def service(self) -> Resource:
+        """
+        The calling thread's service, built on first use.
+        """
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self.primary if self.credentials is None else build_gmail_service(
+                self.credentials, request_builder=self._request_builder
+            )
+            self._local.service = service
+        return service
+
+    def imap(
+        self,
+        fn: Callable[[Resource, T], R],
+        items: Iterable[T],
+        workers: int = 1,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ) -> Iterator[R]:
+        """
+        fn(service, item) for every item on `workers` threads, each with its
+        own service; results in input order, at most `workers` in flight.
+
+        Pass a long-lived `executor` when calling repeatedly: its threads, and
+        the services (connections) they hold, are then reused across calls.
+        Without one, a pool is started and shut down for this call.
+        """
+        if workers <= 1:
+            for item in items:
+                yield fn(self.service(), item)
+            return
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gmail-worker") as executor:
+                yield from self.imap(fn, items, workers, executor=executor)
+            return
+
+        def _call(item: T) -> R:
+            return fn(self.service(), item)
+
+        in_flight: deque = deque()
+        try:
+            for item in items:
+                in_flight.append(executor.submit(_call, item))
+                if len(in_flight) >= workers:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+def get_gmail_service() -> Resource:
+    """
+    Return the process-wide Gmail service for the saved token, authorizing on
+    first use. Later calls reuse it; its transport refreshes the access token
+    when it expires.
+    """
+    key = str(token_path())
+    with _SERVICES_LOCK:
+        service = _SERVICES.get(key)
+        if service is None:
+            service = _new_gmail_service()
+            _SERVICES[key] = service
+        return service
+
+
+def get_service_pool() -> ServicePool:
+    """
+    Return the process-wide pool around get_gmail_service()'s service.
+    """
+    service = get_gmail_service()
+    key = str(token_path())
+    with _SERVICES_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None or pool.primary is not service:
+            pool = ServicePool(service)
+            _POOLS[key] = pool
+        return pool
+
+
+def reset_gmail_services() -> None:
+    """
+    Forget cached services and pools (e.g. after the saved token changed).
+    """
+    with _SERVICES_LOCK:
+        _SERVICES.clear()
+        _POOLS.clear()
+
+
+def _new_gmail_service() -> Resource:
     ensure_app_dir()
     cred_file = ensure_credentials_file_in_app_dir()
     tok_file = token_path()
@@ -80,4 +236,25 @@ def get_gmail_service():
     # Save token outside repo
     tok_file.write_text(creds.to_json(), encoding="utf-8")
 
-    return build("gmail", "v1", credentials=creds)
+    cfg = load_config()
+    scheduler = scheduler_for_account(
+        str(tok_file),
+        units_per_second=cfg.quota_units_per_second,
+        burst=cfg.quota_burst,
+    )
+    return build_gmail_service(creds, request_builder=scheduler.request_builder)
+
+
+def new_http_for(service) -> Optional[httplib2.Http]:
+    """
+    Return a fresh authorized transport sharing the service's credentials,
+    with the same socket timeout as the service's own (build_http()).
+
+    httplib2 connections are not thread-safe, so a background thread must not
+    reuse the service's own transport. Returns None when the service carries no
+    credentials (e.g. test doubles); callers then fall back to the default http.
+    """
+    creds = getattr(getattr(service, "_http", None), "credentials", None)
+    if creds is None:
+        return None
+    return google_auth_httplib2.AuthorizedHttp(creds, http=build_http())
@@ -5,20 +5,38 @@ from typing import Iterator, Optional
 
 from googleapiclient.discovery import Resource
 
+from gmail_cleanup.concurrency import produce_in_threads
+from gmail_cleanup.gmail import new_http_for
+from gmail_cleanup.query_plan import execute, plan_query
+
+
+# Partial response: listing only needs IDs (threadId is dropped from every entry).
+LIST_FIELDS = "messages/id,nextPageToken,resultSizeEstimate"
+
 
 @dataclass(frozen=True)
 class IterDefaults:
     page_size: int = 500  # Gmail list maxResults cap is 500
+    prefetch: int = 2  # pages buffered ahead of the consumer in prefetch mode
 
 
 DEFAULTS = IterDefaults()
 
 
+@dataclass(frozen=True)
+class MessagePage:
+    ids: list[str]
+    page_token: Optional[str]  # token that produced this page (None = first page)
+    next_page_token: Optional[str]
+
+
 def iter_message_id_pages(
     service: Resource,
     query: str,
     page_size: int = DEFAULTS.page_size,
     limit: int = 0,
+    prefetch: int = 0,
+    http=None,
 ) -> Iterator[list[str]]:
     """
     Yield pages (lists) of Gmail message IDs for a query.
@@ -28,12 +46,67 @@ def iter_message_id_pages(
       query: Gmail search query
       page_size: list() page size (max 500)
       limit: max message IDs overall (0 = no limit)
+      prefetch: pages to list ahead on a background thread while the caller
+        works on the current one (0 = list synchronously)
+      http: connection to list on (see iter_pages)
 
     Yields:
       list[str] of message IDs
     """
-    token: Optional[str] = None
+    for page in iter_pages(service, query, page_size=page_size, limit=limit, prefetch=prefetch, http=http):
+        yield page.ids
+
+
+def iter_pages(
+    service: Resource,
+    query: str,
+    page_size: int = DEFAULTS.page_size,
+    limit: int = 0,
+    prefetch: int = 0,
+    page_token: Optional[str] = None,
+    http=None,
+) -> Iterator[MessagePage]:
+    """
+    Like iter_message_id_pages, but yields MessagePage objects carrying the page
+    tokens, and can start from a previously seen `page_token`.
+
+    `http` runs the list calls on that connection instead of the service's
+    own (needed when listing from a thread other than the service's).
+    """
+    if prefetch > 0:
+        pages = _list_pages(service, query, page_size, limit, page_token, http=http or new_http_for(service))
+        yield from _prefetched(pages, prefetch)
+    else:
+        yield from _list_pages(service, query, page_size, limit, page_token, http=http)
+
+
+def iter_message_ids(
+    service: Resource,
+    query: str,
+    page_size: int = DEFAULTS.page_size,
+    limit: int = 0,
+) -> Iterator[str]:
+    """
+    Flattened iterator that yields message IDs one by one.
+    """
+    for page in iter_message_id_pages(service, query, page_size=page_size, limit=limit):
+        for mid in page:
+            yield mid
+
+
+def _list_pages(
+    service: Resource,
+    query: str,
+    page_size: int,
+    limit: int,
+    page_token: Optional[str] = None,
+    http=None,
+) -> Iterator[MessagePage]:
+    token = page_token
     yielded = 0
+    # Pure label queries (label:, in:, is:, category:) list by labelIds instead of search.
+    plan = plan_query(service, query, http=http)
+    filters = plan.list_kwargs() if plan is not None else {"q": query}
 
     while True:
         if limit:
@@ -44,34 +117,31 @@ def iter_message_id_pages(
         else:
             size = page_size
 
-        resp = service.users().messages().list(
+        request = service.users().messages().list(
             userId="me",
-            q=query,
             maxResults=size,
             pageToken=token,
-        ).execute()
+            fields=LIST_FIELDS,
+            **filters,
+        )
+        resp = execute(request, http)
 
         msgs = resp.get("messages", [])
         ids = [m["id"] for m in msgs]
+        next_token = resp.get("nextPageToken")
 
         if ids:
-            yield ids
+            yield MessagePage(ids=ids, page_token=token, next_page_token=next_token)
             yielded += len(ids)
 
-        token = resp.get("nextPageToken")
+        token = next_token
         if not token or not msgs:
             return
 
 
-def iter_message_ids(
-    service: Resource,
-    query: str,
-    page_size: int = DEFAULTS.page_size,
-    limit: int = 0,
-) -> Iterator[str]:
+def _prefetched(pages: Iterator[MessagePage], depth: int) -> Iterator[MessagePage]:
     """
-    Flattened iterator that yields message IDs one by one.
+    Run a page iterator on a background thread, buffering up to `depth` pages
+    (see produce_in_threads).
     """
-    for page in iter_message_id_pages(service, query, page_size=page_size, limit=limit):
-        for mid in page:
-            yield mid
+    return produce_in_threads([lambda: pages], buffer=depth, thread_name="gmail-list-prefetch")
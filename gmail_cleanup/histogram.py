@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional, Sequence
+
+from googleapiclient.discovery import Resource
+
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+from gmail_cleanup.gmail import new_http_for
+from gmail_cleanup.preview import estimate_messages
+from gmail_cleanup.query_builder import QueryOptions, build_query, narrow
+
+DIMENSIONS = ("size", "date")
+
+# Starting size edges in bytes; the last bucket is open-ended.
+SIZE_EDGES = (0, 10 * 1024, 100 * 1024, 1024**2, 5 * 1024**2, 10 * 1024**2, 25 * 1024**2)
+
+_EPOCH = date(1970, 1, 1)
+
+
+@dataclass(frozen=True)
+class HistogramDefaults:
+    workers: int = 8  # estimate calls in flight (each thread has its own connection)
+    max_calls: int = 400  # list calls per histogram; the starting buckets are always estimated
+    split_share: float = 0.1  # bisect buckets estimated to hold more than this share of matches
+    since_year: int = 2004  # first yearly date edge; older mail lands in one open bucket
+    min_size_width: int = 1024  # bytes
+    min_date_width: int = 1  # days
+
+
+DEFAULTS = HistogramDefaults()
+
+
+@dataclass(frozen=True)
+class CountBucket:
+    dimension: str
+    lo: Optional[int]  # bytes, or days since 1970-01-01; None = unbounded
+    hi: Optional[int]  # exclusive
+    estimate: int
+    options: QueryOptions
+
+    @property
+    def query(self) -> str:
+        return build_query(self.options)
+
+
+@dataclass(frozen=True)
+class CountHistogram:
+    dimension: str
+    buckets: list[CountBucket]
+    calls: int  # list calls spent
+
+    @property
+    def total(self) -> int:
+        return sum(b.estimate for b in self.buckets)
+
+
+def day_to_date(days: int) -> date:
+    return _EPOCH + timedelta(days=days)
+
+
+def initial_edges(
+    dimension: str,
+    since_year: int = DEFAULTS.since_year,
+    today: Optional[date] = None,
+) -> list[tuple[Optional[int], Optional[int]]]:
+    """
+    Starting buckets: SIZE_EDGES for size, calendar years from since_year to
+    this year for date (plus open buckets before and after).
+    """
+    if dimension == "size":
+        edges: list[Optional[int]] = [*SIZE_EDGES, None]
+        return list(zip(edges, edges[1:]))
+    if dimension == "date":
+        today = today or date.today()
+        years = [(date(year, 1, 1) - _EPOCH).days for year in range(since_year, today.year + 2)]
+        edges = [None, *years, None]
+        return list(zip(edges, edges[1:]))
+    raise ValueError(f"dimension must be one of: {', '.join(DIMENSIONS)}")
+
+
+def bucket_options(base: QueryOptions, dimension: str, lo: Optional[int], hi: Optional[int]) -> QueryOptions:
+    """
+    `base` narrowed to [lo, hi): larger:/smaller: in bytes (both strict in
+    Gmail), or after:/before: dates.
+    """
+    if dimension == "size":
+        return narrow(
+            base,
+            larger=str(lo - 1) if lo else None,
+            smaller=str(hi) if hi is not None else None,
+        )
+    return narrow(
+        base,
+        after=day_to_date(lo).strftime("%Y/%m/%d") if lo is not None else None,
+        before=day_to_date(hi).strftime("%Y/%m/%d") if hi is not None else None,
+    )
+
+
+def split_point(dimension: str, lo: Optional[int], hi: Optional[int]) -> Optional[int]:
+    """
+    Where to bisect [lo, hi), or None when the bucket is open or already at the
+    minimum width. Sizes split geometrically (they spread over orders of
+    magnitude), dates in the middle.
+    """
+    if lo is None or hi is None:
+        return None
+    if dimension == "size":
+        if hi - lo < 2 * DEFAULTS.min_size_width:
+            return None
+        return int(math.sqrt(lo * hi)) if lo > 0 else hi // 2
+    if hi - lo < 2 * DEFAULTS.min_date_width:
+        return None
+    return (lo + hi) // 2
+
+
+class _Estimator:
+    """
+    resultSizeEstimate for many queries on a thread pool. Each worker thread
+    lists on its own connection; calls still go through the service's quota
+    scheduler and are retried on throttling by the AIMD controller.
+    """
+
+    def __init__(self, service: Resource, workers: int, controller: AdaptiveConcurrency) -> None:
+        self._service = service
+        self._controller = controller
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gmail-histogram")
+        self.calls = 0
+
+    def estimate(self, queries: Sequence[str]) -> list[int]:
+        self.calls += len(queries)
+        return list(self._pool.map(self._one, queries))
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def _one(self, query: str) -> int:
+        if not hasattr(self._local, "http"):
+            self._local.http = new_http_for(self._service)
+        return self._controller.run(lambda: estimate_messages(self._service, query, http=self._local.http))
+
+
+def count_histogram(
+    service: Resource,
+    base: QueryOptions,
+    by: str = "size",
+    workers: int = DEFAULTS.workers,
+    max_calls: int = DEFAULTS.max_calls,
+    split_share: float = DEFAULTS.split_share,
+    since_year: int = DEFAULTS.since_year,
+    controller: Optional[AdaptiveConcurrency] = None,
+    today: Optional[date] = None,
+    split_above: Optional[int] = None,
+) -> CountHistogram:
+    """
+    Size or date distribution of `base`'s matches without fetching a message.
+
+    Every bucket is one list call with maxResults=1 (its resultSizeEstimate).
+    Starting buckets are estimated in parallel; then, round by round, buckets
+    holding more than split_share of the total are bisected and their halves
+    estimated, until none is heavy or max_calls is spent. With split_above,
+    heavy means an estimate above that many messages instead.
+    """
+    if by not in DIMENSIONS:
+        raise ValueError(f"by must be one of: {', '.join(DIMENSIONS)}")
+    if max_calls < 1:
+        raise ValueError("max_calls must be >= 1")
+
+    controller = controller or AdaptiveConcurrency()
+    estimator = _Estimator(service, workers, controller)
+    try:
+        ranges = initial_edges(by, since_year=since_year, today=today)
+        estimates = dict(zip(ranges, estimator.estimate([_query(base, by, r) for r in ranges])))
+        threshold = split_above if split_above is not None else sum(estimates.values()) * split_share
+
+        while True:
+            heavy = sorted(
+                (r for r, n in estimates.items() if n > threshold and split_point(by, *r) is not None),
+                key=lambda r: -estimates[r],
+            )[: max(0, max_calls - estimator.calls) // 2]
+            if not heavy:
+                break
+            halves: list[tuple[Optional[int], Optional[int]]] = []
+            for lo, hi in heavy:
+                mid = split_point(by, lo, hi)
+                halves += [(lo, mid), (mid, hi)]
+                del estimates[(lo, hi)]
+            estimates.update(zip(halves, estimator.estimate([_query(base, by, r) for r in halves])))
+    finally:
+        estimator.close()
+
+    ordered = sorted(estimates, key=lambda r: -math.inf if r[0] is None else r[0])
+    buckets = [
+        CountBucket(by, lo, hi, estimates[(lo, hi)], bucket_options(base, by, lo, hi)) for lo, hi in ordered
+    ]
+    return CountHistogram(by, buckets, estimator.calls)
+
+
+def _query(base: QueryOptions, dimension: str, bounds: tuple[Optional[int], Optional[int]]) -> str:
+    return build_query(bucket_options(base, dimension, *bounds))
@@ -4,7 +4,8 @@ from typing import List
 
 from googleapiclient.discovery import Resource
 
-from gmail_cleanup.gmail_iter import iter_message_id_pages
+from gmail_cleanup.gmail_iter import DEFAULTS, iter_message_id_pages
+from gmail_cleanup.write_batch import write_pages
 
 
 def remove_label(service: Resource, label_id: str, message_ids: List[str]) -> None:
@@ -34,16 +35,5 @@ def clear_label_from_query(service: Resource, query: str, label_id: str, limit:
     Returns:
         Number of messages updated
     """
-    done = 0
-
-    for ids in iter_message_id_pages(service, query, limit=limit):
-        if not ids:
-            break
-
-        remove_label(service, label_id, ids)
-        done += len(ids)
-
-        if limit and done >= limit:
-            break
-
-    return done
+    pages = iter_message_id_pages(service, query, limit=limit, prefetch=DEFAULTS.prefetch)
+    return write_pages(pages, lambda ids: remove_label(service, label_id, ids))
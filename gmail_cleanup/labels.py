@@ -1,28 +1,238 @@
 from __future__ import annotations
 
-from typing import Optional
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Optional
 
 from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from gmail_cleanup.appdata import _app_data_dir
+from gmail_cleanup.quota import reserve_batch
+
+
+@dataclass(frozen=True)
+class LabelDefaults:
+    ttl_seconds: float = 600.0  # how long a loaded label list is trusted
+
+
+DEFAULTS = LabelDefaults()
+
+
+def labels_cache_dir() -> Path:
+    return _app_data_dir() / "labels"
+
+
+class LabelRegistry:
+    """
+    Label list for one account, loaded once and kept in memory and (when
+    `path` is set) on disk for `ttl` seconds.
+
+    Names resolve in bulk against the loaded list; missing labels are created
+    in one HTTP batch and written through to the cache. A name that is not in
+    a cached list triggers one reload before anything is created, so labels
+    made elsewhere since the cache was filled are not duplicated.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        ttl: float = DEFAULTS.ttl_seconds,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._labels: Optional[list[dict]] = None
+        self._loaded_at = 0.0
+
+    def labels(self, service: Resource, http=None) -> list[dict]:
+        """
+        Return the account's labels (id, name, type), calling labels.list only
+        when neither the memory nor the disk copy is fresh.
+        """
+        with self._lock:
+            return list(self._current(service, http)[0])
+
+    def resolve(self, service: Resource, names: Iterable[str], http=None) -> dict[str, Optional[str]]:
+        """
+        Map label names to IDs (None for labels that do not exist).
+        """
+        names = list(dict.fromkeys(names))
+        with self._lock:
+            labels, fetched = self._current(service, http)
+            by_name = {lbl["name"]: lbl["id"] for lbl in labels}
+            if not fetched and any(name not in by_name for name in names):
+                by_name = {lbl["name"]: lbl["id"] for lbl in self._reload(service, http)}
+            return {name: by_name.get(name) for name in names}
+
+    def ensure(self, service: Resource, names: Iterable[str]) -> dict[str, str]:
+        """
+        Map label names to IDs, creating the missing ones in a single HTTP batch.
+        """
+        with self._lock:
+            ids = self.resolve(service, names)
+            missing = [name for name, label_id in ids.items() if label_id is None]
+            if missing:
+                ids.update(self._create(service, missing))
+            return ids
+
+    def delete(self, service: Resource, name: str) -> bool:
+        """
+        Delete a label by name. Returns False if it did not exist.
+        """
+        with self._lock:
+            label_id = self.resolve(service, [name])[name]
+            if label_id is None:
+                return False
+            service.users().labels().delete(userId="me", id=label_id).execute()
+            self.invalidate()
+            return True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._labels = None
+            self._loaded_at = 0.0
+            if self.path is not None:
+                self.path.unlink(missing_ok=True)
+
+    def _fresh(self, loaded_at: float) -> bool:
+        return self._clock() - loaded_at < self._ttl
+
+    def _current(self, service: Resource, http=None) -> tuple[list[dict], bool]:
+        """
+        Cached labels if fresh, else a new labels.list; the flag says which.
+        """
+        if self._labels is not None and self._fresh(self._loaded_at):
+            return self._labels, False
+        if self._load_disk():
+            return self._labels, False
+        return self._reload(service, http), True
+
+    def _reload(self, service: Resource, http=None) -> list[dict]:
+        request = service.users().labels().list(userId="me", fields="labels(id,name,type)")
+        resp = request.execute(http=http) if http is not None else request.execute()
+        labels = [
+            {"id": lbl["id"], "name": lbl.get("name", ""), "type": lbl.get("type", "user")}
+            for lbl in resp.get("labels", [])
+        ]
+        self._store(labels)
+        return list(labels)
+
+    def _store(self, labels: list[dict], loaded_at: Optional[float] = None) -> None:
+        self._labels = labels
+        self._loaded_at = self._clock() if loaded_at is None else loaded_at
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"loaded_at": self._loaded_at, "labels": labels}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _load_disk(self) -> bool:
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            loaded_at = float(raw["loaded_at"])
+            labels = list(raw["labels"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        if not self._fresh(loaded_at):
+            return False
+        self._labels = labels
+        self._loaded_at = loaded_at
+        return True
+
+    def _create(self, service: Resource, names: list[str]) -> dict[str, str]:
+        created: dict[str, dict] = {}
+        conflicts: list[str] = []
+        errors: list[BaseException] = []
+
+        def _on_response(request_id: str, response: dict, exception: BaseException | None) -> None:
+            name = names[int(request_id)]
+            if exception is None:
+                created[name] = response
+            elif isinstance(exception, HttpError) and exception.resp.status == 409:
+                conflicts.append(name)  # made elsewhere in the meantime
+            else:
+                errors.append(exception)
+
+        batch = service.new_batch_http_request(callback=_on_response)
+        requests = []
+        for idx, name in enumerate(names):
+            request = service.users().labels().create(
+                userId="me",
+                body={
+                    "name": name,
+                    "labelListVisibility": "labelShow",
+                    "messageListVisibility": "show",
+                },
+                fields="id,name",
+            )
+            batch.add(request, request_id=str(idx))
+            requests.append(request)
+        reserve_batch(requests)
+        batch.execute()
+
+        if errors:
+            self.invalidate()
+            raise errors[0]
+
+        labels = list(self._labels or [])
+        labels.extend({"id": lbl["id"], "name": name, "type": "user"} for name, lbl in created.items())
+        # Created labels extend the list without resetting its age.
+        self._store(labels, loaded_at=self._loaded_at)
+        ids = {name: lbl["id"] for name, lbl in created.items()}
+
+        if conflicts:
+            by_name = {lbl["name"]: lbl["id"] for lbl in self._reload(service)}
+            ids.update({name: by_name[name] for name in conflicts if name in by_name})
+        return ids
+
+
+_REGISTRIES: dict[str, LabelRegistry] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+def registry_for(service: Resource) -> LabelRegistry:
+    """
+    Return the process-wide label registry for the service's account, backed by
+    a file under the app data dir. Services without credentials (e.g. test
+    doubles) get a fresh memory-only registry.
+    """
+    creds = getattr(getattr(service, "_http", None), "credentials", None)
+    refresh_token = getattr(creds, "refresh_token", None)
+    if not refresh_token:
+        return LabelRegistry()
+
+    account = hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()[:16]
+    with _REGISTRIES_LOCK:
+        registry = _REGISTRIES.get(account)
+        if registry is None:
+            registry = LabelRegistry(path=labels_cache_dir() / f"{account}.json")
+            _REGISTRIES[account] = registry
+        return registry
 
 
 def get_or_create_label_id(service: Resource, label_name: str) -> str:
     """
     Return labelId for a label name, creating it if needed.
     """
-    labels = service.users().labels().list(userId="me").execute().get("labels", [])
-    for lbl in labels:
-        if lbl.get("name") == label_name:
-            return lbl["id"]
+    return registry_for(service).ensure(service, [label_name])[label_name]
 
-    created = service.users().labels().create(
-        userId="me",
-        body={
-            "name": label_name,
-            "labelListVisibility": "labelShow",
-            "messageListVisibility": "show",
-        },
-    ).execute()
-    return created["id"]
+
+def get_or_create_label_ids(service: Resource, label_names: Iterable[str]) -> dict[str, str]:
+    """
+    Bulk version of get_or_create_label_id: one label lookup, one batch of creates.
+    """
+    return registry_for(service).ensure(service, label_names)
 
 
 def apply_label_to_messages(service: Resource, label_id: str, message_ids: list[str]) -> None:
@@ -1,65 +1,127 @@
 from __future__ import annotations
 
+import threading
 from email.utils import parsedate_to_datetime
-from typing import List
+from typing import List, Optional
 
 from googleapiclient.discovery import Resource
 
-from gmail_cleanup.gmail_iter import iter_message_id_pages
+from gmail_cleanup.cache import MessageCache, iter_ids, iter_metadata
+from gmail_cleanup.gmail import new_http_for
+from gmail_cleanup.gmail_iter import iter_pages
+from gmail_cleanup.query_plan import execute, label_total, plan_query
 
 
-def count_messages(service: Resource, query: str) -> int:
+def count_messages(service: Resource, query: str, http=None) -> int:
     """
     Count how many messages match a Gmail query.
+
+    `in:spam` / `in:trash` are counted with one labels.get call (see
+    query_plan.label_total); anything else pages through every ID, listing
+    label-only queries by labelIds rather than searching.
     """
+    plan = plan_query(service, query, http=http)
+    if plan is not None and plan.countable:
+        return label_total(service, plan.label_ids[0], http=http)
+
     total = 0
-    for ids in iter_message_id_pages(service, query):
-        total += len(ids)
+    for page in iter_pages(service, query, http=http):
+        total += len(page.ids)
     return total
 
 
-def sample_messages(service: Resource, query: str, limit: int = 10) -> List[dict]:
+def estimate_messages(service: Resource, query: str, http=None) -> int:
+    """
+    Approximate match count from a single list call (Gmail's resultSizeEstimate).
+
+    Gmail documents this as an estimate; it can be off, especially for large
+    result sets. Single-label queries use the label's messagesTotal instead,
+    which can only overstate (it includes Spam/Trash). Use count_messages /
+    BackgroundCount when the exact number matters.
+    """
+    plan = plan_query(service, query, http=http)
+    if plan is not None and plan.estimable:
+        return label_total(service, plan.label_ids[0], http=http)
+
+    request = service.users().messages().list(
+        userId="me", q=query, maxResults=1, fields="resultSizeEstimate"
+    )
+    resp = execute(request, http)
+    return int(resp.get("resultSizeEstimate", 0))
+
+
+class BackgroundCount:
+    """
+    Exact count of a query, computed on a background thread with its own HTTP
+    connection so the caller can keep using `service` meanwhile.
+    """
+
+    def __init__(self, service: Resource, query: str) -> None:
+        self.query = query
+        self._service = service
+        self._value: Optional[int] = None
+        self._error: Optional[BaseException] = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gmail-count", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            self._value = count_messages(self._service, self.query, http=new_http_for(self._service))
+        except BaseException as exc:
+            self._error = exc
+        finally:
+            self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self, timeout: Optional[float] = None) -> int:
+        """
+        Wait for the exact count. Re-raises the counting error, if any.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Count for {self.query!r} still running")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def sample_messages(
+    service: Resource,
+    query: str,
+    limit: int = 10,
+    cache: Optional[MessageCache] = None,
+) -> List[dict]:
     """
     Return a small sample of messages with date, from, subject.
     """
     rows: List[dict] = []
-    collected = 0
-
-    for ids in iter_message_id_pages(service, query, limit=limit):
-        for msg_id in ids:
-            if collected >= limit:
-                return rows
-
-            msg = service.users().messages().get(
-                userId="me",
-                id=msg_id,
-                format="metadata",
-                metadataHeaders=["From", "Date", "Subject"],
-            ).execute()
-
-            headers = {
-                h["name"].lower(): h.get("value", "")
-                for h in msg.get("payload", {}).get("headers", [])
-            }
+    if limit <= 0:
+        return rows
 
-            date_raw = headers.get("date", "")
-            try:
-                date_fmt = parsedate_to_datetime(date_raw).strftime(
-                    "%Y-%m-%d %H:%M:%S %z"
-                )
-            except Exception:
-                date_fmt = date_raw
-
-            rows.append(
-                {
-                    "date": date_fmt,
-                    "from": headers.get("from", ""),
-                    "subject": headers.get("subject", ""),
-                }
+    ids = iter_ids(service, query, cache=cache, limit=limit)
+    for msg in iter_metadata(service, ids, headers=["From", "Date", "Subject"], cache=cache):
+        headers = {
+            h["name"].lower(): h.get("value", "")
+            for h in msg.get("payload", {}).get("headers", [])
+        }
+
+        date_raw = headers.get("date", "")
+        try:
+            date_fmt = parsedate_to_datetime(date_raw).strftime(
+                "%Y-%m-%d %H:%M:%S %z"
             )
-            collected += 1
+        except Exception:
+            date_fmt = date_raw
 
-        if collected >= limit:
-            break
+        rows.append(
+            {
+                "date": date_fmt,
+                "from": headers.get("from", ""),
+                "subject": headers.get("subject", ""),
+            }
+        )
 
     return rows
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Optional
 
 
@@ -67,6 +67,26 @@ def build_query(opts: QueryOptions) -> str:
     return " ".join(parts).strip()
 
 
+def narrow(base: QueryOptions, **filters: Optional[str]) -> QueryOptions:
+    """
+    `base` with extra filters. A filter whose field `base` already sets to a
+    different value is appended to `q` instead, so both still apply.
+    """
+    extra: list[str] = []
+    updates: dict[str, Optional[str]] = {}
+    for name, value in filters.items():
+        if value is None:
+            continue
+        current = getattr(base, name)
+        if current is None:
+            updates[name] = value
+        elif current != value:
+            extra.append(build_query(QueryOptions(**{name: value})))
+    if extra:
+        updates["q"] = " ".join([base.q, *extra] if base.q else extra)
+    return replace(base, **updates)
+
+
 def _quote_if_needed(text: str) -> str:
     text = text.strip()
     if " " in text and not (text.startswith('"') and text.endswith('"')):
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import re
+import shlex
+from dataclasses import dataclass
+from typing import Optional
+
+from googleapiclient.discovery import Resource
+
+from gmail_cleanup.labels import registry_for
+
+# Search operators that are plain label filters, mapped to system label IDs.
+IN_LABELS = {
+    "inbox": "INBOX",
+    "sent": "SENT",
+    "draft": "DRAFT",
+    "drafts": "DRAFT",
+    "spam": "SPAM",
+    "trash": "TRASH",
+    "starred": "STARRED",
+    "important": "IMPORTANT",
+}
+IS_LABELS = {
+    "unread": "UNREAD",
+    "starred": "STARRED",
+    "important": "IMPORTANT",
+}
+CATEGORY_LABELS = {
+    "primary": "CATEGORY_PERSONAL",
+    "personal": "CATEGORY_PERSONAL",
+    "social": "CATEGORY_SOCIAL",
+    "promotions": "CATEGORY_PROMOTIONS",
+    "updates": "CATEGORY_UPDATES",
+    "forums": "CATEGORY_FORUMS",
+}
+SYSTEM_LABEL_NAMES = {name.lower(): name for name in [*IN_LABELS.values(), *IS_LABELS.values()]}
+# Listing by these labels must opt in to spam/trash, like `in:spam` / `in:trash` searches do.
+SPAM_TRASH = {"SPAM", "TRASH"}
+
+_TOKEN = re.compile(r"^(label|in|is|category):(.+)$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """
+    A query that only filters by labels, listed with `labelIds` instead of a
+    full-text search.
+    """
+
+    query: str
+    label_ids: tuple[str, ...]
+
+    @property
+    def include_spam_trash(self) -> bool:
+        return bool(SPAM_TRASH.intersection(self.label_ids))
+
+    @property
+    def countable(self) -> bool:
+        """
+        True when labels.get counts the query exactly: Spam or Trash alone.
+        Any other label's messagesTotal also counts its messages in Spam and
+        Trash, which listing it skips (see `estimable`).
+        """
+        return len(self.label_ids) == 1 and self.label_ids[0] in SPAM_TRASH
+
+    @property
+    def estimable(self) -> bool:
+        """
+        True when labels.get gives an upper-bound estimate (a single label).
+        """
+        return len(self.label_ids) == 1
+
+    def list_kwargs(self) -> dict:
+        return {"labelIds": list(self.label_ids), "includeSpamTrash": self.include_spam_trash}
+
+
+def normalize_label_name(name: str) -> str:
+    """
+    Gmail search matches labels case-insensitively, with spaces and `/`
+    interchangeable with `-` (`label:cleanup-candidates` finds cleanup/candidates).
+    """
+    return re.sub(r"[\s/-]+", "-", name.strip().lower())
+
+
+def plan_query(service: Resource, query: str, http=None) -> Optional[QueryPlan]:
+    """
+    Return a QueryPlan when every term of `query` is a `label:`, `in:`, `is:`
+    or `category:` filter that maps to a label ID, else None (use `q=`).
+
+    Queries without user labels are planned without any API call; user label
+    names are resolved through the account's LabelRegistry.
+    """
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        return None
+    if not tokens:
+        return None
+
+    label_ids: list[str] = []
+    user_names: list[str] = []
+    for token in tokens:
+        match = _TOKEN.match(token)
+        if match is None:
+            return None
+        op, value = match.group(1).lower(), match.group(2).strip().lower()
+        if op == "in":
+            label_id = IN_LABELS.get(value)
+        elif op == "is":
+            label_id = IS_LABELS.get(value)
+        elif op == "category":
+            label_id = CATEGORY_LABELS.get(value)
+        else:
+            label_id = SYSTEM_LABEL_NAMES.get(value)
+            if label_id is None:
+                user_names.append(match.group(2))
+                label_id = ""
+        if label_id is None:
+            return None
+        if label_id:
+            label_ids.append(label_id)
+
+    if user_names:
+        resolved = _resolve_user_labels(service, user_names, http)
+        if resolved is None:
+            return None
+        label_ids.extend(resolved)
+
+    return QueryPlan(query=query, label_ids=tuple(dict.fromkeys(label_ids)))
+
+
+def _resolve_user_labels(service: Resource, names: list[str], http=None) -> Optional[list[str]]:
+    labels = registry_for(service).labels(service, http=http)
+    by_name: dict[str, set[str]] = {}
+    for lbl in labels:
+        by_name.setdefault(normalize_label_name(lbl.get("name", "")), set()).add(lbl["id"])
+
+    ids = []
+    for name in names:
+        matches = by_name.get(normalize_label_name(name), set())
+        # Unknown or ambiguous names are left to Gmail search.
+        if len(matches) != 1:
+            return None
+        ids.append(next(iter(matches)))
+    return ids
+
+
+def label_total(service: Resource, label_id: str, http=None) -> int:
+    """
+    Message count for a label in one labels.get call.
+
+    messagesTotal counts every message carrying the label, including any in
+    Spam/Trash, so for other labels it can be higher than a listing (never
+    lower): trashing a message keeps its user labels. Only use it as an exact
+    count when QueryPlan.countable says so.
+    """
+    resp = execute(service.users().labels().get(userId="me", id=label_id, fields="messagesTotal"), http)
+    return int(resp.get("messagesTotal", 0))
+
+
+def execute(request, http=None) -> dict:
+    return request.execute(http=http) if http is not None else request.execute()
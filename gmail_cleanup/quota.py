@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from googleapiclient.http import HttpRequest
+
+
+@dataclass(frozen=True)
+class QuotaDefaults:
+    units_per_second: float = 250  # Gmail per-user quota: 250 units/second (moving average)
+    burst: float = 250
+
+
+DEFAULTS = QuotaDefaults()
+
+# Quota units per Gmail API method, keyed by discovery methodId.
+# https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS: dict[str, int] = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.history.list": 2,
+    "gmail.users.labels.create": 5,
+    "gmail.users.labels.delete": 5,
+    "gmail.users.labels.get": 1,
+    "gmail.users.labels.list": 1,
+    "gmail.users.labels.patch": 5,
+    "gmail.users.labels.update": 5,
+    "gmail.users.messages.batchDelete": 50,
+    "gmail.users.messages.batchModify": 50,
+    "gmail.users.messages.delete": 10,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.modify": 5,
+    "gmail.users.messages.trash": 5,
+    "gmail.users.messages.untrash": 5,
+    "gmail.users.threads.get": 10,
+    "gmail.users.threads.list": 10,
+}
+DEFAULT_UNITS = 5
+
+
+def method_cost(method_id: Optional[str]) -> int:
+    return QUOTA_UNITS.get(method_id or "", DEFAULT_UNITS)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket measured in quota units.
+
+    acquire() reserves units immediately and sleeps off any deficit outside the
+    lock, so concurrent workers queue up fairly behind each other and together
+    never exceed `rate` units/second after the initial `capacity` burst.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, units: float) -> float:
+        """
+        Take `units` from the bucket, blocking until they are available.
+        Returns the number of seconds waited.
+        """
+        wait = self.reserve(units)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def reserve(self, units: float) -> float:
+        """
+        Take `units` from the bucket without waiting. Returns how many seconds
+        the caller must wait before using them (for async callers to sleep off).
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= units
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class QuotaScheduler:
+    """
+    Costs Gmail calls by method and paces them through one shared token bucket.
+    """
+
+    def __init__(self, units_per_second: float = DEFAULTS.units_per_second, burst: Optional[float] = None) -> None:
+        self.bucket = TokenBucket(units_per_second, burst if burst is not None else units_per_second)
+
+    def acquire(self, method_id: Optional[str], count: int = 1) -> float:
+        return self.bucket.acquire(method_cost(method_id) * count)
+
+    def reserve(self, method_id: Optional[str], count: int = 1) -> float:
+        return self.bucket.reserve(method_cost(method_id) * count)
+
+    def request_builder(self, http, postproc, uri, **kwargs) -> "QuotaHttpRequest":
+        """
+        googleapiclient `requestBuilder` hook: every request built by a service
+        created with it is charged against this scheduler when executed.
+        """
+        return QuotaHttpRequest(http, postproc, uri, scheduler=self, **kwargs)
+
+
+class QuotaHttpRequest(HttpRequest):
+    def __init__(self, *args, scheduler: QuotaScheduler, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler
+
+    def execute(self, http=None, num_retries=0):
+        self.scheduler.acquire(self.methodId)
+        return super().execute(http=http, num_retries=num_retries)
+
+
+def reserve_batch(requests: Iterable[object]) -> None:
+    """
+    Charge the sub-requests of an HTTP batch before sending it. A batch bypasses
+    each request's own execute(), so this is where batched calls pay quota.
+    """
+    by_scheduler: dict[QuotaScheduler, list[Optional[str]]] = defaultdict(list)
+    for request in requests:
+        scheduler = getattr(request, "scheduler", None)
+        if isinstance(scheduler, QuotaScheduler):
+            by_scheduler[scheduler].append(getattr(request, "methodId", None))
+
+    for scheduler, method_ids in by_scheduler.items():
+        scheduler.bucket.acquire(sum(method_cost(m) for m in method_ids))
+
+
+_SCHEDULERS: dict[str, QuotaScheduler] = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def scheduler_for_account(
+    account: str,
+    units_per_second: float = DEFAULTS.units_per_second,
+    burst: Optional[float] = None,
+) -> QuotaScheduler:
+    """
+    Return the process-wide scheduler for an account, creating it on first use,
+    so every service and worker for that account shares one budget.
+    """
+    with _SCHEDULERS_LOCK:
+        scheduler = _SCHEDULERS.get(account)
+        if scheduler is None:
+            scheduler = QuotaScheduler(units_per_second, burst)
+            _SCHEDULERS[account] = scheduler
+        return scheduler
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from statistics import NormalDist
+from typing import Iterable, Optional
+
+from googleapiclient.discovery import Resource
+
+from gmail_cleanup.cache import MessageCache, cached_ids, iter_metadata
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+from gmail_cleanup.gmail import new_http_for
+from gmail_cleanup.gmail_iter import DEFAULTS as ITER_DEFAULTS, iter_pages
+from gmail_cleanup.histogram import DEFAULTS as HISTOGRAM_DEFAULTS, bucket_options, initial_edges
+from gmail_cleanup.query_builder import QueryOptions, build_query
+from gmail_cleanup.sender_stats import GROUPINGS, group_key
+
+SAMPLING_MODES = ("uniform", "stratified")
+# Everything a sample fetch reads.
+SAMPLE_FIELDS = "id,sizeEstimate,payload/headers"
+
+
+@dataclass(frozen=True)
+class SamplingDefaults:
+    size: int = 5000  # messages fetched
+    confidence: float = 0.95
+    workers: int = 4  # strata listed at once in stratified mode
+
+
+DEFAULTS = SamplingDefaults()
+
+
+class Reservoir:
+    """
+    Uniform sample of at most `size` items from a stream of unknown length
+    (Vitter's Algorithm R). `seen` counts every item offered.
+    """
+
+    def __init__(self, size: int, rng: random.Random) -> None:
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        self.size = size
+        self.seen = 0
+        self.items: list[str] = []
+        self._rng = rng
+
+    def add(self, item: str) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        j = self._rng.randrange(self.seen)
+        if j < self.size:
+            self.items[j] = item
+
+    def extend(self, items: Iterable[str]) -> "Reservoir":
+        for item in items:
+            self.add(item)
+        return self
+
+
+@dataclass
+class Stratum:
+    query: str
+    population: int  # messages listed in the stratum
+    ids: list[str]  # sampled IDs
+
+
+@dataclass(frozen=True)
+class Interval:
+    estimate: float
+    low: float
+    high: float
+
+
+@dataclass(frozen=True)
+class SenderEstimate:
+    key: str
+    sampled: int  # sampled messages from this sender
+    messages: Interval  # share of messages
+    bytes: Interval  # share of bytes
+
+
+@dataclass
+class _StratumSums:
+    population: int
+    n: int = 0
+    bytes: float = 0.0
+    bytes_sq: float = 0.0
+    by_key: dict[str, list[float]] = field(default_factory=dict)  # key -> [count, bytes, bytes_sq]
+
+
+def allocate(populations: list[int], size: int) -> list[int]:
+    """
+    Proportional allocation of `size` draws over strata, at least one per
+    non-empty stratum and never more than the stratum holds.
+    """
+    total = sum(populations)
+    if total == 0:
+        return [0] * len(populations)
+    return [min(n, max(1, round(size * n / total))) if n else 0 for n in populations]
+
+
+def draw_uniform(
+    service: Resource,
+    query: str,
+    size: int,
+    rng: random.Random,
+    cache: Optional[MessageCache] = None,
+) -> list[Stratum]:
+    """
+    List every match (IDs only) once and keep a uniform reservoir of `size`.
+    Label-only queries are read from `cache` instead when it can answer them.
+    """
+    reservoir = Reservoir(size, rng)
+    ids = cached_ids(service, query, cache)
+    if ids is not None:
+        reservoir.extend(ids)
+    else:
+        for page in iter_pages(service, query, prefetch=ITER_DEFAULTS.prefetch):
+            reservoir.extend(page.ids)
+    return [Stratum(query, reservoir.seen, reservoir.items)]
+
+
+def draw_stratified(
+    service: Resource,
+    base: QueryOptions,
+    size: int,
+    rng: random.Random,
+    workers: int = DEFAULTS.workers,
+    since_year: int = HISTOGRAM_DEFAULTS.since_year,
+    today: Optional[date] = None,
+) -> list[Stratum]:
+    """
+    Split `base` into yearly after:/before: strata, list them in parallel into
+    one reservoir each, then subsample every reservoir to its proportional
+    share of `size` (a uniform subsample of a uniform sample stays uniform).
+    """
+    queries = [
+        build_query(bucket_options(base, "date", lo, hi))
+        for lo, hi in initial_edges("date", since_year=since_year, today=today)
+    ]
+    seeds = [rng.getrandbits(64) for _ in queries]
+
+    def _list(query: str, seed: int) -> Reservoir:
+        reservoir = Reservoir(size, random.Random(seed))
+        http = new_http_for(service)
+        for page in iter_pages(service, query, http=http):
+            reservoir.extend(page.ids)
+        return reservoir
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gmail-sample") as pool:
+        reservoirs = list(pool.map(_list, queries, seeds))
+
+    shares = allocate([r.seen for r in reservoirs], size)
+    return [
+        Stratum(query, r.seen, rng.sample(r.items, min(n, len(r.items))))
+        for query, r, n in zip(queries, reservoirs, shares)
+        if r.seen
+    ]
+
+
+class SampleEstimator:
+    """
+    Sender shares of messages and bytes from a (stratified) simple random
+    sample, with normal-approximation confidence intervals.
+
+    Shares are stratified ratio estimators; their variance comes from the
+    linearized residuals in each stratum, with the finite population
+    correction, so a sample that covers a stratum completely adds no error.
+    """
+
+    def __init__(self, strata: list[Stratum], by: str = "address", confidence: float = DEFAULTS.confidence) -> None:
+        if by not in GROUPINGS:
+            raise ValueError(f"by must be one of: {', '.join(GROUPINGS)}")
+        if not 0 < confidence < 1:
+            raise ValueError("confidence must be in (0, 1)")
+        self.by = by
+        self.confidence = confidence
+        self._z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self._strata = [_StratumSums(s.population) for s in strata]
+        self._stratum_of = {mid: idx for idx, s in enumerate(strata) for mid in s.ids}
+        self.population = sum(s.population for s in strata)
+
+    @property
+    def sampled(self) -> int:
+        return sum(s.n for s in self._strata)
+
+    def add(self, message_id: str, size_bytes: int, from_header: str = "") -> None:
+        sums = self._strata[self._stratum_of[message_id]]
+        sums.n += 1
+        sums.bytes += size_bytes
+        sums.bytes_sq += size_bytes * size_bytes
+        key = group_key(from_header, self.by)
+        if not key:
+            return
+        entry = sums.by_key.get(key)
+        if entry is None:
+            entry = sums.by_key[key] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += size_bytes
+        entry[2] += size_bytes * size_bytes
+
+    def add_messages(self, messages: Iterable[dict]) -> "SampleEstimator":
+        for msg in messages:
+            from_header = ""
+            for h in msg.get("payload", {}).get("headers", []):
+                if h.get("name", "").lower() == "from":
+                    from_header = h.get("value", "") or ""
+                    break
+            self.add(msg["id"], int(msg.get("sizeEstimate") or 0), from_header)
+        return self
+
+    def top(self, n: int = 10) -> list[SenderEstimate]:
+        """
+        The `n` senders with the largest estimated message share.
+        """
+        sampled: dict[str, int] = {}
+        for sums in self._strata:
+            for key, (count, _b, _bsq) in sums.by_key.items():
+                sampled[key] = sampled.get(key, 0) + count
+        keys = sorted(sampled, key=lambda k: (-self._share(k, count=True)[0], k))[:n]
+        return [
+            SenderEstimate(
+                key,
+                sampled[key],
+                self._interval(*self._share(key, count=True), upper=1.0),
+                self._interval(*self._share(key, count=False), upper=1.0),
+            )
+            for key in keys
+        ]
+
+    def total_bytes(self) -> Interval:
+        estimate, variance = 0.0, 0.0
+        for s in self._strata:
+            if not s.n:
+                continue
+            estimate += s.population * s.bytes / s.n
+            variance += _stratum_variance(s, s.bytes, s.bytes_sq)
+        return self._interval(estimate, variance)
+
+    def _share(self, key: str, count: bool) -> tuple[float, float]:
+        """
+        (ratio, variance) of the key's share of messages or bytes.
+        """
+        num = den = 0.0
+        parts = []
+        for s in self._strata:
+            if not s.n:
+                continue
+            k_count, k_bytes, k_bytes_sq = s.by_key.get(key, (0, 0.0, 0.0))
+            if count:
+                part = (k_count, k_count, s.n, s.n)
+            else:
+                part = (k_bytes, k_bytes_sq, s.bytes, s.bytes_sq)
+            num += s.population * part[0] / s.n
+            den += s.population * part[2] / s.n
+            parts.append((s, part))
+        if den == 0:
+            return 0.0, 0.0
+        ratio = num / den
+        variance = 0.0
+        for s, (g_sum, g_sq, y_sum, y_sq) in parts:
+            # Residuals e = y_g - ratio * y, where y_g = y inside the group:
+            # sum(e) and sum(e^2) follow from the group and stratum sums.
+            e_sum = g_sum - ratio * y_sum
+            e_sq = (1 - 2 * ratio) * g_sq + ratio * ratio * y_sq
+            variance += _stratum_variance(s, e_sum, e_sq)
+        return ratio, variance / (den * den)
+
+    def _interval(self, estimate: float, variance: float, upper: float = math.inf) -> Interval:
+        half = self._z * math.sqrt(max(variance, 0.0))
+        return Interval(estimate, max(0.0, estimate - half), min(upper, estimate + half))
+
+
+def _stratum_variance(s: _StratumSums, total: float, total_sq: float) -> float:
+    """
+    Variance of the stratum's estimated total, N^2 (1 - n/N) s^2 / n.
+    """
+    if s.n < 2:
+        return 0.0
+    sample_var = max(0.0, (total_sq - total * total / s.n) / (s.n - 1))
+    return s.population**2 * (1 - s.n / s.population) * sample_var / s.n
+
+
+def sample_sender_stats(
+    service: Resource,
+    base: QueryOptions,
+    size: int = DEFAULTS.size,
+    mode: str = "uniform",
+    by: str = "address",
+    confidence: float = DEFAULTS.confidence,
+    seed: Optional[int] = None,
+    controller: Optional[AdaptiveConcurrency] = None,
+    cache: Optional[MessageCache] = None,
+) -> SampleEstimator:
+    """
+    Estimate sender shares of `base`'s matches from `size` sampled messages:
+    list IDs only, draw a uniform or date-stratified sample, and fetch
+    metadata for the sampled IDs alone.
+    """
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(SAMPLING_MODES)}")
+    if size < 1:
+        raise ValueError("size must be >= 1")
+    rng = random.Random(seed)
+    if mode == "uniform":
+        strata = draw_uniform(service, build_query(base), size, rng, cache=cache)
+    else:
+        strata = draw_stratified(service, base, size, rng)
+
+    estimator = SampleEstimator(strata, by=by, confidence=confidence)
+    ids = (mid for s in strata for mid in s.ids)
+    msgs = iter_metadata(
+        service, ids, headers=["From"], cache=cache, controller=controller, fields=SAMPLE_FIELDS
+    )
+    return estimator.add_messages(msgs)
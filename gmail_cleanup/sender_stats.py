@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import heapq
+import math
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parseaddr, parsedate_to_datetime
+from typing import Iterable, Optional
+
+# Second-level labels that act as public suffixes under a country TLD
+# (example.co.uk, example.com.au). Without a public-suffix list dependency this
+# covers the common cases; anything else rolls up to the last two labels.
+_SECOND_LEVEL_SUFFIXES = {
+    "ac", "co", "com", "edu", "go", "gob", "gov", "mil", "ne", "net", "nic", "or", "org",
+}
+
+GROUPINGS = ("address", "domain", "registrable")
+
+
+@dataclass(frozen=True)
+class SenderStatsDefaults:
+    top_k_error: float = 0.001  # counts may be overestimated by at most this share of messages scanned
+
+
+DEFAULTS = SenderStatsDefaults()
+
+
+def normalize_address(from_header: str) -> str:
+    """
+    Lower-cased email address from a From header ("Foo <A@x.com>" -> "a@x.com").
+    Headers without a parsable address are kept as-is (stripped, lower-cased).
+    """
+    _name, addr = parseaddr(from_header or "")
+    return (addr or from_header or "").strip().lower()
+
+
+def domain_of(address: str) -> str:
+    return address.rpartition("@")[2] if "@" in address else ""
+
+
+def registrable_domain(domain: str) -> str:
+    """
+    Approximate registrable domain: mail.news.example.com -> example.com,
+    mail.example.co.uk -> example.co.uk.
+    """
+    labels = [label for label in domain.strip(".").split(".") if label]
+    if len(labels) <= 2:
+        return ".".join(labels)
+    if len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def group_key(from_header: str, by: str = "address") -> str:
+    """
+    Sender key for a From header: normalized address, its domain, or its
+    registrable domain ("" when there is no address).
+    """
+    address = normalize_address(from_header)
+    if by == "address" or not address:
+        return address
+    domain = domain_of(address)
+    return domain if by == "domain" else registrable_domain(domain)
+
+
+@dataclass(frozen=True)
+class HeavyHitter:
+    key: str
+    count: int  # upper bound on the true count
+    error: int  # count - error is a lower bound
+
+    @property
+    def guaranteed(self) -> int:
+        return self.count - self.error
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k sketch (Metwally et al.): tracks at most `capacity`
+    keys. Every reported count overestimates the true count by at most
+    total / capacity, and any key seen more often than that is tracked.
+    Counts are exact while fewer than `capacity` distinct keys have been seen.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self.total = 0
+        self._counts: dict[str, int] = {}
+        self._errors: dict[str, int] = {}
+        # Lazy min-heap of (count, key); stale entries are skipped on pop and
+        # the heap is rebuilt when it grows past a few times the capacity.
+        self._heap: list[tuple[int, str]] = []
+
+    @classmethod
+    def for_error(cls, error: float) -> "SpaceSaving":
+        """
+        Sketch whose overestimate is at most `error` * total (e.g. 0.001 -> 1000 keys).
+        """
+        if not 0 < error <= 1:
+            raise ValueError("error must be in (0, 1]")
+        return cls(math.ceil(1 / error))
+
+    def add(self, key: str, count: int = 1) -> Optional[str]:
+        """
+        Count `key`; returns the key it replaced, if the sketch was full.
+        """
+        self.total += count
+        evicted = None
+        if key in self._counts:
+            self._counts[key] += count
+        elif len(self._counts) < self.capacity:
+            self._counts[key] = count
+            self._errors[key] = 0
+        else:
+            evicted, floor = self._pop_min()
+            del self._counts[evicted]
+            del self._errors[evicted]
+            self._counts[key] = floor + count
+            self._errors[key] = floor
+
+        heapq.heappush(self._heap, (self._counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, k) for k, c in self._counts.items()]
+            heapq.heapify(self._heap)
+        return evicted
+
+    def _pop_min(self) -> tuple[str, int]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self._counts.get(key) == count:
+                return key, count
+
+    def top(self, n: Optional[int] = None) -> list[HeavyHitter]:
+        ranked = sorted(self._counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        if n is not None:
+            ranked = ranked[:n]
+        return [HeavyHitter(key, count, self._errors[key]) for key, count in ranked]
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+class SenderStats:
+    """
+    Streaming sender aggregate in fixed memory: Space-Saving top-k by
+    normalized address, domain and registrable domain, plus running
+    oldest/newest dates.
+    """
+
+    def __init__(self, error: float = DEFAULTS.top_k_error) -> None:
+        self.scanned = 0
+        self.sketches = {grouping: SpaceSaving.for_error(error) for grouping in GROUPINGS}
+        self.oldest: Optional[datetime] = None
+        self.newest: Optional[datetime] = None
+
+    def add(self, from_header: str, date_header: str = "") -> None:
+        self.scanned += 1
+        address = normalize_address(from_header)
+        if address:
+            domain = domain_of(address)
+            self.sketches["address"].add(address)
+            if domain:
+                self.sketches["domain"].add(domain)
+                self.sketches["registrable"].add(registrable_domain(domain))
+
+        dt = _parse_date(date_header)
+        if dt is not None:
+            if self.oldest is None or dt < self.oldest:
+                self.oldest = dt
+            if self.newest is None or dt > self.newest:
+                self.newest = dt
+
+    def add_messages(self, messages: Iterable[dict]) -> "SenderStats":
+        for msg in messages:
+            headers = {
+                h.get("name", "").lower(): h.get("value", "") or ""
+                for h in msg.get("payload", {}).get("headers", [])
+            }
+            self.add(headers.get("from", ""), headers.get("date", ""))
+        return self
+
+    def top(self, n: Optional[int] = 10, by: str = "address") -> list[HeavyHitter]:
+        if by not in self.sketches:
+            raise ValueError(f"by must be one of: {', '.join(GROUPINGS)}")
+        return self.sketches[by].top(n)
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    # "-0000" parses as naive; treat it as UTC so every date is comparable.
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from datetime import date
+from functools import partial
+from typing import Iterator, Optional
+
+from googleapiclient.discovery import Resource
+
+from gmail_cleanup.concurrency import AdaptiveConcurrency, produce_in_threads
+from gmail_cleanup.gmail import new_http_for
+from gmail_cleanup.gmail_iter import DEFAULTS as ITER_DEFAULTS, iter_message_id_pages
+from gmail_cleanup.histogram import count_histogram
+from gmail_cleanup.query_builder import QueryOptions
+
+
+@dataclass(frozen=True)
+class ShardDefaults:
+    workers: int = 8  # windows listed at once, each on its own connection
+    shard_size: int = 20_000  # target messages per window (estimated)
+    plan_calls: int = 200  # estimate calls spent sizing the windows
+    buffer_pages: int = 2  # pages buffered per worker ahead of the consumer
+
+
+DEFAULTS = ShardDefaults()
+
+
+def plan_windows(
+    service: Resource,
+    query: str,
+    shard_size: int = DEFAULTS.shard_size,
+    workers: int = DEFAULTS.workers,
+    plan_calls: int = DEFAULTS.plan_calls,
+    controller: Optional[AdaptiveConcurrency] = None,
+    today: Optional[date] = None,
+) -> list[str]:
+    """
+    Split `query` into disjoint after:/before: windows that together cover
+    all time, bisecting any window estimated above `shard_size` matches.
+    Largest windows first, so the long listings start early. Windows
+    estimated empty are kept: estimates can be wrong and listing one costs a
+    single call.
+    """
+    histogram = count_histogram(
+        service,
+        QueryOptions(q=query or None),
+        by="date",
+        workers=workers,
+        max_calls=plan_calls,
+        split_above=shard_size,
+        controller=controller,
+        today=today,
+    )
+    buckets = sorted(histogram.buckets, key=lambda b: -b.estimate)
+    return [b.query for b in buckets]
+
+
+def iter_sharded_pages(
+    service: Resource,
+    query: str,
+    limit: int = 0,
+    workers: int = DEFAULTS.workers,
+    shard_size: int = DEFAULTS.shard_size,
+    page_size: int = ITER_DEFAULTS.page_size,
+    windows: Optional[list[str]] = None,
+) -> Iterator[list[str]]:
+    """
+    Like iter_message_id_pages, but lists disjoint time windows of the query
+    concurrently (see plan_windows) and merges their pages as they arrive.
+
+    Pages come in no particular order. IDs are deduplicated across windows
+    and at most `limit` are yielded (0 = no limit). Errors in a worker are
+    re-raised here; stopping early (break, exception, limit) stops the
+    workers and waits for them before this generator finishes.
+    """
+    if windows is None:
+        windows = plan_windows(service, query, shard_size=shard_size, workers=workers)
+    local = threading.local()
+
+    def _list(window: str) -> Iterator[list[str]]:
+        # Runs on a worker thread, which keeps one connection for its windows.
+        if not hasattr(local, "http"):
+            local.http = new_http_for(service)
+        yield from iter_message_id_pages(service, window, page_size=page_size, http=local.http)
+
+    pages = produce_in_threads(
+        [partial(_list, window) for window in windows],
+        workers=min(max(1, workers), max(1, len(windows))),
+        buffer=max(1, workers) * DEFAULTS.buffer_pages,
+        thread_name="gmail-list-shard",
+    )
+    seen: set[str] = set()
+    try:
+        for page in pages:
+            ids = [mid for mid in page if mid not in seen]
+            if limit:
+                ids = ids[: limit - len(seen)]
+            seen.update(ids)
+            if ids:
+                yield ids
+            if limit and len(seen) >= limit:
+                return
+    finally:
+        pages.close()
+
+
+def iter_sharded_ids(
+    service: Resource,
+    query: str,
+    limit: int = 0,
+    workers: int = DEFAULTS.workers,
+) -> Iterator[str]:
+    """
+    Flattened iter_sharded_pages.
+    """
+    for page in iter_sharded_pages(service, query, limit=limit, workers=workers):
+        yield from page
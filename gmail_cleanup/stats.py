@@ -1,59 +1,55 @@
 from __future__ import annotations
 
 from collections import Counter
-from email.utils import parsedate_to_datetime
-from typing import Optional, Tuple
+from typing import Optional
 
 from googleapiclient.discovery import Resource
 
-from gmail_cleanup.gmail_iter import iter_message_ids
+from gmail_cleanup.cache import MessageCache, iter_ids, iter_metadata
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+from gmail_cleanup.sender_stats import DEFAULTS as SENDER_DEFAULTS, SenderStats
 
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
 
-def _get_header(msg: dict, name: str) -> str:
-    for h in msg.get("payload", {}).get("headers", []):
-        if h.get("name", "").lower() == name.lower():
-            return h.get("value", "") or ""
-    return ""
+
+def collect_sender_stats(
+    service: Resource,
+    query: str,
+    scan_limit: int = 500,
+    controller: Optional[AdaptiveConcurrency] = None,
+    cache: Optional[MessageCache] = None,
+    error: float = SENDER_DEFAULTS.top_k_error,
+) -> SenderStats:
+    """
+    Stream the first scan_limit matches (0 = all) into a fixed-memory
+    SenderStats: top senders by address, domain and registrable domain,
+    plus the oldest and newest Date.
+    """
+    ids = iter_ids(service, query, cache=cache, limit=scan_limit)
+    msgs = iter_metadata(service, ids, headers=["From", "Date"], cache=cache, controller=controller)
+    return SenderStats(error=error).add_messages(msgs)
 
 
 def collect_sender_counts_and_dates(
     service: Resource,
     query: str,
     scan_limit: int = 500,
+    controller: Optional[AdaptiveConcurrency] = None,
+    cache: Optional[MessageCache] = None,
 ) -> tuple[Counter, Optional[str], Optional[str]]:
     """
     Returns:
-      - Counter of From header
+      - Counter of normalized sender addresses
       - oldest date (string)
       - newest date (string)
 
-    Based on first scan_limit messages.
+    Based on first scan_limit messages. With a `cache`, metadata is read from
+    the local cache and only uncached messages are fetched. Counts come from
+    collect_sender_stats, so they are exact up to its sketch capacity.
     """
-    senders = Counter()
-    dates = []
-
-    for msg_id in iter_message_ids(service, query, limit=scan_limit):
-        msg = service.users().messages().get(
-            userId="me",
-            id=msg_id,
-            format="metadata",
-            metadataHeaders=["From", "Date"],
-        ).execute()
-
-        frm = _get_header(msg, "From")
-        dt = _get_header(msg, "Date")
-
-        if frm:
-            senders[frm] += 1
-        if dt:
-            try:
-                dates.append(parsedate_to_datetime(dt))
-            except Exception:
-                pass
-
-    if not dates:
-        return senders, None, None
+    stats = collect_sender_stats(service, query, scan_limit=scan_limit, controller=controller, cache=cache)
+    senders = Counter({hit.key: hit.count for hit in stats.top(None)})
 
-    oldest = min(dates).strftime("%Y-%m-%d %H:%M:%S %z")
-    newest = max(dates).strftime("%Y-%m-%d %H:%M:%S %z")
-    return senders, oldest, newest
+    if stats.oldest is None or stats.newest is None:
+        return senders, None, None
+    return senders, stats.oldest.strftime(DATE_FORMAT), stats.newest.strftime(DATE_FORMAT)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import heapq
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from googleapiclient.discovery import Resource
+
+from gmail_cleanup.cache import MessageCache, iter_ids, iter_metadata
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+from gmail_cleanup.labels import registry_for
+from gmail_cleanup.query_builder import QueryOptions, build_query, narrow
+from gmail_cleanup.sender_stats import domain_of, normalize_address, registrable_domain
+
+GROUPINGS = ("sender", "domain", "registrable", "label", "age")
+# Everything a storage scan reads.
+STORAGE_FIELDS = "id,labelIds,internalDate,sizeEstimate,payload/headers"
+
+# (name, newer bound in days, older bound in days) -> older_than/newer_than
+# filters Gmail understands. The last bucket is open-ended.
+AGE_BUCKETS = (
+    ("< 30 days", 0, 30),
+    ("30 days - 1 year", 30, 365),
+    ("1 - 2 years", 365, 730),
+    ("2 - 5 years", 730, 1825),
+    ("> 5 years", 1825, None),
+)
+_AGE_FILTERS = {
+    30: "30d",
+    365: "1y",
+    730: "2y",
+    1825: "5y",
+}
+_MS_PER_DAY = 86_400_000
+# Category tabs whose search operator is not their lowercased label suffix.
+_CATEGORY_OPERATORS = {"CATEGORY_PERSONAL": "primary"}
+
+
+@dataclass(frozen=True)
+class StorageRow:
+    group: str
+    key: str
+    messages: int
+    size_bytes: int
+    options: QueryOptions  # the report's own filters narrowed to this group
+
+    @property
+    def query(self) -> str:
+        return build_query(self.options)
+
+
+def label_filter(label_id: str, name: str) -> dict[str, str]:
+    """
+    QueryOptions fields selecting one label: category:* for Gmail's
+    categories, label:<name> otherwise (Gmail search spells spaces as '-').
+    """
+    if label_id in _CATEGORY_OPERATORS:
+        return {"q": f"category:{_CATEGORY_OPERATORS[label_id]}"}
+    if label_id.startswith("CATEGORY_"):
+        return {"q": f"category:{label_id[len('CATEGORY_'):].lower()}"}
+    return {"label": "-".join((name or label_id).lower().split())}
+
+
+class StorageReport:
+    """
+    Bytes (sizeEstimate) and message counts per sender address, sender
+    domain, registrable domain, label and age bucket.
+
+    Totals are exact. A message counts under every label it carries, so the
+    label totals can add up to more than the mailbox. top() picks the largest
+    groups with a bounded heap rather than sorting every sender.
+    """
+
+    def __init__(
+        self,
+        base: Optional[QueryOptions] = None,
+        label_names: Optional[dict[str, str]] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.base = base or QueryOptions()
+        self.label_names = dict(label_names or {})
+        self.now_ms = int(clock() * 1000)
+        self.messages = 0
+        self.size_bytes = 0
+        self._totals: dict[str, dict[str, list[int]]] = {group: {} for group in GROUPINGS}
+
+    def add(
+        self,
+        size_bytes: int,
+        from_header: str = "",
+        label_ids: Iterable[str] = (),
+        internal_ms: Optional[int] = None,
+    ) -> None:
+        self.messages += 1
+        self.size_bytes += size_bytes
+
+        address = normalize_address(from_header)
+        if address:
+            self._count("sender", address, size_bytes)
+            domain = domain_of(address)
+            if domain:
+                self._count("domain", domain, size_bytes)
+                self._count("registrable", registrable_domain(domain), size_bytes)
+        for label_id in label_ids:
+            self._count("label", label_id, size_bytes)
+        if internal_ms is not None:
+            self._count("age", self._age_bucket(internal_ms), size_bytes)
+
+    def add_messages(self, messages: Iterable[dict]) -> "StorageReport":
+        for msg in messages:
+            from_header = ""
+            for h in msg.get("payload", {}).get("headers", []):
+                if h.get("name", "").lower() == "from":
+                    from_header = h.get("value", "") or ""
+                    break
+            try:
+                internal_ms: Optional[int] = int(msg.get("internalDate"))
+            except (TypeError, ValueError):
+                internal_ms = None
+            self.add(
+                int(msg.get("sizeEstimate") or 0),
+                from_header,
+                msg.get("labelIds") or (),
+                internal_ms,
+            )
+        return self
+
+    def top(self, by: str = "sender", n: int = 10) -> list[StorageRow]:
+        """
+        The `n` groups holding the most bytes (age: every bucket, youngest first).
+        """
+        if by not in self._totals:
+            raise ValueError(f"by must be one of: {', '.join(GROUPINGS)}")
+        totals = self._totals[by]
+        if by == "age":
+            order = [name for name, _newer, _older in AGE_BUCKETS if name in totals]
+            return [self._row(by, key, *totals[key]) for key in order]
+        largest = heapq.nlargest(n, totals.items(), key=lambda kv: kv[1][1])
+        return [self._row(by, key, count, size) for key, (count, size) in largest]
+
+    def _count(self, group: str, key: str, size_bytes: int) -> None:
+        entry = self._totals[group].get(key)
+        if entry is None:
+            self._totals[group][key] = [1, size_bytes]
+        else:
+            entry[0] += 1
+            entry[1] += size_bytes
+
+    def _age_bucket(self, internal_ms: int) -> str:
+        age_days = max(0, self.now_ms - internal_ms) // _MS_PER_DAY
+        for name, _newer, older in AGE_BUCKETS:
+            if older is None or age_days < older:
+                return name
+        return AGE_BUCKETS[-1][0]
+
+    def _row(self, group: str, key: str, count: int, size: int) -> StorageRow:
+        if group in ("sender", "domain", "registrable"):
+            options = narrow(self.base, from_=key)
+            return StorageRow(group, key, count, size, options)
+        if group == "label":
+            name = self.label_names.get(key, key)
+            options = narrow(self.base, **label_filter(key, name))
+            return StorageRow(group, name, count, size, options)
+        newer, older = next((n, o) for label, n, o in AGE_BUCKETS if label == key)
+        options = narrow(
+            self.base,
+            older_than=_AGE_FILTERS.get(newer),
+            newer_than=_AGE_FILTERS.get(older) if older is not None else None,
+        )
+        return StorageRow(group, key, count, size, options)
+
+
+def collect_storage_report(
+    service: Resource,
+    base: QueryOptions,
+    scan_limit: int = 0,
+    controller: Optional[AdaptiveConcurrency] = None,
+    cache: Optional[MessageCache] = None,
+) -> StorageReport:
+    """
+    Sum sizeEstimate over the first scan_limit matches of `base` (0 = all)
+    by sender, domain, label and age. Label IDs are reported by name.
+    """
+    label_names = {lbl["id"]: lbl["name"] for lbl in registry_for(service).labels(service)}
+    report = StorageReport(base, label_names=label_names)
+    ids = iter_ids(service, build_query(base), cache=cache, limit=scan_limit)
+    msgs = iter_metadata(
+        service, ids, headers=["From"], cache=cache, controller=controller, fields=STORAGE_FIELDS
+    )
+    return report.add_messages(msgs)
@@ -2,7 +2,8 @@ from __future__ import annotations
 
 from googleapiclient.discovery import Resource
 
-from gmail_cleanup.gmail_iter import iter_message_id_pages
+from gmail_cleanup.gmail_iter import DEFAULTS, iter_message_id_pages
+from gmail_cleanup.write_batch import write_pages
 
 
 def trash_message_ids(service: Resource, ids: list[str]) -> None:
@@ -19,12 +20,5 @@ def trash_query(service: Resource, query: str, limit: int = 0) -> int:
     """
     Trash messages matching query. Returns how many were trashed.
     """
-    done = 0
-    for ids in iter_message_id_pages(service, query, limit=limit):
-        if not ids:
-            break
-        trash_message_ids(service, ids)
-        done += len(ids)
-        if limit and done >= limit:
-            break
-    return done
+    pages = iter_message_id_pages(service, query, limit=limit, prefetch=DEFAULTS.prefetch)
+    return write_pages(pages, lambda ids: trash_message_ids(service, ids))
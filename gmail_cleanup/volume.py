@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from googleapiclient.discovery import Resource
+
+from gmail_cleanup.cache import MessageCache, iter_ids, iter_metadata
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+from gmail_cleanup.sender_stats import (
+    DEFAULTS as SENDER_DEFAULTS,
+    SpaceSaving,
+    group_key,
+)
+
+GRANULARITIES = ("day", "week", "month", "year")
+SENDER_GROUPINGS = ("address", "domain", "registrable")
+# Everything a volume scan reads: no Date header parsing, just internalDate.
+VOLUME_FIELDS = "id,internalDate,sizeEstimate,payload/headers"
+
+_MS_PER_DAY = 86_400_000
+
+
+def _civil_from_days(days: int) -> tuple[int, int, int]:
+    """
+    (year, month, day) for days since 1970-01-01, in integer arithmetic
+    (H. Hinnant's civil_from_days).
+    """
+    z = days + 719468
+    era = (z if z >= 0 else z - 146096) // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 if mp < 10 else mp - 9
+    return yoe + era * 400 + (month <= 2), month, day
+
+
+def bucket_index(internal_ms: int, granularity: str) -> int:
+    """
+    Integer bucket for a UTC epoch-millisecond timestamp: days, Monday-based
+    weeks, months (year * 12 + month - 1) or years.
+    """
+    days = internal_ms // _MS_PER_DAY
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        return (days + 3) // 7  # 1970-01-01 was a Thursday
+    year, month, _day = _civil_from_days(days)
+    if granularity == "month":
+        return year * 12 + month - 1
+    if granularity == "year":
+        return year
+    raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+
+
+def bucket_label(index: int, granularity: str) -> str:
+    """
+    day/week -> YYYY-MM-DD (weeks by their Monday), month -> YYYY-MM, year -> YYYY.
+    """
+    if granularity in ("day", "week"):
+        days = index if granularity == "day" else index * 7 - 3
+        year, month, day = _civil_from_days(days)
+        return f"{year:04d}-{month:02d}-{day:02d}"
+    if granularity == "month":
+        return f"{index // 12:04d}-{index % 12 + 1:02d}"
+    return f"{index:04d}"
+
+
+@dataclass(frozen=True)
+class Bucket:
+    label: str
+    count: int
+    size_bytes: int
+
+
+class VolumeHistogram:
+    """
+    Message count and bytes per time bucket, in two int64 arrays indexed from
+    the earliest bucket seen (grown at either end as needed).
+    """
+
+    def __init__(self, granularity: str) -> None:
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+        self.granularity = granularity
+        self._origin = 0
+        self._counts = array("q")
+        self._bytes = array("q")
+
+    def add(self, internal_ms: int, size_bytes: int = 0) -> None:
+        index = bucket_index(internal_ms, self.granularity)
+        if not self._counts:
+            self._origin = index
+        offset = index - self._origin
+        if offset < 0:
+            self._counts[:0] = array("q", [0]) * -offset
+            self._bytes[:0] = array("q", [0]) * -offset
+            self._origin = index
+            offset = 0
+        elif offset >= len(self._counts):
+            grow = offset + 1 - len(self._counts)
+            self._counts.extend(array("q", [0]) * grow)
+            self._bytes.extend(array("q", [0]) * grow)
+        self._counts[offset] += 1
+        self._bytes[offset] += size_bytes
+
+    @property
+    def total(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._bytes)
+
+    def buckets(self, include_empty: bool = False) -> Iterator[Bucket]:
+        for offset, (count, size) in enumerate(zip(self._counts, self._bytes)):
+            if count or include_empty:
+                yield Bucket(bucket_label(self._origin + offset, self.granularity), count, size)
+
+
+class VolumeStats:
+    """
+    Overall and per-sender histograms for a message stream.
+
+    Per-sender histograms are kept for the senders tracked by a Space-Saving
+    sketch (see sender_stats), so memory stays bounded: they are exact while
+    fewer distinct senders than the sketch capacity have been seen, and a
+    sender that enters the sketch later only has buckets from that point on.
+    """
+
+    def __init__(
+        self,
+        granularity: str,
+        by: str = "address",
+        error: float = SENDER_DEFAULTS.top_k_error,
+    ) -> None:
+        if by not in SENDER_GROUPINGS:
+            raise ValueError(f"by must be one of: {', '.join(SENDER_GROUPINGS)}")
+        self.granularity = granularity
+        self.by = by
+        self.overall = VolumeHistogram(granularity)
+        self.senders = SpaceSaving.for_error(error)
+        self._per_sender: dict[str, VolumeHistogram] = {}
+        self.oldest_ms: Optional[int] = None
+        self.newest_ms: Optional[int] = None
+        self.skipped = 0  # messages without an internalDate
+
+    def add(self, internal_ms: int, size_bytes: int, from_header: str = "") -> None:
+        self.overall.add(internal_ms, size_bytes)
+        self.oldest_ms = internal_ms if self.oldest_ms is None else min(self.oldest_ms, internal_ms)
+        self.newest_ms = internal_ms if self.newest_ms is None else max(self.newest_ms, internal_ms)
+
+        sender = group_key(from_header, self.by)
+        if not sender:
+            return
+        evicted = self.senders.add(sender)
+        if evicted is not None:
+            self._per_sender.pop(evicted, None)
+        histogram = self._per_sender.get(sender)
+        if histogram is None:
+            histogram = self._per_sender[sender] = VolumeHistogram(self.granularity)
+        histogram.add(internal_ms, size_bytes)
+
+    def add_messages(self, messages: Iterable[dict]) -> "VolumeStats":
+        for msg in messages:
+            try:
+                internal_ms = int(msg.get("internalDate"))
+            except (TypeError, ValueError):
+                self.skipped += 1
+                continue
+            from_header = ""
+            for h in msg.get("payload", {}).get("headers", []):
+                if h.get("name", "").lower() == "from":
+                    from_header = h.get("value", "") or ""
+                    break
+            self.add(internal_ms, int(msg.get("sizeEstimate") or 0), from_header)
+        return self
+
+    def top_senders(self, n: int = 10) -> list[tuple[str, VolumeHistogram]]:
+        return [
+            (hit.key, self._per_sender[hit.key])
+            for hit in self.senders.top(n)
+            if hit.key in self._per_sender
+        ]
+
+
+def collect_volume(
+    service: Resource,
+    query: str,
+    granularity: str = "month",
+    scan_limit: int = 0,
+    by: str = "address",
+    controller: Optional[AdaptiveConcurrency] = None,
+    cache: Optional[MessageCache] = None,
+) -> VolumeStats:
+    """
+    Histogram the first scan_limit matches (0 = all) by internalDate, with
+    count and sizeEstimate bytes per bucket, overall and per sender.
+    """
+    stats = VolumeStats(granularity, by=by)
+    ids = iter_ids(service, query, cache=cache, limit=scan_limit)
+    msgs = iter_metadata(
+        service, ids, headers=["From"], cache=cache, controller=controller, fields=VOLUME_FIELDS
+    )
+    return stats.add_messages(msgs)
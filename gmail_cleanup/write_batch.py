@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from gmail_cleanup.concurrency import AdaptiveConcurrency
+
+
+@dataclass(frozen=True)
+class WriteDefaults:
+    chunk_size: int = 1000  # messages.batchModify accepts at most 1000 IDs
+
+
+DEFAULTS = WriteDefaults()
+
+
+@dataclass(frozen=True)
+class ChunkResult:
+    index: int  # 0-based chunk number
+    size: int  # IDs written by this chunk
+    done: int  # IDs written so far, including this chunk
+
+
+class WriteBatcher:
+    """
+    Collect message IDs from any page iterator and hand them to `write` in full
+    chunks of `chunk_size`. Use as a context manager: the remainder is flushed
+    on a clean exit, and dropped if the block raised.
+
+    With a `controller`, each write runs in one of its slots and throttled
+    writes are retried with jittered backoff.
+
+    With workers > 1, up to that many chunks are written at once on worker
+    threads (`write` must then be safe to call from any thread, e.g. by
+    taking its service from a ServicePool). Chunks are still recorded, and
+    on_commit/on_chunk called, in order on the caller's thread; after a
+    failed chunk, later ones are not recorded even if they were written.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[str]], None],
+        chunk_size: int = DEFAULTS.chunk_size,
+        on_chunk: Optional[Callable[[ChunkResult], None]] = None,
+        controller: Optional[AdaptiveConcurrency] = None,
+        workers: int = 1,
+        on_commit: Optional[Callable[[list[str]], None]] = None,
+    ) -> None:
+        self._write = write
+        self._controller = controller
+        self._chunk_size = max(1, min(chunk_size, DEFAULTS.chunk_size))
+        self._on_chunk = on_chunk
+        self._on_commit = on_commit
+        self._pending: list[str] = []
+        self._workers = max(1, workers)
+        self._executor = (
+            ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="gmail-write")
+            if self._workers > 1
+            else None
+        )
+        self._in_flight: deque = deque()  # (chunk, future), oldest first
+        self._failed = False
+        self.results: list[ChunkResult] = []
+
+    @property
+    def done(self) -> int:
+        return self.results[-1].done if self.results else 0
+
+    @property
+    def pending(self) -> int:
+        """
+        IDs added but not recorded yet (buffered or being written).
+        """
+        return len(self._pending) + sum(len(chunk) for chunk, _future in self._in_flight)
+
+    def add(self, ids: Iterable[str]) -> None:
+        self._pending.extend(ids)
+        while len(self._pending) >= self._chunk_size:
+            chunk = self._pending[: self._chunk_size]
+            del self._pending[: self._chunk_size]
+            self._commit(chunk)
+
+    def flush(self) -> None:
+        if self._pending:
+            chunk, self._pending = self._pending, []
+            self._commit(chunk)
+        while self._in_flight:
+            self._settle()
+
+    def _commit(self, chunk: list[str]) -> None:
+        if self._executor is None:
+            self._run(chunk)
+            self._record(chunk)
+            return
+        self._in_flight.append((chunk, self._executor.submit(self._run, chunk)))
+        while len(self._in_flight) >= self._workers:
+            self._settle()
+
+    def _run(self, chunk: list[str]) -> None:
+        if self._controller is not None:
+            self._controller.run(lambda: self._write(chunk))
+        else:
+            self._write(chunk)
+
+    def _settle(self) -> None:
+        chunk, future = self._in_flight.popleft()
+        try:
+            future.result()
+        except BaseException:
+            self._failed = True
+            raise
+        self._record(chunk)
+
+    def _record(self, chunk: list[str]) -> None:
+        if self._on_commit is not None:
+            self._on_commit(chunk)
+        result = ChunkResult(index=len(self.results), size=len(chunk), done=self.done + len(chunk))
+        self.results.append(result)
+        if self._on_chunk is not None:
+            self._on_chunk(result)
+
+    def __enter__(self) -> "WriteBatcher":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self.flush()
+            else:
+                # Record the chunks that finished before the first failure.
+                while self._in_flight and not self._failed:
+                    try:
+                        self._settle()
+                    except Exception:
+                        break
+        finally:
+            self._in_flight.clear()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+
+
+def write_pages(
+    pages: Iterable[list[str]],
+    write: Callable[[list[str]], None],
+    chunk_size: int = DEFAULTS.chunk_size,
+    on_chunk: Optional[Callable[[ChunkResult], None]] = None,
+    controller: Optional[AdaptiveConcurrency] = None,
+    workers: int = 1,
+) -> int:
+    """
+    Write every page of IDs through a WriteBatcher. Returns how many IDs were written.
+    """
+    with WriteBatcher(
+        write, chunk_size=chunk_size, on_chunk=on_chunk, controller=controller, workers=workers
+    ) as batcher:
+        for ids in pages:
+            batcher.add(ids)
+    return batcher.done
@@ -1,6 +1,8 @@
 from .models import (
     ExportRequest,
     ExportResult,
+    HistogramRequest,
+    HistogramResult,
     LabelRequest,
     LabelResult,
     QueryRequest,
@@ -8,7 +10,7 @@ from .models import (
     TrashRequest,
     TrashResult,
 )
-from .operations import apply_label, export_messages, run_query, trash_by_label
+from .operations import apply_label, export_messages, histogram, run_query, trash_by_label
 
 __all__ = [
     "QueryRequest",
@@ -17,10 +19,13 @@ __all__ = [
     "LabelResult",
     "ExportRequest",
     "ExportResult",
+    "HistogramRequest",
+    "HistogramResult",
     "TrashRequest",
     "TrashResult",
     "run_query",
     "apply_label",
     "export_messages",
+    "histogram",
     "trash_by_label",
 ]
@@ -39,6 +39,7 @@ class QueryResult:
 class LabelRequest(QueryRequest):
     target_label: str = "cleanup/candidates"
     limit: int = 0
+    workers: int = 1  # write chunks in flight, each on its own connection
 
 
 @dataclass(frozen=True)
@@ -53,8 +54,11 @@ class LabelResult:
 @dataclass(frozen=True)
 class ExportRequest(QueryRequest):
     out: Optional[Path] = None
-    fmt: str = "csv"
-    limit: int = 200
+    fmt: str = "csv"  # csv, json or ndjson
+    limit: int = 200  # 0 = no limit
+    compress: Optional[str] = None  # gzip, bz2, xz or none; default: from the out extension
+    compress_level: Optional[int] = None
+    workers: int = 1  # metadata batches fetched at once
 
 
 @dataclass(frozen=True)
@@ -64,6 +68,23 @@ class ExportResult:
     exported: int
     fmt: str
     out: Optional[Path]
+    compress: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class HistogramRequest(QueryRequest):
+    by: str = "size"  # size or date
+    workers: int = 8
+    max_calls: int = 400
+
+
+@dataclass(frozen=True)
+class HistogramResult:
+    query: str
+    by: str
+    total: int  # sum of bucket estimates
+    calls: int
+    buckets: list[dict] = field(default_factory=list)  # lo, hi, estimate, query
 
 
 @dataclass(frozen=True)
@@ -73,6 +94,7 @@ class TrashRequest:
     limit: int = 0
     force: bool = False
     max_trash_without_force: int = 5000
+    workers: int = 1  # write chunks in flight, each on its own connection
 
 
 @dataclass(frozen=True)
@@ -1,16 +1,22 @@
 from __future__ import annotations
 
-from gmail_cleanup.exporter import export_rows, write_csv, write_json
-from gmail_cleanup.gmail import get_gmail_service
-from gmail_cleanup.gmail_iter import iter_message_id_pages
+from typing import Iterable, Iterator, Optional
+
+from gmail_cleanup.exporter import EXPORT_FORMATS, compression_for, fetch_message_rows, stream_rows
+from gmail_cleanup.gmail import ServicePool, get_gmail_service
+from gmail_cleanup.gmail_iter import DEFAULTS as ITER_DEFAULTS, iter_message_id_pages
+from gmail_cleanup.histogram import DIMENSIONS, count_histogram
 from gmail_cleanup.labels import apply_label_to_messages, get_or_create_label_id
-from gmail_cleanup.preview import count_messages, sample_messages
+from gmail_cleanup.preview import BackgroundCount, count_messages, sample_messages
 from gmail_cleanup.query_builder import QueryOptions, build_query
 from gmail_cleanup.trash import trash_message_ids
+from gmail_cleanup.write_batch import write_pages
 
 from .models import (
     ExportRequest,
     ExportResult,
+    HistogramRequest,
+    HistogramResult,
     LabelRequest,
     LabelResult,
     QueryRequest,
@@ -21,6 +27,10 @@ from .models import (
 
 
 def _build_query_or_raise(request: QueryRequest) -> str:
+    return build_query(_options_or_raise(request))
+
+
+def _options_or_raise(request: QueryRequest) -> QueryOptions:
     if request.has_attachment and request.no_attachment:
         raise ValueError("Choose only one: has_attachment or no_attachment")
 
@@ -41,19 +51,44 @@ def _build_query_or_raise(request: QueryRequest) -> str:
         larger=request.larger,
         smaller=request.smaller,
     )
-    built = build_query(opts)
-    if not built:
+    if not build_query(opts):
         raise ValueError("Refusing to run an empty query.")
-    return built
+    return opts
+
+
+class _PageTally:
+    """
+    Pass through at most `limit` IDs (None = all) from a page iterator while
+    counting every ID listed, so a single listing pass gives both the work and
+    the total. Iterating drains the listing even after the limit is reached.
+    """
+
+    def __init__(self, pages: Iterable[list[str]], limit: Optional[int] = None) -> None:
+        self._pages = pages
+        self._limit = limit
+        self.total = 0
+
+    def __iter__(self) -> Iterator[list[str]]:
+        taken = 0
+        for ids in self._pages:
+            self.total += len(ids)
+            if self._limit is not None:
+                ids = ids[: max(0, self._limit - taken)]
+            if ids:
+                taken += len(ids)
+                yield ids
 
 
 def run_query(request: QueryRequest, service=None) -> QueryResult:
     built = _build_query_or_raise(request)
     svc = service or get_gmail_service()
 
+    # Two listings instead of three, run side by side: every match either has
+    # an attachment or does not.
+    with_att_count = BackgroundCount(svc, f"{built} has:attachment")
     total = count_messages(svc, built)
-    with_att = count_messages(svc, f"{built} has:attachment")
-    without_att = count_messages(svc, f"{built} -has:attachment")
+    with_att = with_att_count.result()
+    without_att = max(0, total - with_att)
 
     rows: list[dict] = []
     if request.sample > 0 and total > 0:
@@ -73,45 +108,77 @@ def apply_label(request: LabelRequest, service=None) -> LabelResult:
     svc = service or get_gmail_service()
 
     label_id = get_or_create_label_id(svc, request.target_label)
-    total = count_messages(svc, built)
 
-    done = 0
-    if total > 0:
-        for ids in iter_message_id_pages(svc, built, limit=request.limit):
-            apply_label_to_messages(svc, label_id, ids)
-            done += len(ids)
+    pages = _PageTally(
+        iter_message_id_pages(svc, built, prefetch=ITER_DEFAULTS.prefetch),
+        limit=request.limit or None,
+    )
+    pool = ServicePool(svc)
+    done = write_pages(
+        pages,
+        lambda ids: apply_label_to_messages(pool.service(), label_id, ids),
+        workers=request.workers,
+    )
 
     return LabelResult(
         query=built,
         target_label=request.target_label,
         label_id=label_id,
-        total_matched=total,
+        total_matched=pages.total,
         labeled=done,
     )
 
 
 def export_messages(request: ExportRequest, service=None) -> ExportResult:
     built = _build_query_or_raise(request)
+    if request.fmt not in EXPORT_FORMATS:
+        raise ValueError(f"fmt must be one of: {', '.join(EXPORT_FORMATS)}")
+    if request.limit < 0:
+        raise ValueError("limit must be >= 0 (0 = no limit)")
+    compress = compression_for(request.out, request.compress) if request.out is not None else None
     svc = service or get_gmail_service()
 
-    total = count_messages(svc, built)
-    export_n = min(total, request.limit)
-    rows = export_rows(svc, built, limit=export_n)
-
+    pages = _PageTally(
+        iter_message_id_pages(svc, built, prefetch=ITER_DEFAULTS.prefetch),
+        limit=request.limit or None,
+    )
+    # Rows are written as they are fetched, so memory stays flat at any size.
+    rows = fetch_message_rows(svc, (mid for ids in pages for mid in ids), workers=request.workers)
     if request.out is not None:
-        if request.fmt == "csv":
-            write_csv(rows, request.out)
-        elif request.fmt == "json":
-            write_json(rows, request.out)
-        else:
-            raise ValueError("fmt must be csv or json")
+        exported = stream_rows(
+            rows, request.out, request.fmt, compress=compress, compress_level=request.compress_level
+        )
+    else:
+        exported = sum(1 for _row in rows)
 
     return ExportResult(
         query=built,
-        total_matched=total,
-        exported=len(rows),
+        total_matched=pages.total,
+        exported=exported,
         fmt=request.fmt,
         out=request.out,
+        compress=compress,
+    )
+
+
+def histogram(request: HistogramRequest, service=None) -> HistogramResult:
+    base = _options_or_raise(request)
+    if request.by not in DIMENSIONS:
+        raise ValueError(f"by must be one of: {', '.join(DIMENSIONS)}")
+    svc = service or get_gmail_service()
+
+    result = count_histogram(
+        svc, base, by=request.by, workers=request.workers, max_calls=request.max_calls
+    )
+    return HistogramResult(
+        query=build_query(base),
+        by=result.dimension,
+        total=result.total,
+        calls=result.calls,
+        buckets=[
+            {"lo": b.lo, "hi": b.hi, "estimate": b.estimate, "query": b.query}
+            for b in result.buckets
+        ],
     )
 
 
@@ -121,7 +188,17 @@ def trash_by_label(request: TrashRequest, service=None) -> TrashResult:
 
     svc = service or get_gmail_service()
     query = f"label:{request.label}"
-    total = count_messages(svc, query)
+    if request.execute:
+        # One listing pass: the IDs double as the count for the safety check,
+        # and trashing from this list avoids paging a result set that shrinks
+        # as messages leave the label.
+        ids = [mid for page in iter_message_id_pages(svc, query, prefetch=ITER_DEFAULTS.prefetch) for mid in page]
+        total = len(ids)
+    else:
+        # A dry run only needs the count: the same labelIds listing, without
+        # holding on to the IDs.
+        ids = []
+        total = count_messages(svc, query)
     target_n = min(total, request.limit) if request.limit else total
 
     if target_n > request.max_trash_without_force and not request.force:
@@ -140,10 +217,12 @@ def trash_by_label(request: TrashRequest, service=None) -> TrashResult:
             dry_run=True,
         )
 
-    done = 0
-    for ids in iter_message_id_pages(svc, query, limit=target_n):
-        trash_message_ids(svc, ids)
-        done += len(ids)
+    pool = ServicePool(svc)
+    done = write_pages(
+        [ids[:target_n]],
+        lambda chunk: trash_message_ids(pool.service(), chunk),
+        workers=request.workers,
+    )
 
     return TrashResult(
         label=request.label,
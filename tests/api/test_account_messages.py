@@ -6,14 +6,18 @@ from fastapi.testclient import TestClient
 
 import app.main as main_module
 from app.schemas.messages import AccountMessage
-from app.services.account_messages_service import AccountNotFoundOrNotOwnedError, AccountTokenInvalidError
+from app.services.account_messages_service import (
+    AccountNotFoundOrNotOwnedError,
+    AccountTokenInvalidError,
+    GmailRequestError,
+)
 
 
 class _StubMessagesService:
     def __init__(self) -> None:
         self.calls: list[tuple[int, int]] = []
 
-    def list_messages(self, *, current_user_id: int, account_id: int) -> list[AccountMessage]:
+    async def list_messages(self, *, current_user_id: int, account_id: int) -> list[AccountMessage]:
         self.calls.append((current_user_id, account_id))
         return [
             AccountMessage(
@@ -27,15 +31,20 @@ class _StubMessagesService:
 
 
 class _NotFoundMessagesService:
-    def list_messages(self, *, current_user_id: int, account_id: int) -> list[AccountMessage]:
+    async def list_messages(self, *, current_user_id: int, account_id: int) -> list[AccountMessage]:
         raise AccountNotFoundOrNotOwnedError("missing")
 
 
 class _InvalidTokenMessagesService:
-    def list_messages(self, *, current_user_id: int, account_id: int) -> list[AccountMessage]:
+    async def list_messages(self, *, current_user_id: int, account_id: int) -> list[AccountMessage]:
         raise AccountTokenInvalidError("invalid token")
 
 
+class _GmailDownMessagesService:
+    async def list_messages(self, *, current_user_id: int, account_id: int) -> list[AccountMessage]:
+        raise GmailRequestError("Gmail returned HTTP 500.")
+
+
 def test_account_messages_route_returns_response_model_shape(client: TestClient) -> None:
     stub = _StubMessagesService()
     main_module.app.dependency_overrides[main_module.get_account_messages_service] = lambda: stub
@@ -88,3 +97,18 @@ def test_account_messages_route_returns_400_when_service_reports_invalid_token(
 
     assert response.status_code == 400
     assert response.json() == {"detail": "Account token invalid"}
+
+
+def test_account_messages_route_returns_502_when_gmail_request_fails(
+    client: TestClient,
+) -> None:
+    main_module.app.dependency_overrides[main_module.get_account_messages_service] = (
+        lambda: _GmailDownMessagesService()
+    )
+    try:
+        response = client.get("/accounts/999/messages")
+    finally:
+        main_module.app.dependency_overrides.pop(main_module.get_account_messages_service, None)
+
+    assert response.status_code == 502
+    assert response.json() == {"detail": "Gmail request failed"}
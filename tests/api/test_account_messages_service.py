@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import asyncio
+import threading
 from datetime import UTC
 
+import httpx
 import pytest
 from cryptography.fernet import Fernet
 from sqlalchemy.orm import sessionmaker
@@ -12,8 +15,9 @@ from app.services.account_messages_service import (
     AccountMessagesService,
     AccountNotFoundOrNotOwnedError,
     AccountTokenInvalidError,
+    GmailRequestError,
 )
-from app.services.gmail_client import GmailClientAuthError
+from app.services.gmail_client import GmailApiClient, GmailClientAuthError
 
 
 class _StubGmailClient:
@@ -21,24 +25,46 @@ class _StubGmailClient:
         self._messages = messages
         self.calls: list[int] = []
 
-    def list_messages(self, *, max_results: int) -> list[dict]:
+    async def list_messages(self, *, max_results: int) -> list[dict]:
         self.calls.append(max_results)
         return self._messages
 
 
+class _RevokedOnceGmailClient(_StubGmailClient):
+    async def list_messages(self, *, max_results: int) -> list[dict]:
+        if not self.calls:
+            self.calls.append(max_results)
+            raise GmailClientAuthError("Gmail rejected the access token.")
+        return await super().list_messages(max_results=max_results)
+
+
 class _StubGmailClientFactory:
     def __init__(self, *, client: _StubGmailClient | None = None, error: Exception | None = None) -> None:
         self._client = client
         self._error = error
         self.refresh_tokens: list[str] = []
 
-    def create(self, *, refresh_token: str):
-        self.refresh_tokens.append(refresh_token)
+        self.evicted: list[int] = []
+
+    async def client_for_account(self, *, account_id: int, token_encrypted: str, decrypt):
+        self.refresh_tokens.append(decrypt(token_encrypted))
         if self._error is not None:
             raise self._error
         assert self._client is not None
         return self._client
 
+    def evict(self, account_id: int) -> None:
+        self.evicted.append(account_id)
+
+
+def _api_client(handler) -> GmailApiClient:
+    return GmailApiClient(
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        "access-token",
+        semaphore=asyncio.Semaphore(1),
+        max_attempts=1,
+    )
+
 
 def _create_user(db_session_local: sessionmaker, *, email: str) -> User:
     with db_session_local() as db:
@@ -82,7 +108,7 @@ def test_list_messages_raises_404_error_for_missing_account(
             gmail_client_factory=factory,
         )
         with pytest.raises(AccountNotFoundOrNotOwnedError):
-            service.list_messages(current_user_id=1, account_id=999)
+            asyncio.run(service.list_messages(current_user_id=1, account_id=999))
 
 
 def test_list_messages_raises_404_error_for_unowned_account(
@@ -106,7 +132,7 @@ def test_list_messages_raises_404_error_for_unowned_account(
             gmail_client_factory=factory,
         )
         with pytest.raises(AccountNotFoundOrNotOwnedError):
-            service.list_messages(current_user_id=caller.id, account_id=account.id)
+            asyncio.run(service.list_messages(current_user_id=caller.id, account_id=account.id))
 
 
 def test_list_messages_raises_account_token_invalid_for_missing_encrypted_token(
@@ -128,7 +154,7 @@ def test_list_messages_raises_account_token_invalid_for_missing_encrypted_token(
             gmail_client_factory=factory,
         )
         with pytest.raises(AccountTokenInvalidError):
-            service.list_messages(current_user_id=user.id, account_id=account.id)
+            asyncio.run(service.list_messages(current_user_id=user.id, account_id=account.id))
 
 
 def test_list_messages_raises_account_token_invalid_for_decryption_failure(
@@ -150,7 +176,7 @@ def test_list_messages_raises_account_token_invalid_for_decryption_failure(
             gmail_client_factory=factory,
         )
         with pytest.raises(AccountTokenInvalidError):
-            service.list_messages(current_user_id=user.id, account_id=account.id)
+            asyncio.run(service.list_messages(current_user_id=user.id, account_id=account.id))
 
 
 def test_list_messages_raises_account_token_invalid_for_gmail_auth_failure(
@@ -173,7 +199,7 @@ def test_list_messages_raises_account_token_invalid_for_gmail_auth_failure(
             gmail_client_factory=factory,
         )
         with pytest.raises(AccountTokenInvalidError):
-            service.list_messages(current_user_id=user.id, account_id=account.id)
+            asyncio.run(service.list_messages(current_user_id=user.id, account_id=account.id))
 
 
 def test_list_messages_maps_payload_and_limits_to_ten(
@@ -220,7 +246,7 @@ def test_list_messages_maps_payload_and_limits_to_ten(
             token_enc_key=key,
             gmail_client_factory=factory,
         )
-        messages = service.list_messages(current_user_id=user.id, account_id=account.id)
+        messages = asyncio.run(service.list_messages(current_user_id=user.id, account_id=account.id))
 
     assert client.calls == [10]
     assert factory.refresh_tokens == ["refresh-token-abc"]
@@ -234,3 +260,128 @@ def test_list_messages_maps_payload_and_limits_to_ten(
     assert messages[1].subject == "Subject 2"
     assert messages[1].from_ == "sender2@example.com"
     assert messages[1].snippet == "snippet-2"
+
+
+def test_list_messages_evicts_and_retries_once_when_cached_token_is_rejected(
+    testing_session_local: sessionmaker,
+) -> None:
+    user = _create_user(testing_session_local, email="u5@localhost")
+    key = Fernet.generate_key().decode("utf-8")
+    account = _create_account(
+        testing_session_local,
+        user_id=user.id,
+        token_encrypted=encrypt_refresh_token(key, "refresh-token-r"),
+    )
+    client = _RevokedOnceGmailClient([{"id": "m-1"}])
+    factory = _StubGmailClientFactory(client=client)
+
+    with testing_session_local() as db:
+        service = AccountMessagesService(
+            db=db,
+            token_enc_key=key,
+            gmail_client_factory=factory,
+        )
+        messages = asyncio.run(service.list_messages(current_user_id=user.id, account_id=account.id))
+
+    assert [m.id for m in messages] == ["m-1"]
+    assert factory.evicted == [account.id]
+    assert client.calls == [10, 10]
+
+
+def test_list_messages_raises_account_token_invalid_when_retry_is_rejected_too(
+    testing_session_local: sessionmaker,
+) -> None:
+    user = _create_user(testing_session_local, email="u6@localhost")
+    key = Fernet.generate_key().decode("utf-8")
+    account = _create_account(
+        testing_session_local,
+        user_id=user.id,
+        token_encrypted=encrypt_refresh_token(key, "refresh-token-revoked"),
+    )
+    requests: list[httpx.Request] = []
+
+    def _unauthorized(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(401)
+
+    factory = _StubGmailClientFactory(client=_api_client(_unauthorized))
+
+    with testing_session_local() as db:
+        service = AccountMessagesService(
+            db=db,
+            token_enc_key=key,
+            gmail_client_factory=factory,
+        )
+        with pytest.raises(AccountTokenInvalidError):
+            asyncio.run(service.list_messages(current_user_id=user.id, account_id=account.id))
+
+    assert factory.evicted == [account.id]
+    assert len(requests) == 2
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [httpx.Response(500), httpx.ConnectError("unreachable")],
+    ids=["http-status", "transport"],
+)
+def test_list_messages_raises_gmail_request_error_for_gmail_failures(
+    testing_session_local: sessionmaker,
+    failure: httpx.Response | httpx.HTTPError,
+) -> None:
+    user = _create_user(testing_session_local, email="u7@localhost")
+    key = Fernet.generate_key().decode("utf-8")
+    account = _create_account(
+        testing_session_local,
+        user_id=user.id,
+        token_encrypted=encrypt_refresh_token(key, "refresh-token-down"),
+    )
+
+    def _respond(request: httpx.Request) -> httpx.Response:
+        if isinstance(failure, Exception):
+            raise failure
+        return failure
+
+    factory = _StubGmailClientFactory(client=_api_client(_respond))
+
+    with testing_session_local() as db:
+        service = AccountMessagesService(
+            db=db,
+            token_enc_key=key,
+            gmail_client_factory=factory,
+        )
+        with pytest.raises(GmailRequestError):
+            asyncio.run(service.list_messages(current_user_id=user.id, account_id=account.id))
+
+    assert factory.evicted == []
+
+
+def test_list_messages_queries_the_database_off_the_event_loop_thread(
+    testing_session_local: sessionmaker,
+) -> None:
+    user = _create_user(testing_session_local, email="u8@localhost")
+    key = Fernet.generate_key().decode("utf-8")
+    account = _create_account(
+        testing_session_local,
+        user_id=user.id,
+        token_encrypted=encrypt_refresh_token(key, "refresh-token-t"),
+    )
+    factory = _StubGmailClientFactory(client=_StubGmailClient([]))
+    query_threads: list[threading.Thread] = []
+
+    with testing_session_local() as db:
+        execute = db.execute
+
+        def _recording_execute(*args, **kwargs):
+            query_threads.append(threading.current_thread())
+            return execute(*args, **kwargs)
+
+        db.execute = _recording_execute
+        service = AccountMessagesService(
+            db=db,
+            token_enc_key=key,
+            gmail_client_factory=factory,
+        )
+        asyncio.run(service.list_messages(current_user_id=user.id, account_id=account.id))
+
+    assert query_threads
+    assert threading.main_thread() not in query_threads
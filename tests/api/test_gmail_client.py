@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.gmail_client import (
+    GmailApiClient,
+    GmailClientAuthError,
+    GmailClientFactory,
+    new_async_http,
+)
+
+
+async def _no_sleep(_seconds: float) -> None:
+    return None
+
+
+class _Gmail:
+    """httpx mock handler for the token endpoint and messages list/get."""
+
+    def __init__(self, ids: list[str], failures: dict[str, list[int]] | None = None) -> None:
+        self.ids = ids
+        self.failures = failures or {}
+        self.requests: list[httpx.Request] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.url.host == "oauth2.googleapis.com":
+            if b"refresh_token=bad" in request.content:
+                return httpx.Response(400, json={"error": "invalid_grant"})
+            return httpx.Response(200, json={"access_token": "access-1", "expires_in": 3600})
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            path = request.url.path.rsplit("/", 1)[-1]
+            if path == "messages":
+                return httpx.Response(200, json={"messages": [{"id": i} for i in self.ids]})
+            statuses = self.failures.get(path)
+            if statuses:
+                return httpx.Response(statuses.pop(0), json={"error": {}})
+            return httpx.Response(200, json={"id": path, "payload": {"headers": []}})
+        finally:
+            self.in_flight -= 1
+
+
+def _client(gmail: _Gmail, concurrency: int = 10) -> tuple[httpx.AsyncClient, GmailApiClient]:
+    http = httpx.AsyncClient(transport=httpx.MockTransport(gmail))
+    client = GmailApiClient(
+        http, "access-1", semaphore=asyncio.Semaphore(concurrency), sleep=_no_sleep
+    )
+    return http, client
+
+
+def test_list_messages_fetches_metadata_concurrently_under_semaphore() -> None:
+    gmail = _Gmail([f"m{i}" for i in range(8)])
+
+    async def _run() -> list[dict]:
+        http, client = _client(gmail, concurrency=3)
+        async with http:
+            return await client.list_messages(max_results=8)
+
+    messages = asyncio.run(_run())
+
+    assert [m["id"] for m in messages] == [f"m{i}" for i in range(8)]
+    assert 1 < gmail.max_in_flight <= 3
+    get = gmail.requests[-1]
+    assert get.headers["authorization"] == "Bearer access-1"
+    assert get.url.params.get_list("metadataHeaders") == ["Subject", "From", "Date"]
+    assert get.url.params["fields"] == "id,snippet,internalDate,payload/headers"
+    assert gmail.requests[0].url.params["fields"] == "messages/id"
+
+
+def test_retries_throttled_gets_and_raises_on_auth_failure() -> None:
+    gmail = _Gmail(["m1", "m2"], failures={"m2": [429, 503], "m1": []})
+
+    async def _run() -> list[dict]:
+        http, client = _client(gmail)
+        async with http:
+            return await client.list_messages(max_results=2)
+
+    assert [m["id"] for m in asyncio.run(_run())] == ["m1", "m2"]
+
+    gmail = _Gmail(["m1"], failures={"m1": [401]})
+    with pytest.raises(GmailClientAuthError):
+        asyncio.run(_run())
+
+
+def test_factory_refreshes_token_and_shares_pooled_client() -> None:
+    gmail = _Gmail(["m1"])
+
+    async def _run() -> None:
+        factory = GmailClientFactory(
+            client_id="cid",
+            client_secret="secret",
+            http=httpx.AsyncClient(transport=httpx.MockTransport(gmail)),
+        )
+        first = await factory.create(refresh_token="good")
+        second = await factory.create(refresh_token="good")
+        assert first._http is second._http
+        assert first._semaphore is second._semaphore
+        with pytest.raises(GmailClientAuthError):
+            await factory.create(refresh_token="bad")
+        await factory.aclose()
+
+    asyncio.run(_run())
+
+
+def test_pooled_client_asks_for_gzip() -> None:
+    async def _run() -> httpx.AsyncClient:
+        async with new_async_http() as http:
+            return http
+
+    http = asyncio.run(_run())
+    assert "gzip" in http.headers["user-agent"]
+    assert "gzip" in http.headers["accept-encoding"]
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_factory_caches_clients_per_account_until_near_expiry() -> None:
+    gmail = _Gmail(["m1"])
+    clock = _Clock()
+    decrypted: list[str] = []
+
+    def _decrypt(token: str) -> str:
+        decrypted.append(token)
+        return "good"
+
+    def _token_calls() -> int:
+        return sum(1 for r in gmail.requests if r.url.host == "oauth2.googleapis.com")
+
+    async def _run() -> None:
+        factory = GmailClientFactory(
+            client_id="cid",
+            client_secret="secret",
+            http=httpx.AsyncClient(transport=httpx.MockTransport(gmail)),
+            clock=clock,
+        )
+        kwargs = {"account_id": 1, "token_encrypted": "enc-1", "decrypt": _decrypt}
+
+        # Concurrent misses share one refresh.
+        first, second = await asyncio.gather(
+            factory.client_for_account(**kwargs), factory.client_for_account(**kwargs)
+        )
+        assert first is second
+        assert _token_calls() == 1 and decrypted == ["enc-1"]
+
+        clock.now += 3000  # still outside the expiry margin
+        assert await factory.client_for_account(**kwargs) is first
+        assert _token_calls() == 1
+
+        clock.now += 400  # within 5 minutes of expiry
+        assert await factory.client_for_account(**kwargs) is not first
+        assert _token_calls() == 2
+
+        # A replaced token or an explicit eviction forces a refresh.
+        await factory.client_for_account(**{**kwargs, "token_encrypted": "enc-2"})
+        factory.evict(1)
+        await factory.client_for_account(**{**kwargs, "token_encrypted": "enc-2"})
+        assert _token_calls() == 4
+        await factory.aclose()
+
+    asyncio.run(_run())
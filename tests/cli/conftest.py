@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import re
+import threading
+from datetime import date, datetime, timezone
+from typing import Callable, Optional
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+_SPAM_TRASH = {"SPAM", "TRASH"}
+_DATE_FILTER = re.compile(r"\b(after|before):(\d{4})/(\d{1,2})/(\d{1,2})")
+_SIZE_FILTER = re.compile(r"\b(larger|smaller):(\d+)")
+
+
+def make_message(
+    mid: str,
+    day: Optional[date] = None,
+    sender: str = "a@example.com",
+    size: int = 1234,
+    labels: Optional[list[str]] = None,
+    subject: Optional[str] = None,
+) -> dict:
+    """
+    A messages.get(format=metadata) response; `day` sets internalDate.
+    """
+    day = day or date(2023, 11, 14)
+    internal_ms = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+    return {
+        "id": mid,
+        "threadId": f"t{mid}",
+        "labelIds": list(labels or ["INBOX"]),
+        "internalDate": str(internal_ms),
+        "sizeEstimate": size,
+        "snippet": "hello",
+        "payload": {
+            "headers": [
+                {"name": "From", "value": sender},
+                {"name": "Subject", "value": subject or mid},
+            ]
+        },
+    }
+
+
+def matches_filters(q: str, msg: dict) -> bool:
+    """
+    Apply the after:/before: (UTC day of internalDate) and larger:/smaller:
+    (sizeEstimate) filters in `q` to `msg`; every other term matches.
+    """
+    day = datetime.fromtimestamp(int(msg["internalDate"]) / 1000, tz=timezone.utc).date()
+    for op, y, m, d in _DATE_FILTER.findall(q or ""):
+        bound = date(int(y), int(m), int(d))
+        if (op == "after" and day < bound) or (op == "before" and day >= bound):
+            return False
+    size = int(msg.get("sizeEstimate") or 0)
+    for op, n in _SIZE_FILTER.findall(q or ""):
+        if (op == "larger" and size <= int(n)) or (op == "smaller" and size >= int(n)):
+            return False
+    return True
+
+
+class FakeRequest:
+    def __init__(self, gmail: "FakeGmail", method: str, kwargs: dict) -> None:
+        self.gmail = gmail
+        self.method = method
+        self.kwargs = kwargs
+
+    @property
+    def key(self) -> str:
+        """
+        What a batch records for this request: the message ID or label name.
+        """
+        return self.kwargs.get("id") or self.kwargs.get("body", {}).get("name", "")
+
+    def execute(self, http=None):
+        self.gmail.record(self.method, self.kwargs)
+        return self.gmail.respond(self)
+
+
+class FakeBatch:
+    def __init__(self, gmail: "FakeGmail", callback) -> None:
+        self._gmail = gmail
+        self._callback = callback
+        self._items: list[tuple[str, FakeRequest]] = []
+
+    def add(self, request: FakeRequest, request_id: Optional[str] = None) -> None:
+        self._items.append((request_id, request))
+
+    def execute(self, http=None) -> None:
+        with self._gmail.lock:
+            self._gmail.batches.append([req.key for _rid, req in self._items])
+            if self._gmail.batch_errors:
+                raise self._gmail.batch_errors.pop(0)
+        for request_id, req in self._items:
+            self._gmail.record(req.method, req.kwargs)
+            try:
+                response = self._gmail.respond(req)
+            except HttpError as exc:
+                self._callback(request_id, None, exc)
+            else:
+                self._callback(request_id, response, None)
+
+
+class _Resource:
+    def __init__(self, gmail: "FakeGmail", name: str) -> None:
+        self._gmail = gmail
+        self._name = name
+
+    def __getattr__(self, method: str) -> Callable[..., FakeRequest]:
+        return lambda **kwargs: FakeRequest(self._gmail, f"{self._name}.{method}", kwargs)
+
+
+class FakeGmail:
+    """
+    In-memory stand-in for the Gmail v1 service: users().messages(),
+    labels(), history() and getProfile(), plus batch requests.
+
+    messages.list pages through `mailbox` in insertion order, applying
+    labelIds, includeSpamTrash and `match(q, msg)` (matches_filters by
+    default); resultSizeEstimate is exact unless `estimate` is set.
+    labels.get reports messagesTotal like Gmail does, Spam and Trash
+    included. `failures` maps message IDs to errors returned (one per
+    attempt) by messages.get; `batch_errors` are raised (one per call) by
+    a whole batch request; `list_error` is an exception, or a callable of
+    the list kwargs returning one, raised by messages.list.
+
+    Every request, batched or not, is recorded in `calls` as (method,
+    kwargs); `batches` records the IDs or label names each batch carried.
+    """
+
+    def __init__(
+        self,
+        mailbox: Optional[dict[str, dict]] = None,
+        labels: Optional[list[dict]] = None,
+        match: Callable[[str, dict], bool] = matches_filters,
+        estimate: Optional[int] = None,
+        failures: Optional[dict[str, list[Exception]]] = None,
+        list_error=None,
+        history_id: str = "100",
+    ) -> None:
+        self.mailbox = mailbox if mailbox is not None else {}
+        self.labels_store = labels if labels is not None else [{"id": "INBOX", "name": "INBOX", "type": "system"}]
+        self.match = match
+        self.estimate = estimate
+        self.failures = failures or {}
+        self.list_error = list_error
+        self.history_id = history_id
+        self.history_records: list[dict] | Exception = []
+        self.batch_errors: list[Exception] = []
+        self.calls: list[tuple[str, dict]] = []
+        self.batches: list[list[str]] = []
+        self.fetched: list[str] = []
+        self.threads: set[str] = set()
+        self.lock = threading.Lock()
+
+    # Resource tree
+
+    def users(self) -> "FakeGmail":
+        return self
+
+    def messages(self) -> _Resource:
+        return _Resource(self, "messages")
+
+    def labels(self) -> _Resource:
+        return _Resource(self, "labels")
+
+    def history(self) -> _Resource:
+        return _Resource(self, "history")
+
+    def getProfile(self, **kwargs) -> FakeRequest:
+        return FakeRequest(self, "getProfile", kwargs)
+
+    def new_batch_http_request(self, callback=None) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+    # Inspection
+
+    def record(self, method: str, kwargs: dict) -> None:
+        with self.lock:
+            self.calls.append((method, kwargs))
+            self.threads.add(threading.current_thread().name)
+
+    def methods(self) -> list[str]:
+        return [method for method, _kwargs in self.calls]
+
+    def count(self, method: str) -> int:
+        return sum(1 for m, _kwargs in self.calls if m == method)
+
+    def matching(self, q: str = "", label_ids: tuple[str, ...] = (), include_spam_trash: bool = False) -> list[str]:
+        hidden = set() if include_spam_trash else _SPAM_TRASH - set(label_ids)
+        return [
+            mid
+            for mid, msg in self.mailbox.items()
+            if set(label_ids) <= set(msg["labelIds"])
+            and not hidden & set(msg["labelIds"])
+            and self.match(q, msg)
+        ]
+
+    # Responses
+
+    def respond(self, request: FakeRequest):
+        handler = getattr(self, "_" + request.method.replace(".", "_"))
+        return handler(**request.kwargs)
+
+    def _messages_list(self, **kwargs) -> dict:
+        error = self.list_error(kwargs) if callable(self.list_error) else self.list_error
+        if error is not None:
+            raise error
+        ids = self.matching(
+            kwargs.get("q") or "", tuple(kwargs.get("labelIds") or ()), kwargs.get("includeSpamTrash", False)
+        )
+        estimate = self.estimate if self.estimate is not None else len(ids)
+        if kwargs.get("fields") == "resultSizeEstimate":
+            return {"resultSizeEstimate": estimate}
+        start = int(kwargs.get("pageToken") or 0)
+        page = ids[start : start + kwargs.get("maxResults", 100)]
+        resp: dict = {"messages": [{"id": mid, "threadId": f"t{mid}"} for mid in page], "resultSizeEstimate": estimate}
+        if start + len(page) < len(ids):
+            resp["nextPageToken"] = str(start + len(page))
+        return resp
+
+    def _messages_get(self, id: str, **_kwargs) -> dict:
+        with self.lock:
+            failures = self.failures.get(id)
+            if failures:
+                raise failures.pop(0)
+            self.fetched.append(id)
+        if id not in self.mailbox:
+            return {"id": id, "payload": {"headers": []}}
+        return self.mailbox[id]
+
+    def _getProfile(self, **_kwargs) -> dict:
+        return {"historyId": self.history_id}
+
+    def _history_list(self, **_kwargs) -> dict:
+        if isinstance(self.history_records, Exception):
+            raise self.history_records
+        return {"history": self.history_records, "historyId": self.history_id}
+
+    def _labels_list(self, **_kwargs) -> dict:
+        return {"labels": list(self.labels_store)}
+
+    def _labels_get(self, id: str, **_kwargs) -> dict:
+        total = sum(1 for msg in self.mailbox.values() if id in msg["labelIds"])
+        return {"id": id, "messagesTotal": total}
+
+    def _labels_create(self, body: dict, **_kwargs) -> dict:
+        if any(lbl["name"] == body["name"] for lbl in self.labels_store):
+            raise http_error(409)
+        label = {"id": f"Label_{len(self.labels_store) + 1}", "name": body["name"], "type": "user"}
+        self.labels_store.append(label)
+        return label
+
+    def _labels_delete(self, id: str, **_kwargs) -> dict:
+        self.labels_store = [lbl for lbl in self.labels_store if lbl["id"] != id]
+        return {}
+
+
+def http_error(status: int, content: bytes = b"") -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+@pytest.fixture
+def fake_gmail() -> type[FakeGmail]:
+    """
+    FakeGmail, to be called with the mailbox and labels a test needs.
+    """
+    return FakeGmail
+
+
+@pytest.fixture
+def gmail_message() -> Callable[..., dict]:
+    return make_message
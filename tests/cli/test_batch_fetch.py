@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from gmail_cleanup.batch_fetch import iter_message_metadata
+from gmail_cleanup.concurrency import AdaptiveConcurrency, is_retryable
+
+
+def _http_error(status: int, content: bytes = b"") -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+def test_groups_calls_into_batches_of_at_most_100_in_input_order(fake_gmail) -> None:
+    service = fake_gmail()
+    ids = [f"m{i}" for i in range(250)]
+
+    msgs = list(iter_message_metadata(service, iter(ids), headers=["From"]))
+
+    assert [m["id"] for m in msgs] == ids
+    assert [len(b) for b in service.batches] == [100, 100, 50]
+    for method, kwargs in service.calls:
+        assert method == "messages.get"
+        assert kwargs["format"] == "metadata"
+        assert "payload/headers" in kwargs["fields"]
+
+
+def test_retries_only_failed_sub_requests(fake_gmail) -> None:
+    service = fake_gmail(failures={"m2": [_http_error(429)], "m4": [_http_error(503)]})
+    sleeps: list[float] = []
+
+    msgs = list(
+        iter_message_metadata(service, ["m1", "m2", "m3", "m4"], headers=["From"], sleep=sleeps.append)
+    )
+
+    assert [m["id"] for m in msgs] == ["m1", "m2", "m3", "m4"]
+    assert service.batches == [["m1", "m2", "m3", "m4"], ["m2", "m4"]]
+    assert len(sleeps) == 1
+
+
+def test_retries_whole_batch_on_retryable_error(fake_gmail) -> None:
+    service = fake_gmail()
+    service.batch_errors = [_http_error(503)]
+    sleeps: list[float] = []
+
+    msgs = list(iter_message_metadata(service, ["m1", "m2"], headers=["From"], sleep=sleeps.append))
+
+    assert [m["id"] for m in msgs] == ["m1", "m2"]
+    assert service.batches == [["m1", "m2"], ["m1", "m2"]]
+    assert len(sleeps) == 1
+
+
+def test_skips_messages_deleted_since_listing(fake_gmail, caplog) -> None:
+    service = fake_gmail(failures={"m2": [_http_error(404)]})
+
+    msgs = list(iter_message_metadata(service, ["m1", "m2", "m3"], headers=["From"], sleep=lambda _s: None))
+
+    assert [m["id"] for m in msgs] == ["m1", "m3"]
+    assert len(service.batches) == 1
+    assert "Skipped 1 message(s)" in caplog.text
+
+
+def test_non_retryable_error_is_raised(fake_gmail) -> None:
+    service = fake_gmail(failures={"m1": [_http_error(400)]})
+
+    with pytest.raises(HttpError):
+        list(iter_message_metadata(service, ["m1"], headers=["From"], sleep=lambda _s: None))
+
+
+def test_gives_up_after_max_attempts(fake_gmail) -> None:
+    service = fake_gmail(failures={"m1": [_http_error(500)] * 3})
+
+    with pytest.raises(HttpError):
+        list(
+            iter_message_metadata(
+                service, ["m1"], headers=["From"], max_attempts=2, sleep=lambda _s: None
+            )
+        )
+    assert len(service.batches) == 2
+
+
+def test_is_retryable_recognizes_rate_limit_403() -> None:
+    assert is_retryable(_http_error(403, b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}'))
+    assert not is_retryable(_http_error(403, b'{"error": {"errors": [{"reason": "forbidden"}]}}'))
+    assert not is_retryable(ValueError("boom"))
+
+
+def test_controller_sets_batch_size_and_shrinks_on_throttle(fake_gmail) -> None:
+    service = fake_gmail(failures={"m1": [_http_error(429)]})
+    controller = AdaptiveConcurrency(initial=4)
+
+    msgs = list(
+        iter_message_metadata(
+            service, [f"m{i}" for i in range(8)], headers=["From"], sleep=lambda _s: None, controller=controller
+        )
+    )
+
+    assert len(msgs) == 8
+    assert [len(b) for b in service.batches] == [4, 1, 2, 2]
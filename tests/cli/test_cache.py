@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import date
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from gmail_cleanup.cache import MessageCache, iter_ids, iter_metadata, sync
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with MessageCache(tmp_path / "cache.sqlite3") as c:
+        yield c
+
+
+@pytest.fixture
+def mailbox(gmail_message):
+    return lambda *ids: {mid: gmail_message(mid) for mid in ids}
+
+
+def test_full_sync_populates_cache_and_history_id(cache, fake_gmail, mailbox) -> None:
+    service = fake_gmail(mailbox("m1", "m2"))
+
+    result = sync(service, cache)
+
+    assert result.mode == "full"
+    assert result.added == 2
+    assert cache.count() == 2
+    assert cache.history_id == "100"
+    cached = cache.get_many(["m1"])["m1"]
+    assert cached["labelIds"] == ["INBOX"]
+    assert {"name": "From", "value": "a@example.com"} in cached["payload"]["headers"]
+
+
+def test_incremental_sync_applies_history(cache, fake_gmail, mailbox, gmail_message) -> None:
+    service = fake_gmail(mailbox("m1", "m2", "m3"))
+    sync(service, cache)
+
+    service.mailbox["m4"] = gmail_message("m4")
+    service.history_id = "150"
+    service.history_records = [
+        {"messagesAdded": [{"message": {"id": "m4"}}]},
+        {"messagesDeleted": [{"message": {"id": "m1"}}]},
+        {"labelsAdded": [{"message": {"id": "m2", "labelIds": ["INBOX", "Label_1"]}}]},
+        {"labelsAdded": [{"message": {"id": "m3", "labelIds": ["TRASH"]}}]},
+    ]
+    service.fetched.clear()
+
+    result = sync(service, cache)
+
+    assert result.mode == "incremental"
+    assert (result.added, result.deleted, result.relabeled) == (1, 2, 1)
+    assert service.fetched == ["m4"]
+    assert set(cache.get_many(["m1", "m2", "m3", "m4"])) == {"m2", "m4"}
+    assert cache.get_many(["m2"])["m2"]["labelIds"] == ["INBOX", "Label_1"]
+    assert cache.history_id == "150"
+
+
+def test_expired_history_falls_back_to_full_sync(cache, fake_gmail, mailbox) -> None:
+    service = fake_gmail(mailbox("m1"))
+    sync(service, cache)
+
+    service.mailbox = mailbox("m2")
+    service.history_records = HttpError(httplib2.Response({"status": 404}), b"")
+
+    result = sync(service, cache)
+
+    assert result.mode == "full"
+    assert set(cache.get_many(["m1", "m2"])) == {"m2"}
+
+
+def test_iter_metadata_reads_cache_and_fetches_only_misses(cache, fake_gmail, mailbox, gmail_message) -> None:
+    service = fake_gmail(mailbox("m1", "m2", "m3"))
+    cache.upsert([gmail_message("m2")])
+
+    msgs = list(iter_metadata(service, ["m1", "m2", "m3"], headers=["From"], cache=cache))
+
+    assert [m["id"] for m in msgs] == ["m1", "m2", "m3"]
+    assert service.fetched == ["m1", "m3"]
+    assert cache.count() == 3
+
+
+def test_label_index_follows_upserts_relabels_and_deletes(tmp_path, gmail_message) -> None:
+    with MessageCache(tmp_path / "cache.sqlite3") as cache:
+        cache.upsert([
+            gmail_message("m1", day=date(2023, 1, 1), labels=["INBOX", "Label_1"]),
+            gmail_message("m2", day=date(2023, 3, 1), labels=["INBOX"]),
+            gmail_message("m3", day=date(2023, 2, 1), labels=["INBOX", "Label_1"]),
+        ])
+        assert cache.ids_with_labels(["INBOX"]) == ["m2", "m3", "m1"]
+        assert cache.ids_with_labels(["INBOX", "Label_1"], limit=1) == ["m3"]
+
+        cache.update_labels({"m2": ["INBOX", "Label_1"], "m3": ["INBOX"]})
+        cache.delete(["m1"])
+
+        assert cache.ids_with_labels(["INBOX", "Label_1"]) == ["m2"]
+        assert cache.count_with_labels(["INBOX"]) == 2
+
+
+def test_label_index_is_backfilled_for_older_caches(tmp_path, gmail_message) -> None:
+    path = tmp_path / "cache.sqlite3"
+    with MessageCache(path) as cache:
+        cache.upsert([gmail_message("m1", labels=["INBOX", "Label_1"])])
+    with sqlite3.connect(str(path)) as db:
+        db.execute("DELETE FROM message_labels")
+
+    with MessageCache(path) as cache:
+        assert cache.ids_with_labels(["Label_1"]) == ["m1"]
+
+
+def test_iter_ids_answers_label_only_queries_from_a_synced_cache(cache, fake_gmail, gmail_message) -> None:
+    service = fake_gmail({
+        "m1": gmail_message("m1", labels=["INBOX", "UNREAD"]),
+        "m2": gmail_message("m2", labels=["INBOX"]),
+    })
+    assert list(iter_ids(service, "is:unread", cache=cache)) == ["m1"]
+    assert service.count("messages.list") == 1  # not synced yet: listed
+
+    sync(service, cache)
+    service.calls.clear()
+
+    assert list(iter_ids(service, "in:inbox is:unread", cache=cache)) == ["m1"]
+    assert service.count("messages.list") == 0
+    assert list(iter_ids(service, "from:a@example.com", cache=cache)) == ["m1", "m2"]
+    assert list(iter_ids(service, "in:trash", cache=cache)) == []
+    assert service.count("messages.list") == 2
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import pytest
+
+from gmail_cleanup.checkpoint import decode_ids, encode_ids, open_checkpoint, run_checkpointed
+from gmail_cleanup.gmail_iter import MessagePage
+
+
+@pytest.fixture(autouse=True)
+def _app_dir(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    monkeypatch.setenv("APPDATA", str(tmp_path))
+
+
+def _pages() -> list[MessagePage]:
+    ids = [f"{i:016x}" for i in range(1, 10)]
+    return [
+        MessagePage(ids=ids[0:3], page_token=None, next_page_token="t1"),
+        MessagePage(ids=ids[3:6], page_token="t1", next_page_token="t2"),
+        MessagePage(ids=ids[6:9], page_token="t2", next_page_token=None),
+    ]
+
+
+def test_processed_ids_round_trip_compactly() -> None:
+    hex_ids = {f"{i * 7919:016x}" for i in range(1000)}
+    encoded = encode_ids(hex_ids)
+
+    assert decode_ids(encoded) == hex_ids
+    assert len(encoded) < 16 * 1000 / 2
+    assert decode_ids(encode_ids({"not-hex", "abc"})) == {"not-hex", "abc"}
+    assert decode_ids(encode_ids(set())) == set()
+
+
+def test_resume_skips_committed_ids_and_continues_from_page_token() -> None:
+    writes: list[list[str]] = []
+
+    def _flaky_write(ids: list[str]) -> None:
+        if len(writes) == 2:
+            raise ConnectionError("network dropped")
+        writes.append(ids)
+
+    first = open_checkpoint("label", "from:x", target="cleanup/a")
+    with pytest.raises(ConnectionError):
+        run_checkpointed(_pages(), _flaky_write, first, chunk_size=2)
+
+    resumed = open_checkpoint("label", "from:x", target="cleanup/a", resume=True)
+    assert resumed.done == 4
+    assert resumed.processed == set(writes[0] + writes[1])
+    # Page 1 (3 IDs) is fully committed, page 2 only partly.
+    assert resumed.start_token == "t1"
+
+    # Listing restarts at page token t1.
+    done = run_checkpointed(_pages()[1:], writes.append, resumed, chunk_size=2)
+
+    written = [i for chunk in writes for i in chunk]
+    assert done == 9
+    assert sorted(written) == sorted(i for p in _pages() for i in p.ids)
+    assert len(written) == len(set(written))
+
+
+def test_fresh_run_ignores_saved_checkpoint() -> None:
+    saved = open_checkpoint("label", "from:x")
+    run_checkpointed(_pages()[:1], lambda _ids: None, saved)
+
+    assert open_checkpoint("label", "from:x", resume=True).done == 3
+    assert open_checkpoint("label", "from:x").done == 0
+    assert open_checkpoint("label", "from:y", resume=True).done == 0
+
+
+def test_shrinking_operations_resume_from_first_page() -> None:
+    checkpoint = open_checkpoint("trash", "label:cleanup/a")
+    run_checkpointed(_pages()[:1], lambda _ids: None, checkpoint)
+
+    assert checkpoint.page_token == "t1"
+    assert checkpoint.start_token is None
+
+
+def test_limit_counts_messages_done_in_earlier_runs() -> None:
+    checkpoint = open_checkpoint("label", "from:x")
+    run_checkpointed(_pages()[:1], lambda _ids: None, checkpoint)
+    writes: list[list[str]] = []
+
+    done = run_checkpointed(_pages(), writes.append, checkpoint, limit=5)
+
+    assert done == 5
+    assert [len(w) for w in writes] == [2]
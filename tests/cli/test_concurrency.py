@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import threading
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from gmail_cleanup.concurrency import AdaptiveConcurrency, jittered_backoff, produce_in_threads
+
+
+def _http_error(status: int) -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), b"")
+
+
+def test_limit_grows_additively_per_window_of_successes() -> None:
+    controller = AdaptiveConcurrency(initial=4, maximum=10)
+
+    controller.on_success(4)
+    assert controller.limit == 4  # 4 + 4 * (1/4.x) stays just under 5
+    controller.on_success(2)
+    assert controller.limit == 5
+
+
+def test_limit_is_cut_multiplicatively_and_bounded() -> None:
+    controller = AdaptiveConcurrency(initial=40, minimum=3)
+
+    controller.on_throttle()
+    assert controller.limit == 20
+    for _ in range(10):
+        controller.on_throttle()
+    assert controller.limit == 3
+
+
+def test_run_retries_throttled_calls_with_backoff() -> None:
+    controller = AdaptiveConcurrency(initial=8, rng=lambda: 1.0)
+    outcomes: list[object] = [_http_error(429), _http_error(503), "ok"]
+    sleeps: list[float] = []
+
+    def _call() -> str:
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert controller.run(_call, sleep=sleeps.append) == "ok"
+    assert sleeps == [1.0, 2.0]
+    assert controller.limit == 2
+    assert controller.in_flight == 0
+
+
+def test_run_raises_non_retryable_errors_immediately() -> None:
+    controller = AdaptiveConcurrency(initial=8)
+
+    with pytest.raises(HttpError):
+        controller.run(lambda: (_ for _ in ()).throw(_http_error(404)), sleep=lambda _s: None)
+    assert controller.limit == 8
+    assert controller.in_flight == 0
+
+
+def test_jittered_backoff_is_capped() -> None:
+    assert jittered_backoff(1, base=1.0, rng=lambda: 1.0) == 1.0
+    assert jittered_backoff(4, base=1.0, rng=lambda: 0.5) == 4.0
+    assert jittered_backoff(20, base=1.0, cap=32.0, rng=lambda: 1.0) == 32.0
+
+
+def test_produce_in_threads_drains_every_source_and_joins_on_close() -> None:
+    sources = [lambda i=i: range(i * 10, i * 10 + 10) for i in range(5)]
+
+    items = list(produce_in_threads(sources, workers=3, buffer=2, thread_name="test-producer"))
+    assert sorted(items) == list(range(50))
+
+    stream = produce_in_threads([lambda: iter(range(10**9))], buffer=2, thread_name="test-producer")
+    assert next(stream) == 0
+    stream.close()
+    assert not [t for t in threading.enumerate() if t.name.startswith("test-producer")]
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import bz2
+import csv
+import gzip
+import json
+import lzma
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+from typer.testing import CliRunner
+
+from gmail_cleanup import gmail
+from gmail_cleanup.cli import app
+from gmail_cleanup.exporter import (
+    ExportDefaults,
+    RowWriter,
+    append_rows,
+    compression_for,
+    stream_rows,
+    write_json,
+)
+
+
+def _rows(n: int) -> list[dict]:
+    return [{"id": f"m{i}", "date": "", "from": "a@x", "to": "", "subject": f"s{i}"} for i in range(n)]
+
+
+def test_json_stream_matches_indented_dump(tmp_path) -> None:
+    out = tmp_path / "out.json"
+    for rows in ([], _rows(1), _rows(3)):
+        write_json(iter(rows), out)
+        assert out.read_text(encoding="utf-8") == json.dumps(rows, ensure_ascii=False, indent=2)
+
+
+def test_rows_are_flushed_while_writing(tmp_path) -> None:
+    out = tmp_path / "out.ndjson"
+    with RowWriter(out, "ndjson", defaults=ExportDefaults(flush_rows=2, flush_seconds=3600)) as writer:
+        for row in _rows(3):
+            writer.write(row)
+        # The first two rows are on disk before the writer closes.
+        assert [json.loads(line)["id"] for line in out.read_text().splitlines()] == ["m0", "m1"]
+    assert len(out.read_text().splitlines()) == 3
+
+
+def test_appending_resumes_csv_and_ndjson(tmp_path) -> None:
+    out_csv = tmp_path / "out.csv"
+    assert append_rows(_rows(2), out_csv, "csv") == 2
+    append_rows(_rows(1), out_csv, "csv")
+    with out_csv.open(encoding="utf-8", newline="") as f:
+        assert [r["id"] for r in csv.DictReader(f)] == ["m0", "m1", "m0"]
+
+    out_nd = tmp_path / "out.ndjson"
+    append_rows(_rows(1), out_nd, "ndjson")
+    append_rows(_rows(2), out_nd, "ndjson")
+    assert len(out_nd.read_text().splitlines()) == 3
+
+
+def test_rejects_unknown_format_and_json_append(tmp_path) -> None:
+    with pytest.raises(ValueError, match="fmt"):
+        RowWriter(tmp_path / "out.xml", "xml")
+    with pytest.raises(ValueError, match="append"):
+        RowWriter(tmp_path / "out.json", "json", append=True)
+
+
+def test_compression_is_picked_from_extension_or_option(tmp_path) -> None:
+    assert compression_for(tmp_path / "a.csv.gz") == "gzip"
+    assert compression_for(tmp_path / "a.ndjson.XZ") == "xz"
+    assert compression_for(tmp_path / "a.csv") is None
+    assert compression_for(tmp_path / "a.csv", "bz2") == "bz2"
+    assert compression_for(tmp_path / "a.csv.gz", "none") is None
+    with pytest.raises(ValueError, match="compress"):
+        compression_for(tmp_path / "a.csv", "zip")
+
+
+@pytest.mark.parametrize(
+    ("name", "opener"),
+    [("out.csv.gz", gzip.open), ("out.csv.bz2", bz2.open), ("out.csv.xz", lzma.open)],
+)
+def test_compressed_csv_appends_stream_by_stream(tmp_path, name, opener) -> None:
+    out = tmp_path / name
+    append_rows(_rows(2), out, "csv", compress_level=1)
+    append_rows(_rows(1), out, "csv")
+
+    with opener(out, "rt", encoding="utf-8", newline="") as f:
+        assert [r["id"] for r in csv.DictReader(f)] == ["m0", "m1", "m0"]
+
+
+def test_compressed_rows_are_readable_before_close(tmp_path) -> None:
+    out = tmp_path / "out.ndjson.gz"
+    with RowWriter(out, "ndjson", defaults=ExportDefaults(flush_rows=1, flush_seconds=3600)) as writer:
+        writer.write(_rows(1)[0])
+        with out.open("rb") as raw:
+            assert json.loads(gzip.GzipFile(fileobj=raw).readline())["id"] == "m0"
+
+
+def test_rejects_out_of_range_level(tmp_path) -> None:
+    with pytest.raises(ValueError, match="1-9"):
+        stream_rows(_rows(1), tmp_path / "out.csv.gz", "csv", compress_level=10)
+
+
+def test_export_resumes_after_a_batch_fails_mid_chunk(tmp_path, monkeypatch, fake_gmail, gmail_message) -> None:
+    monkeypatch.setenv("APPDATA", str(tmp_path))
+    ids = [f"m{i:03d}" for i in range(450)]
+    # --workers 2 fetches chunks of two batches; m350's batch is the second
+    # half of the second chunk, so its first half is already fetched.
+    service = fake_gmail(
+        {mid: gmail_message(mid) for mid in ids},
+        failures={"m350": [HttpError(httplib2.Response({"status": 400}), b"")]},
+    )
+    monkeypatch.setattr(gmail, "get_service_pool", lambda: gmail.ServicePool(service))
+    out = tmp_path / "export.csv.gz"
+    args = ["export", "--from", "a@example.com", "--out", str(out), "--limit", "0", "--workers", "2"]
+
+    first = CliRunner().invoke(app, args)
+    assert isinstance(first.exception, HttpError)
+    # A crash after appending but before the checkpoint was saved.
+    with out.open("ab") as f:
+        f.write(b"\x1f\x8b torn")
+
+    resumed = CliRunner().invoke(app, [*args, "--resume"])
+
+    assert resumed.exit_code == 0, resumed.output
+    with gzip.open(out, "rt", encoding="utf-8", newline="") as f:
+        assert [r["subject"] for r in csv.DictReader(f)] == ids
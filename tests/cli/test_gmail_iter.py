@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from gmail_cleanup.gmail_iter import LIST_FIELDS, iter_message_id_pages
+
+
+@pytest.fixture
+def mailbox(fake_gmail, gmail_message):
+    """
+    A service listing `n` messages; with fail_on_call, that list call raises.
+    """
+
+    def _make(n: int, fail_on_call: int = 0):
+        service = fake_gmail({f"m{i}": gmail_message(f"m{i}") for i in range(n)})
+        if fail_on_call:
+            service.list_error = lambda _kwargs: (
+                RuntimeError("list failed") if service.count("messages.list") == fail_on_call else None
+            )
+        return service
+
+    return _make
+
+
+def _prefetch_threads() -> list[threading.Thread]:
+    return [t for t in threading.enumerate() if t.name == "gmail-list-prefetch"]
+
+
+def test_prefetch_yields_same_pages_as_sequential(mailbox) -> None:
+    sequential = list(iter_message_id_pages(mailbox(23), "q", page_size=5))
+    prefetched = list(iter_message_id_pages(mailbox(23), "q", page_size=5, prefetch=2))
+
+    assert prefetched == sequential
+    assert sum(len(p) for p in prefetched) == 23
+    service = mailbox(3)
+    list(iter_message_id_pages(service, "q"))
+    assert all(kwargs["fields"] == LIST_FIELDS for _method, kwargs in service.calls)
+
+
+def test_prefetch_respects_limit(mailbox) -> None:
+    pages = list(iter_message_id_pages(mailbox(23), "q", page_size=5, limit=12, prefetch=2))
+
+    assert [len(p) for p in pages] == [5, 5, 2]
+
+
+def test_prefetch_reraises_producer_errors(mailbox) -> None:
+    service = mailbox(23, fail_on_call=3)
+    collected = []
+
+    with pytest.raises(RuntimeError, match="list failed"):
+        for page in iter_message_id_pages(service, "q", page_size=5, prefetch=2):
+            collected.append(page)
+
+    assert len(collected) == 2
+    assert _prefetch_threads() == []
+
+
+def test_prefetch_stops_producer_on_early_break(mailbox) -> None:
+    service = mailbox(1000)
+
+    for _page in iter_message_id_pages(service, "q", page_size=5, prefetch=2):
+        break
+
+    assert _prefetch_threads() == []
+    # One page consumed, at most `prefetch` buffered plus one in flight.
+    assert service.count("messages.list") <= 4
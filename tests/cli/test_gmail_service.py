@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+import socket
+
+import httplib2
+import pytest
+from google.auth.credentials import AnonymousCredentials
+
+from gmail_cleanup import gmail
+from gmail_cleanup.gmail_iter import iter_pages
+from gmail_cleanup.labels import LabelRegistry
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("APPDATA", str(tmp_path))
+    d = tmp_path / "gmail-cleanup"
+    d.mkdir()
+    (d / "credentials.json").write_text("{}", encoding="utf-8")
+    (d / "token.json").write_text(
+        json.dumps(
+            {
+                "token": "access",
+                "expiry": "2099-01-01T00:00:00Z",
+                "refresh_token": "refresh",
+                "client_id": "cid",
+                "client_secret": "secret",
+                "scopes": gmail.SCOPES,
+            }
+        ),
+        encoding="utf-8",
+    )
+    gmail.reset_gmail_services()
+    yield d
+    gmail.reset_gmail_services()
+
+
+def _no_network(*args, **kwargs):
+    raise AssertionError("network access while building the Gmail service")
+
+
+def test_service_is_built_offline_and_reused(app_dir, monkeypatch) -> None:
+    monkeypatch.setattr(socket, "create_connection", _no_network)
+    monkeypatch.setattr(socket.socket, "connect", _no_network)
+
+    service = gmail.get_gmail_service()
+
+    assert gmail.get_gmail_service() is service
+    request = service.users().messages().list(userId="me", q="in:inbox")
+    assert request.uri.startswith("https://gmail.googleapis.com/gmail/v1/users/me/messages")
+
+
+def test_reset_forgets_cached_services(app_dir) -> None:
+    service = gmail.get_gmail_service()
+    gmail.reset_gmail_services()
+    assert gmail.get_gmail_service() is not service
+
+
+class _RecordingHttp:
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.calls: list[tuple[str, dict]] = []
+
+    def request(self, uri, method="GET", body=None, headers=None, **_kwargs):
+        self.calls.append((uri, dict(headers or {})))
+        return httplib2.Response({"status": "200"}), self.body
+
+
+def test_calls_ask_for_partial_gzip_responses() -> None:
+    service = gmail.build_gmail_service(AnonymousCredentials())
+
+    labels_http = _RecordingHttp(b'{"labels": [{"id": "L1", "name": "a", "type": "user"}]}')
+    LabelRegistry().labels(service, http=labels_http)
+    list_http = _RecordingHttp(b'{"messages": [{"id": "m1"}]}')
+    list(iter_pages(service, "from:a@example.com", http=list_http))
+
+    (labels_uri, _), (list_uri, _) = labels_http.calls[0], list_http.calls[0]
+    assert "fields=labels%28id%2Cname%2Ctype%29" in labels_uri
+    assert "fields=messages%2Fid%2CnextPageToken%2CresultSizeEstimate" in list_uri
+    for _uri, headers in [*labels_http.calls, *list_http.calls]:
+        assert "gzip" in headers["accept-encoding"]
+        assert "(gzip)" in headers["user-agent"]
+
+
+def test_worker_transports_keep_the_socket_timeout() -> None:
+    service = gmail.build_gmail_service(AnonymousCredentials())
+
+    http = gmail.new_http_for(service)
+
+    assert http.credentials is service._http.credentials
+    assert http.http.timeout == service._http.http.timeout
+    assert http.http.timeout is not None
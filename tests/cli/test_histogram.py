@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+
+from gmail_cleanup.histogram import count_histogram, initial_edges
+from gmail_cleanup.query_builder import QueryOptions
+
+
+@pytest.fixture
+def sized(fake_gmail, gmail_message):
+    """
+    A service whose estimates apply larger:/smaller: to these message sizes.
+    """
+    return lambda sizes: fake_gmail({f"m{i}": gmail_message(f"m{i}", size=n) for i, n in enumerate(sizes)})
+
+
+def test_size_buckets_partition_the_matches(sized) -> None:
+    sizes = [500, 20_000, 20_000, 2_000_000, 30_000_000]
+    service = sized(sizes)
+
+    result = count_histogram(service, QueryOptions(q="in:anywhere"), by="size", split_share=1.0)
+
+    assert result.total == len(sizes)
+    assert result.calls == len(initial_edges("size"))
+    assert [b.estimate for b in result.buckets] == [1, 2, 0, 1, 0, 0, 1]
+    assert result.buckets[1].query == "in:anywhere larger:10239 smaller:102400"
+    assert result.buckets[-1].query == "in:anywhere larger:26214399"
+    assert all(name.startswith("gmail-histogram") for name in service.threads)
+    assert {(kw["maxResults"], kw["fields"]) for _method, kw in service.calls} == {(1, "resultSizeEstimate")}
+
+
+def test_heavy_buckets_are_bisected_within_the_call_budget(sized) -> None:
+    sizes = [30_000 + i for i in range(90)] + [1_500_000] * 10
+    service = sized(sizes)
+
+    result = count_histogram(service, QueryOptions(q="in:anywhere"), by="size", max_calls=20, workers=4)
+
+    assert result.calls <= 20
+    assert result.total == len(sizes)
+    # The 10 KB - 100 KB bucket held 90% of the matches, so it was split further.
+    inside = [b for b in result.buckets[1:-1] if 10 * 1024 <= b.lo and b.hi <= 100 * 1024]
+    assert len(inside) > 1
+    assert sum(b.estimate for b in inside) == 90
+    edges = [(b.lo, b.hi) for b in result.buckets]
+    assert all(prev[1] == cur[0] for prev, cur in zip(edges, edges[1:]))
+
+
+def test_date_buckets_use_after_and_before(sized) -> None:
+    ranges = initial_edges("date", since_year=2023, today=date(2024, 6, 1))
+    assert [r[0] is None for r in ranges] == [True, False, False, False]
+
+    service = sized([])
+    result = count_histogram(
+        service, QueryOptions(from_="a@x.com"), by="date", since_year=2023, today=date(2024, 6, 1)
+    )
+    assert [b.query for b in result.buckets] == [
+        "from:a@x.com before:2023/01/01",
+        "from:a@x.com after:2023/01/01 before:2024/01/01",
+        "from:a@x.com after:2024/01/01 before:2025/01/01",
+        "from:a@x.com after:2025/01/01",
+    ]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from gmail_cleanup.labels import LabelRegistry
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_resolves_many_names_with_one_list_call(fake_gmail) -> None:
+    service = fake_gmail(labels=[{"id": "L1", "name": "cleanup/a"}, {"id": "L2", "name": "cleanup/b"}])
+    registry = LabelRegistry()
+
+    assert registry.resolve(service, ["cleanup/a", "cleanup/b"]) == {"cleanup/a": "L1", "cleanup/b": "L2"}
+    assert registry.resolve(service, ["cleanup/b"]) == {"cleanup/b": "L2"}
+    assert service.methods() == ["labels.list"]
+
+
+def test_missing_labels_are_created_in_one_batch(fake_gmail) -> None:
+    service = fake_gmail()
+    registry = LabelRegistry()
+
+    ids = registry.ensure(service, ["cleanup/a", "cleanup/b", "INBOX"])
+
+    assert ids["INBOX"] == "INBOX"
+    assert ids["cleanup/a"] and ids["cleanup/b"]
+    assert service.batches == [["cleanup/a", "cleanup/b"]]
+    # Created labels are written through: no further list calls.
+    assert registry.ensure(service, ["cleanup/a"]) == {"cleanup/a": ids["cleanup/a"]}
+    assert service.count("labels.list") == 1
+
+
+def test_disk_cache_is_shared_until_ttl_expires(tmp_path, fake_gmail) -> None:
+    service = fake_gmail(labels=[{"id": "L1", "name": "cleanup/a"}])
+    clock = _Clock()
+    path = tmp_path / "labels.json"
+
+    LabelRegistry(path=path, ttl=60, clock=clock).resolve(service, ["cleanup/a"])
+    LabelRegistry(path=path, ttl=60, clock=clock).resolve(service, ["cleanup/a"])
+    assert service.methods() == ["labels.list"]
+
+    clock.now += 61
+    LabelRegistry(path=path, ttl=60, clock=clock).resolve(service, ["cleanup/a"])
+    assert service.methods() == ["labels.list", "labels.list"]
+
+
+def test_cached_miss_reloads_before_creating(tmp_path, fake_gmail) -> None:
+    service = fake_gmail()
+    registry = LabelRegistry(path=tmp_path / "labels.json")
+    registry.labels(service)
+
+    # Created elsewhere (e.g. Gmail web) after the list was cached.
+    service.labels_store.append({"id": "L9", "name": "cleanup/new"})
+
+    assert registry.ensure(service, ["cleanup/new"]) == {"cleanup/new": "L9"}
+    assert service.batches == []
+
+
+def test_delete_invalidates_cache(tmp_path, fake_gmail) -> None:
+    service = fake_gmail(labels=[{"id": "L1", "name": "cleanup/a"}])
+    path = tmp_path / "labels.json"
+    registry = LabelRegistry(path=path)
+
+    assert registry.delete(service, "cleanup/a") is True
+    assert not path.exists()
+    assert registry.resolve(service, ["cleanup/a"]) == {"cleanup/a": None}
+    assert registry.delete(service, "cleanup/a") is False
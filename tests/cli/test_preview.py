@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from gmail_cleanup.preview import BackgroundCount, count_messages, estimate_messages
+
+
+@pytest.fixture
+def mailbox(fake_gmail, gmail_message):
+    def _make(total: int, estimate: int, error: Exception | None = None):
+        mail = {f"m{i}": gmail_message(f"m{i}") for i in range(total)}
+        return fake_gmail(mail, estimate=estimate, list_error=error)
+
+    return _make
+
+
+def test_estimate_uses_a_single_list_call(mailbox) -> None:
+    service = mailbox(total=1200, estimate=1300)
+
+    assert estimate_messages(service, "from:x") == 1300
+    assert len(service.calls) == 1
+    assert service.calls[0][1]["maxResults"] == 1
+
+
+def test_count_messages_is_exact(mailbox) -> None:
+    service = mailbox(total=1200, estimate=1300)
+
+    assert count_messages(service, "from:x") == 1200
+    assert len(service.calls) == 3
+
+
+def test_background_count_returns_exact_total(mailbox) -> None:
+    counter = BackgroundCount(mailbox(total=1001, estimate=900), "from:x")
+
+    assert counter.result(timeout=5) == 1001
+    assert counter.done
+
+
+def test_background_count_reraises_errors(mailbox) -> None:
+    error = HttpError(httplib2.Response({"status": 500}), b"")
+    counter = BackgroundCount(mailbox(total=1, estimate=1, error=error), "from:x")
+
+    with pytest.raises(HttpError):
+        counter.result(timeout=5)
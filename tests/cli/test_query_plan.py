@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import pytest
+
+from gmail_cleanup.gmail_iter import iter_message_ids
+from gmail_cleanup.preview import count_messages, estimate_messages
+from gmail_cleanup.query_plan import normalize_label_name, plan_query
+
+
+@pytest.fixture
+def service(fake_gmail, gmail_message):
+    labels = [
+        {"id": "Label_1", "name": "cleanup/candidates", "type": "user"},
+        {"id": "Label_2", "name": "Receipts 2023", "type": "user"},
+    ]
+    mail = {mid: gmail_message(mid, labels=["INBOX", "Label_1"]) for mid in ("m1", "m2")}
+    return fake_gmail(mail, labels=labels)
+
+
+def test_system_label_queries_are_planned_without_api_calls(service) -> None:
+    plan = plan_query(service, "in:inbox is:unread category:promotions")
+
+    assert plan.label_ids == ("INBOX", "UNREAD", "CATEGORY_PROMOTIONS")
+    assert not plan.include_spam_trash
+    assert not plan.countable
+    assert service.calls == []
+    assert plan_query(service, "in:trash").include_spam_trash
+
+
+def test_user_labels_resolve_by_normalized_name(service) -> None:
+    assert plan_query(service, "label:cleanup/candidates").label_ids == ("Label_1",)
+    assert plan_query(service, "label:cleanup-candidates").label_ids == ("Label_1",)
+    assert plan_query(service, 'label:"receipts 2023"').label_ids == ("Label_2",)
+    assert normalize_label_name("Receipts 2023") == "receipts-2023"
+
+
+def test_search_terms_and_unknown_labels_fall_back_to_q(service) -> None:
+    assert plan_query(service, "label:cleanup/candidates from:a@example.com") is None
+    assert plan_query(service, "-label:cleanup/candidates") is None
+    assert plan_query(service, "is:read") is None
+    assert plan_query(service, "label:nope") is None
+    assert plan_query(service, "") is None
+
+
+def test_label_queries_list_by_label_ids(service) -> None:
+    assert list(iter_message_ids(service, "label:cleanup/candidates")) == ["m1", "m2"]
+
+    _name, kwargs = service.calls[-1]
+    assert kwargs["labelIds"] == ["Label_1"]
+    assert kwargs["includeSpamTrash"] is False
+    assert "q" not in kwargs
+
+
+def test_label_counts_skip_trashed_messages(service, gmail_message) -> None:
+    # Trashing keeps user labels: labels.get's messagesTotal still counts these.
+    for i in range(5):
+        service.mailbox[f"t{i}"] = gmail_message(f"t{i}", labels=["Label_1", "TRASH"])
+
+    assert count_messages(service, "label:cleanup/candidates") == 2
+    assert "labels.get" not in service.methods()
+    _name, kwargs = service.calls[-1]
+    assert kwargs["labelIds"] == ["Label_1"] and "q" not in kwargs
+
+    # The estimate is a single labels.get call and may overstate.
+    service.calls.clear()
+    assert estimate_messages(service, "label:cleanup/candidates") == 7
+    assert service.methods() == ["labels.list", "labels.get"]
+
+
+def test_trash_count_is_one_labels_get_call(service, gmail_message) -> None:
+    service.mailbox["t1"] = gmail_message("t1", labels=["Label_1", "TRASH"])
+
+    assert count_messages(service, "in:trash") == 1
+    assert service.methods() == ["labels.get"]
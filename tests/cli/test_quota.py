@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import threading
+
+from googleapiclient.http import HttpMockSequence
+
+from gmail_cleanup.quota import (
+    QuotaScheduler,
+    TokenBucket,
+    method_cost,
+    reserve_batch,
+    scheduler_for_account,
+)
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_method_costs_follow_gmail_quota_table() -> None:
+    assert method_cost("gmail.users.messages.list") == 5
+    assert method_cost("gmail.users.messages.get") == 5
+    assert method_cost("gmail.users.messages.batchModify") == 50
+    assert method_cost("gmail.users.labels.list") == 1
+    assert method_cost("gmail.users.somethingNew") == 5
+
+
+def test_reserve_returns_wait_without_sleeping() -> None:
+    clock = _FakeClock()
+    bucket = TokenBucket(rate=100, capacity=100, clock=clock, sleep=clock.sleep)
+
+    assert bucket.reserve(100) == 0.0
+    assert bucket.reserve(50) == 0.5
+    assert clock.sleeps == []
+
+
+def test_bucket_allows_burst_then_paces_at_rate() -> None:
+    clock = _FakeClock()
+    bucket = TokenBucket(rate=100, capacity=100, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire(100) == 0
+    assert bucket.acquire(50) == 0.5
+    clock.now += 1.0
+    assert bucket.acquire(50) == 0.0
+    assert clock.sleeps == [0.5]
+
+
+def test_concurrent_workers_share_one_budget() -> None:
+    lock = threading.Lock()
+    bucket = TokenBucket(rate=50, capacity=50, clock=lambda: 0.0, sleep=lambda s: None)
+    waits: list[float] = []
+
+    def _worker() -> None:
+        w = bucket.acquire(50)
+        with lock:
+            waits.append(w)
+
+    threads = [threading.Thread(target=_worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # With the clock frozen, each worker queues one second behind the previous one.
+    assert sorted(waits) == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_requests_built_by_scheduler_are_charged_on_execute() -> None:
+    scheduler = QuotaScheduler(units_per_second=1000)
+    http = HttpMockSequence([({"status": "200"}, b"{}")])
+
+    request = scheduler.request_builder(
+        http,
+        lambda _resp, content: content,
+        "https://gmail.googleapis.com/gmail/v1/users/me/messages",
+        methodId="gmail.users.messages.batchModify",
+    )
+    request.execute()
+
+    assert scheduler.bucket._tokens <= 950
+
+
+def test_reserve_batch_charges_sub_requests() -> None:
+    scheduler = QuotaScheduler(units_per_second=1000)
+    requests = [
+        scheduler.request_builder(None, None, "uri", methodId="gmail.users.messages.get")
+        for _ in range(100)
+    ]
+
+    reserve_batch(requests + [object()])
+
+    assert scheduler.bucket._tokens <= 500
+
+
+def test_scheduler_for_account_is_shared_per_account() -> None:
+    a = scheduler_for_account("test-account-a")
+    assert scheduler_for_account("test-account-a") is a
+    assert scheduler_for_account("test-account-b") is not a
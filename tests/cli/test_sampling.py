@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import random
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+
+from gmail_cleanup.query_builder import QueryOptions
+from gmail_cleanup.sampling import Reservoir, SampleEstimator, Stratum, allocate, sample_sender_stats
+
+
+@pytest.fixture
+def mailbox(fake_gmail, gmail_message):
+    # 2020: 1000 small newsletter mails; 2023-2024: 200 large mails from a friend.
+    mail = [
+        gmail_message(f"n{i}", day=date(2020, 1, 1) + timedelta(days=i % 300), sender="news@letters.com", size=10_000)
+        for i in range(1000)
+    ] + [
+        gmail_message(
+            f"f{i}", day=date(2023, 6, 1) + timedelta(days=i * 2), sender="Friend <friend@example.org>", size=1_000_000
+        )
+        for i in range(200)
+    ]
+    # Listed newest first, like Gmail.
+    mail.sort(key=lambda msg: int(msg["internalDate"]), reverse=True)
+    return fake_gmail({msg["id"]: msg for msg in mail})
+
+
+def test_reservoir_is_uniform() -> None:
+    rng = random.Random(1)
+    hits: Counter = Counter()
+    for _ in range(2000):
+        hits.update(Reservoir(5, rng).extend(str(i) for i in range(20)).items)
+
+    assert sum(hits.values()) == 10_000
+    assert all(400 <= hits[str(i)] <= 600 for i in range(20))
+
+
+def test_allocate_is_proportional_with_one_per_nonempty_stratum() -> None:
+    assert allocate([900, 100, 0, 3], 100) == [90, 10, 0, 1]
+    assert allocate([2, 5], 100) == [2, 5]
+
+
+def test_full_census_has_exact_shares_and_no_error() -> None:
+    strata = [Stratum("q", 3, ["a", "b", "c"])]
+    estimator = SampleEstimator(strata).add_messages(
+        [
+            {"id": "a", "sizeEstimate": 100, "payload": {"headers": [{"name": "From", "value": "x@a.com"}]}},
+            {"id": "b", "sizeEstimate": 300, "payload": {"headers": [{"name": "From", "value": "X <x@a.com>"}]}},
+            {"id": "c", "sizeEstimate": 600, "payload": {"headers": [{"name": "From", "value": "y@b.com"}]}},
+        ]
+    )
+
+    top = estimator.top(2)
+    assert [(row.key, row.sampled) for row in top] == [("x@a.com", 2), ("y@b.com", 1)]
+    assert top[0].messages.low == top[0].messages.high == pytest.approx(2 / 3)
+    assert top[0].bytes.estimate == pytest.approx(0.4)
+    assert estimator.total_bytes().estimate == pytest.approx(1000)
+
+
+@pytest.mark.parametrize("mode", ["uniform", "stratified"])
+def test_sample_estimates_cover_the_true_shares(mailbox, mode: str) -> None:
+    estimate = sample_sender_stats(mailbox, QueryOptions(q="in:anywhere"), size=120, mode=mode, seed=3)
+
+    assert len(mailbox.fetched) == estimate.sampled <= 121
+    assert estimate.population == 1200
+    shares = {row.key: row for row in estimate.top(5)}
+    friend = shares["friend@example.org"]
+    assert friend.messages.low <= 200 / 1200 <= friend.messages.high
+    assert friend.bytes.low <= 200_000_000 / 210_000_000 <= friend.bytes.high
+    total = estimate.total_bytes()
+    assert total.low <= 210_000_000 <= total.high
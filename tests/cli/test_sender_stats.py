@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import random
+from collections import Counter
+
+from gmail_cleanup.sender_stats import SenderStats, SpaceSaving, normalize_address, registrable_domain
+
+
+def test_addresses_are_normalized_and_rolled_up() -> None:
+    stats = SenderStats()
+    headers = ["Foo <A@News.Example.com>", "a@news.example.com", '"Bar" <b@mail.example.co.uk>', "garbage"]
+    for header in headers:
+        stats.add(header)
+
+    assert stats.top(by="address")[0].key == "a@news.example.com"
+    assert stats.top(by="address")[0].count == 2
+    assert {h.key: h.count for h in stats.top(by="domain")} == {"news.example.com": 2, "mail.example.co.uk": 1}
+    assert {h.key for h in stats.top(by="registrable")} == {"example.com", "example.co.uk"}
+    assert normalize_address("garbage") == "garbage"
+    assert registrable_domain("example.com") == "example.com"
+
+
+def test_dates_are_tracked_with_running_min_max() -> None:
+    stats = SenderStats()
+    stats.add("a@x.com", "Mon, 01 Jan 2024 10:00:00 +0000")
+    stats.add("a@x.com", "not a date")
+    stats.add("a@x.com", "Tue, 02 Jan 2024 10:00:00 -0000")  # naive, treated as UTC
+    stats.add("a@x.com", "Sun, 31 Dec 2023 23:00:00 +0100")
+
+    assert stats.oldest.isoformat() == "2023-12-31T23:00:00+01:00"
+    assert stats.newest.isoformat() == "2024-01-02T10:00:00+00:00"
+    assert stats.scanned == 4
+
+
+def test_space_saving_is_exact_under_capacity() -> None:
+    sketch = SpaceSaving(capacity=10)
+    for key in "aabbbc":
+        sketch.add(key)
+    assert [(h.key, h.count, h.error) for h in sketch.top()] == [("b", 3, 0), ("a", 2, 0), ("c", 1, 0)]
+
+
+def test_space_saving_keeps_heavy_hitters_within_error_bound() -> None:
+    rng = random.Random(7)
+    stream = ["heavy-1"] * 3000 + ["heavy-2"] * 2000 + [f"noise-{rng.randrange(20000)}" for _ in range(15000)]
+    rng.shuffle(stream)
+
+    sketch = SpaceSaving.for_error(0.01)  # 100 counters
+    for key in stream:
+        sketch.add(key)
+    exact = Counter(stream)
+
+    assert len(sketch) == 100
+    assert [h.key for h in sketch.top(2)] == ["heavy-1", "heavy-2"]
+    for hit in sketch.top():
+        assert hit.guaranteed <= exact[hit.key] <= hit.count
+        assert hit.count - exact[hit.key] <= len(stream) * 0.01
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.auth.credentials import AnonymousCredentials
+
+from gmail_cleanup import exporter, gmail
+from gmail_cleanup.gmail import ServicePool, SharedCredentials, build_gmail_service
+
+
+class _ExpiringCredentials:
+    def __init__(self) -> None:
+        self.token = "old"
+        self.valid = False
+        self.refresh_calls = 0
+
+    def refresh(self, _request) -> None:
+        self.refresh_calls += 1
+        time.sleep(0.05)
+        self.token = f"new-{self.refresh_calls}"
+        self.valid = True
+
+    def before_request(self, _request, _method, _url, headers) -> None:
+        headers["authorization"] = f"Bearer {self.token}"
+
+
+def test_threads_share_a_single_token_refresh() -> None:
+    creds = _ExpiringCredentials()
+    shared = SharedCredentials(creds)
+    barrier = threading.Barrier(8)
+    sent: list[str] = []
+
+    def _request() -> None:
+        headers: dict[str, str] = {}
+        barrier.wait()
+        shared.before_request(None, "GET", "https://example.invalid", headers)
+        sent.append(headers["authorization"])
+
+    threads = [threading.Thread(target=_request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert creds.refresh_calls == 1 and shared.refreshes == 1
+    assert sent == ["Bearer new-1"] * 8
+
+
+def test_a_rejected_token_is_refreshed_again() -> None:
+    creds = _ExpiringCredentials()
+    shared = SharedCredentials(creds)
+
+    shared.before_request(None, "GET", "https://example.invalid", {})
+    # A 401 on the token this thread just sent forces a refresh even though
+    # the credentials still look valid.
+    shared.refresh(None)
+
+    assert creds.refresh_calls == 2
+    assert shared.token == "new-2"
+
+
+def test_each_thread_gets_its_own_service_and_transport() -> None:
+    primary = build_gmail_service(AnonymousCredentials())
+    pool = ServicePool(primary)
+    seen = {}
+
+    def _grab(name: str) -> None:
+        seen[name] = (pool.service(), pool.service())
+
+    threads = [threading.Thread(target=_grab, args=(str(i),)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert pool.service() is primary
+    services = [first for first, again in seen.values() if first is again]
+    assert len({id(s) for s in [primary, *services]}) == 4
+    assert len({id(s._http.http) for s in [primary, *services]}) == 4
+    assert all(s._http.credentials is pool.credentials for s in services)
+
+
+def test_imap_keeps_input_order() -> None:
+    pool = ServicePool(object())
+
+    def _slow(_svc, n: int) -> int:
+        time.sleep(0.01 * (10 - n))
+        return n * n
+
+    assert list(pool.imap(_slow, range(10), workers=4)) == [n * n for n in range(10)]
+
+
+def test_chunked_export_fetches_reuse_threads_and_services(monkeypatch) -> None:
+    built = []
+
+    def _build(creds, request_builder=None):
+        built.append(threading.current_thread().name)
+        return object()
+
+    monkeypatch.setattr(gmail, "build_gmail_service", _build)
+    monkeypatch.setattr(
+        exporter, "iter_metadata", lambda _svc, ids, **_kwargs: ({"id": mid, "payload": {"headers": []}} for mid in ids)
+    )
+    pool = ServicePool(build_gmail_service(AnonymousCredentials()))
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="test-export") as executor:
+        for chunk in range(3):
+            ids = [f"m{chunk}-{i}" for i in range(250)]
+            rows = exporter.fetch_message_rows(pool.primary, ids, workers=2, pool=pool, executor=executor)
+            assert [row["id"] for row in rows] == ids
+
+    assert len(built) == len(set(built)) <= 2
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from gmail_cleanup.sharded_iter import iter_sharded_pages, plan_windows
+
+
+@pytest.fixture
+def dated(fake_gmail, gmail_message):
+    """
+    One message per day from 2019-01-01, listed newest first. With fail,
+    listing any query containing "fail" raises.
+    """
+
+    def _make(n: int, fail: bool = False):
+        mail = {
+            f"m{i}": gmail_message(f"m{i}", day=date(2019, 1, 1) + timedelta(days=i))
+            for i in reversed(range(n))
+        }
+        error = (lambda kw: RuntimeError("list failed") if "fail" in kw["q"] else None) if fail else None
+        return fake_gmail(mail, list_error=error)
+
+    return _make
+
+
+def _shard_threads() -> list[threading.Thread]:
+    return [t for t in threading.enumerate() if t.name.startswith("gmail-list-shard")]
+
+
+def test_windows_are_sized_from_estimates_and_cover_everything(dated) -> None:
+    service = dated(1000)
+    windows = plan_windows(service, "in:anywhere", shard_size=100, today=date(2021, 12, 31))
+
+    assert all(len(service.matching(w)) <= 100 for w in windows)
+    assert sum(len(service.matching(w)) for w in windows) == 1000
+
+    pages = list(iter_sharded_pages(service, "in:anywhere", windows=windows, workers=4, page_size=50))
+    ids = [mid for page in pages for mid in page]
+    assert sorted(ids) == sorted(service.mailbox)
+    assert any(name.startswith("gmail-list-shard") for name in service.threads)
+
+
+def test_overlapping_windows_are_deduplicated_and_limited(dated) -> None:
+    service = dated(300)
+    windows = ["after:2019/01/01", "after:2019/06/01", "before:2019/03/01"]
+
+    ids = [mid for page in iter_sharded_pages(service, "", windows=windows, workers=3) for mid in page]
+    assert sorted(ids) == sorted(service.mailbox)
+
+    limited = [
+        mid for page in iter_sharded_pages(service, "", windows=windows, workers=3, page_size=10, limit=25)
+        for mid in page
+    ]
+    assert len(limited) == len(set(limited)) == 25
+    assert _shard_threads() == []
+
+
+def test_worker_errors_reach_the_consumer(dated) -> None:
+    service = dated(50, fail=True)
+
+    with pytest.raises(RuntimeError, match="list failed"):
+        list(iter_sharded_pages(service, "", windows=["after:2019/01/01", "fail"], workers=2))
+    assert _shard_threads() == []
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Import-time budget (ms, summed over every module imported) for commands that
+# must not load the Gmail client stack. typer + rich alone are ~250 ms on a dev
+# laptop; the Google client libraries roughly double that.
+IMPORT_BUDGET_MS = float(os.environ.get("GMAIL_CLEANUP_IMPORT_BUDGET_MS", 1000))
+HEAVY_MODULES = ("googleapiclient", "google.auth", "google_auth_oauthlib", "httplib2", "yaml", "sqlite3")
+
+COMMANDS = [
+    ["--help"],
+    ["doctor"],
+    ["config"],
+    *([cmd, "--help"] for cmd in ["query", "label", "export", "trash", "label-clear", "stats", "storage", "histogram", "sync"]),
+]
+
+
+def _importtime(args: list[str], app_dir) -> tuple[float, set[str]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from gmail_cleanup.cli import app; app()", *args],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "APPDATA": str(app_dir), "HOME": str(app_dir)},
+        timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+
+    total_us = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        modules.add(name.strip())
+    return total_us / 1000, modules
+
+
+@pytest.mark.parametrize("args", COMMANDS, ids=" ".join)
+def test_command_startup_stays_light(args, tmp_path) -> None:
+    elapsed_ms, modules = _importtime(args, tmp_path)
+
+    heavy = sorted(m for m in modules if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES))
+    assert not heavy, f"{' '.join(args)} imported {heavy}"
+    assert elapsed_ms < IMPORT_BUDGET_MS, f"{' '.join(args)} spent {elapsed_ms:.0f} ms importing"
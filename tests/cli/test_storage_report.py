@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from gmail_cleanup.query_builder import QueryOptions, narrow
+from gmail_cleanup.storage_report import StorageReport, label_filter
+
+_NOW = 1_700_000_000.0
+_DAY_MS = 86_400_000
+
+
+def _msg(sender: str, size: int, labels: list[str], age_days: int) -> dict:
+    return {
+        "id": f"{sender}-{size}",
+        "labelIds": labels,
+        "internalDate": str(int(_NOW * 1000) - age_days * _DAY_MS),
+        "sizeEstimate": size,
+        "payload": {"headers": [{"name": "From", "value": sender}]},
+    }
+
+
+def _report(base: QueryOptions | None = None) -> StorageReport:
+    report = StorageReport(base, label_names={"Label_1": "Receipts 2020"}, clock=lambda: _NOW)
+    return report.add_messages(
+        [
+            _msg("Shop <deals@mail.shop.com>", 5_000, ["CATEGORY_PROMOTIONS"], 10),
+            _msg("deals@mail.shop.com", 7_000, ["CATEGORY_PROMOTIONS", "Label_1"], 400),
+            _msg("friend@example.org", 9_000, ["INBOX"], 2000),
+            _msg("news@shop.com", 1_000, [], 100),
+        ]
+    )
+
+
+def test_bytes_are_summed_per_group_largest_first() -> None:
+    report = _report()
+
+    assert (report.messages, report.size_bytes) == (4, 22_000)
+    assert [(r.key, r.messages, r.size_bytes) for r in report.top("sender", 2)] == [
+        ("deals@mail.shop.com", 2, 12_000),
+        ("friend@example.org", 1, 9_000),
+    ]
+    assert [(r.key, r.size_bytes) for r in report.top("registrable")] == [
+        ("shop.com", 13_000),
+        ("example.org", 9_000),
+    ]
+    assert [(r.key, r.size_bytes) for r in report.top("label")] == [
+        ("CATEGORY_PROMOTIONS", 12_000),
+        ("INBOX", 9_000),
+        ("Receipts 2020", 7_000),
+    ]
+    assert [(r.key, r.messages) for r in report.top("age")] == [
+        ("< 30 days", 1),
+        ("30 days - 1 year", 1),
+        ("1 - 2 years", 1),
+        ("> 5 years", 1),
+    ]
+
+
+def test_rows_carry_a_query_for_their_group() -> None:
+    report = _report(QueryOptions(larger="1M", older_than="2y"))
+    queries = {r.key: r.query for group in ("sender", "label", "age") for r in report.top(group)}
+
+    assert queries["deals@mail.shop.com"] == "from:deals@mail.shop.com older_than:2y larger:1M"
+    assert queries["CATEGORY_PROMOTIONS"] == "category:promotions older_than:2y larger:1M"
+    assert queries["Receipts 2020"] == "label:receipts-2020 older_than:2y larger:1M"
+    # The age filter clashes with the base one, so both apply.
+    assert queries["1 - 2 years"] == "older_than:1y older_than:2y newer_than:2y larger:1M"
+
+
+def test_narrow_keeps_matching_filters_and_appends_conflicts() -> None:
+    base = QueryOptions(q="in:anywhere", from_="a@x.com")
+    assert narrow(base, from_="a@x.com") == base
+    assert narrow(base, from_="b@x.com").q == "in:anywhere from:b@x.com"
+    assert label_filter("INBOX", "INBOX") == {"label": "inbox"}
+
+
+def test_category_rows_use_gmail_search_operators() -> None:
+    assert label_filter("CATEGORY_PERSONAL", "CATEGORY_PERSONAL") == {"q": "category:primary"}
+    assert label_filter("CATEGORY_SOCIAL", "CATEGORY_SOCIAL") == {"q": "category:social"}
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import pytest
+
+from gmail_cleanup.volume import VolumeHistogram, VolumeStats, bucket_index, bucket_label
+
+
+def _ms(iso: str) -> int:
+    return int(datetime.fromisoformat(iso).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _msg(iso: str, size: int, sender: str = "a@x.com") -> dict:
+    return {
+        "id": iso,
+        "internalDate": str(_ms(iso)),
+        "sizeEstimate": size,
+        "payload": {"headers": [{"name": "From", "value": sender}]},
+    }
+
+
+@pytest.mark.parametrize(
+    ("iso", "expected"),
+    [
+        ("2024-02-29T23:59:59", ("2024-02-29", "2024-02-26", "2024-02", "2024")),
+        ("2025-01-05T00:00:00", ("2025-01-05", "2024-12-30", "2025-01", "2025")),
+        ("1969-12-31T12:00:00", ("1969-12-31", "1969-12-29", "1969-12", "1969")),
+    ],
+)
+def test_buckets_match_calendar(iso, expected) -> None:
+    labels = tuple(bucket_label(bucket_index(_ms(iso), g), g) for g in ("day", "week", "month", "year"))
+    assert labels == expected
+
+
+def test_histogram_grows_at_both_ends() -> None:
+    hist = VolumeHistogram("month")
+    hist.add(_ms("2024-03-10T00:00:00"), 10)
+    hist.add(_ms("2023-12-01T00:00:00"), 5)
+    hist.add(_ms("2024-03-20T00:00:00"), 1)
+
+    assert [(b.label, b.count, b.size_bytes) for b in hist.buckets()] == [
+        ("2023-12", 1, 5),
+        ("2024-03", 2, 11),
+    ]
+    assert len(list(hist.buckets(include_empty=True))) == 4
+    assert (hist.total, hist.total_bytes) == (3, 16)
+
+
+def test_volume_stats_per_sender_and_skips_missing_dates() -> None:
+    msgs = [
+        _msg("2020-05-01T00:00:00", 100, "News <n@news.example.com>"),
+        _msg("2020-06-01T00:00:00", 50, "n@news.example.com"),
+        _msg("2023-01-01T00:00:00", 7, "b@other.org"),
+        {"id": "broken", "payload": {"headers": []}},
+    ]
+    stats = VolumeStats("year", by="registrable").add_messages(msgs)
+
+    assert [(b.label, b.count, b.size_bytes) for b in stats.overall.buckets()] == [
+        ("2020", 2, 150),
+        ("2023", 1, 7),
+    ]
+    (sender, hist), _ = stats.top_senders(2)
+    assert sender == "example.com"
+    assert [(b.label, b.count) for b in hist.buckets()] == [("2020", 2)]
+    assert stats.skipped == 1
+    assert stats.oldest_ms == _ms("2020-05-01T00:00:00")
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from gmail_cleanup.write_batch import WriteBatcher, write_pages
+
+
+def test_coalesces_pages_into_full_chunks_and_flushes_remainder() -> None:
+    writes: list[list[str]] = []
+    pages = [[f"a{i}" for i in range(500)], [f"b{i}" for i in range(500)], [f"c{i}" for i in range(300)]]
+
+    done = write_pages(pages, writes.append)
+
+    assert done == 1300
+    assert [len(w) for w in writes] == [1000, 300]
+    assert writes[0][:2] == ["a0", "a1"] and writes[1][-1] == "c299"
+
+
+def test_reports_per_chunk_results() -> None:
+    reported = []
+
+    with WriteBatcher(lambda _ids: None, chunk_size=4, on_chunk=reported.append) as batcher:
+        batcher.add(["1", "2", "3"])
+        batcher.add(["4", "5", "6"])
+
+    assert [(r.index, r.size, r.done) for r in reported] == [(0, 4, 4), (1, 2, 6)]
+    assert batcher.results == reported
+
+
+def test_chunk_size_is_capped_at_batch_modify_limit() -> None:
+    writes: list[list[str]] = []
+
+    write_pages([[str(i) for i in range(2500)]], writes.append, chunk_size=5000)
+
+    assert [len(w) for w in writes] == [1000, 1000, 500]
+
+
+def test_pending_ids_are_not_flushed_when_the_block_raises() -> None:
+    writes: list[list[str]] = []
+
+    with pytest.raises(RuntimeError):
+        with WriteBatcher(writes.append, chunk_size=10) as batcher:
+            batcher.add(["1", "2"])
+            raise RuntimeError("listing failed")
+
+    assert writes == []
+
+
+def test_parallel_writes_are_recorded_in_order() -> None:
+    threads = set()
+    committed: list[list[str]] = []
+
+    def write(ids: list[str]) -> None:
+        threads.add(threading.current_thread().name)
+        # Later chunks finish first.
+        time.sleep(0.02 * (5 - int(ids[0]) // 2))
+
+    with WriteBatcher(write, chunk_size=2, workers=3, on_commit=committed.append) as batcher:
+        batcher.add([str(i) for i in range(10)])
+
+    assert committed == [[str(i), str(i + 1)] for i in range(0, 10, 2)]
+    assert [r.done for r in batcher.results] == [2, 4, 6, 8, 10]
+    assert all(name.startswith("gmail-write") for name in threads)
+
+
+def test_parallel_writes_stop_recording_at_the_first_failure() -> None:
+    committed: list[list[str]] = []
+
+    def write(ids: list[str]) -> None:
+        if ids[0] == "2":
+            raise RuntimeError("chunk failed")
+
+    with pytest.raises(RuntimeError):
+        with WriteBatcher(write, chunk_size=2, workers=4, on_commit=committed.append) as batcher:
+            batcher.add([str(i) for i in range(8)])
+
+    # Chunks after the failed one may have been written, but are not recorded,
+    # so a checkpoint only ever covers a contiguous prefix.
+    assert committed == [["0", "1"]]
+    assert batcher.pending == 0
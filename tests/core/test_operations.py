@@ -1,11 +1,21 @@
 from __future__ import annotations
 
+import gzip
 from unittest.mock import Mock
 
 import pytest
 
-from gmail_cleanup_core.models import QueryRequest, TrashRequest
-from gmail_cleanup_core.operations import run_query, trash_by_label
+from gmail_cleanup_core.models import ExportRequest, HistogramRequest, LabelRequest, QueryRequest, TrashRequest
+from gmail_cleanup_core.operations import apply_label, export_messages, histogram, run_query, trash_by_label
+
+
+def _pages(*sizes: int):
+    """Listing pages with sequential IDs, e.g. _pages(2, 1) -> [["m0", "m1"], ["m2"]]."""
+    pages, n = [], 0
+    for size in sizes:
+        pages.append([f"m{i}" for i in range(n, n + size)])
+        n += size
+    return pages
 
 
 def test_run_query_refuses_empty_query(monkeypatch: pytest.MonkeyPatch) -> None:
@@ -23,6 +33,64 @@ def test_trash_requires_cleanup_prefix() -> None:
         trash_by_label(TrashRequest(label="inbox", execute=True))
 
 
+def test_run_query_derives_without_attachments(monkeypatch: pytest.MonkeyPatch) -> None:
+    counted: list[str] = []
+
+    def _count(_svc, query, **_kwargs):
+        counted.append(query)
+        return 4 if query.endswith("has:attachment") else 10
+
+    monkeypatch.setattr("gmail_cleanup.preview.count_messages", _count)
+    monkeypatch.setattr("gmail_cleanup.preview.new_http_for", lambda _svc: None)
+    monkeypatch.setattr("gmail_cleanup_core.operations.count_messages", _count)
+
+    result = run_query(QueryRequest(from_="a@example.com", sample=0), service=object())
+
+    assert (result.total, result.with_attachments, result.without_attachments) == (10, 4, 6)
+    assert sorted(counted) == ["from:a@example.com", "from:a@example.com has:attachment"]
+
+
+def test_apply_label_counts_while_labeling(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[dict] = []
+
+    def _iter_pages(_svc, _query, **kwargs):
+        calls.append(kwargs)
+        return iter(_pages(3, 3, 2))
+
+    monkeypatch.setattr("gmail_cleanup_core.operations.iter_message_id_pages", _iter_pages)
+    monkeypatch.setattr("gmail_cleanup_core.operations.get_or_create_label_id", lambda _svc, _name: "L1")
+    count = Mock(side_effect=AssertionError("should not run a separate count pass"))
+    monkeypatch.setattr("gmail_cleanup_core.operations.count_messages", count)
+    label_ids = Mock()
+    monkeypatch.setattr("gmail_cleanup_core.operations.apply_label_to_messages", label_ids)
+
+    result = apply_label(LabelRequest(from_="a@example.com", limit=5), service=object())
+
+    assert len(calls) == 1
+    assert result.total_matched == 8
+    assert result.labeled == 5
+    label_ids.assert_called_once()
+    assert label_ids.call_args.args[2] == ["m0", "m1", "m2", "m3", "m4"]
+
+
+def test_export_counts_while_exporting(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        "gmail_cleanup_core.operations.iter_message_id_pages",
+        lambda _svc, _query, **_kwargs: iter(_pages(2, 2, 2)),
+    )
+    count = Mock(side_effect=AssertionError("should not run a separate count pass"))
+    monkeypatch.setattr("gmail_cleanup_core.operations.count_messages", count)
+    monkeypatch.setattr(
+        "gmail_cleanup_core.operations.fetch_message_rows",
+        lambda _svc, ids, **_kwargs: ({"id": mid} for mid in ids),
+    )
+
+    result = export_messages(ExportRequest(from_="a@example.com", limit=3), service=object())
+
+    assert result.total_matched == 6
+    assert result.exported == 3
+
+
 def test_trash_dry_run_does_not_trash(monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.setattr("gmail_cleanup_core.operations.count_messages", lambda _svc, _q: 3)
 
@@ -38,7 +106,12 @@ def test_trash_dry_run_does_not_trash(monkeypatch: pytest.MonkeyPatch) -> None:
 
 
 def test_trash_enforces_max_without_force(monkeypatch: pytest.MonkeyPatch) -> None:
-    monkeypatch.setattr("gmail_cleanup_core.operations.count_messages", lambda _svc, _q: 25)
+    monkeypatch.setattr(
+        "gmail_cleanup_core.operations.iter_message_id_pages",
+        lambda _svc, _query, **_kwargs: iter(_pages(25)),
+    )
+    trash_ids = Mock(side_effect=AssertionError("should not trash over the limit"))
+    monkeypatch.setattr("gmail_cleanup_core.operations.trash_message_ids", trash_ids)
 
     with pytest.raises(ValueError, match="without force"):
         trash_by_label(
@@ -52,10 +125,9 @@ def test_trash_enforces_max_without_force(monkeypatch: pytest.MonkeyPatch) -> No
 
 
 def test_trash_force_allows_over_max(monkeypatch: pytest.MonkeyPatch) -> None:
-    monkeypatch.setattr("gmail_cleanup_core.operations.count_messages", lambda _svc, _q: 25)
     monkeypatch.setattr(
         "gmail_cleanup_core.operations.iter_message_id_pages",
-        lambda _svc, _query, limit=0: [["a"] * limit] if limit else [],
+        lambda _svc, _query, **_kwargs: iter(_pages(25)),
     )
     trash_ids = Mock()
     monkeypatch.setattr("gmail_cleanup_core.operations.trash_message_ids", trash_ids)
@@ -73,14 +145,14 @@ def test_trash_force_allows_over_max(monkeypatch: pytest.MonkeyPatch) -> None:
 
     assert result.trashed == 5
     assert result.target_count == 5
+    assert result.total_matched == 25
     trash_ids.assert_called_once()
 
 
 def test_trash_execute_calls_batch_trash(monkeypatch: pytest.MonkeyPatch) -> None:
-    monkeypatch.setattr("gmail_cleanup_core.operations.count_messages", lambda _svc, _q: 3)
     monkeypatch.setattr(
         "gmail_cleanup_core.operations.iter_message_id_pages",
-        lambda _svc, _query, limit=0: [["a", "b"], ["c"]],
+        lambda _svc, _query, limit=0, **_kwargs: [["a", "b"], ["c"]],
     )
     trash_ids = Mock()
     monkeypatch.setattr("gmail_cleanup_core.operations.trash_message_ids", trash_ids)
@@ -93,19 +165,20 @@ def test_trash_execute_calls_batch_trash(monkeypatch: pytest.MonkeyPatch) -> Non
     assert result.dry_run is False
     assert result.trashed == 3
     assert result.target_count == 3
-    assert trash_ids.call_count == 2
+    # Listing pages are coalesced into one batchModify-sized chunk.
+    trash_ids.assert_called_once()
+    assert trash_ids.call_args.args[1] == ["a", "b", "c"]
 
 
 def test_trash_execute_respects_limit(monkeypatch: pytest.MonkeyPatch) -> None:
-    monkeypatch.setattr("gmail_cleanup_core.operations.count_messages", lambda _svc, _q: 100)
-
     captured = {}
 
-    def _iter_pages(_svc, _query, limit=0):
+    def _iter_pages(_svc, _query, limit=0, **_kwargs):
         captured["svc"] = _svc
         captured["query"] = _query
         captured["limit"] = limit
-        return iter([["a", "b"], ["c", "d"]])
+        captured["calls"] = captured.get("calls", 0) + 1
+        return iter([["a", "b"], ["c", "d"], ["e", "f"]])
 
     monkeypatch.setattr("gmail_cleanup_core.operations.iter_message_id_pages", _iter_pages)
 
@@ -118,9 +191,76 @@ def test_trash_execute_respects_limit(monkeypatch: pytest.MonkeyPatch) -> None:
         service=service,
     )
 
+    assert result.total_matched == 6
     assert result.target_count == 4
     assert result.trashed == 4
     assert captured["svc"] is service
     assert captured["query"] == "label:cleanup/candidates"
-    assert captured["limit"] == 4
-    assert trash_ids.call_count == 2
+    # One unlimited listing pass both counts and supplies the IDs to trash.
+    assert captured["limit"] == 0
+    assert captured["calls"] == 1
+    trash_ids.assert_called_once_with(service, ["a", "b", "c", "d"])
+
+
+def test_export_limit_zero_streams_every_row(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    monkeypatch.setattr(
+        "gmail_cleanup_core.operations.iter_message_id_pages",
+        lambda _svc, _query, **_kwargs: iter(_pages(2, 3)),
+    )
+    monkeypatch.setattr(
+        "gmail_cleanup_core.operations.fetch_message_rows",
+        lambda _svc, ids, **_kwargs: ({"id": mid} for mid in ids),
+    )
+    out = tmp_path / "out.ndjson"
+
+    result = export_messages(
+        ExportRequest(from_="a@example.com", limit=0, fmt="ndjson", out=out), service=object()
+    )
+
+    assert result.exported == result.total_matched == 5
+    assert out.read_text().splitlines()[-1] == '{"id": "m4"}'
+
+    with pytest.raises(ValueError, match="limit"):
+        export_messages(ExportRequest(from_="a@example.com", limit=-1), service=object())
+
+
+def test_export_compresses_by_out_extension(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    monkeypatch.setattr(
+        "gmail_cleanup_core.operations.iter_message_id_pages",
+        lambda _svc, _query, **_kwargs: iter(_pages(2)),
+    )
+    monkeypatch.setattr(
+        "gmail_cleanup_core.operations.fetch_message_rows",
+        lambda _svc, ids, **_kwargs: ({"id": mid} for mid in ids),
+    )
+    out = tmp_path / "out.csv.gz"
+
+    result = export_messages(ExportRequest(from_="a@example.com", out=out), service=object())
+
+    assert result.compress == "gzip"
+    assert gzip.decompress(out.read_bytes()).decode().splitlines()[1:] == ["m0,,,,", "m1,,,,"]
+
+
+def test_histogram_reports_estimated_buckets(monkeypatch: pytest.MonkeyPatch) -> None:
+    estimated: list[str] = []
+
+    def _estimate(_svc, query, http=None):
+        estimated.append(query)
+        return 0 if "larger:" in query else 7
+
+    monkeypatch.setattr("gmail_cleanup.histogram.estimate_messages", _estimate)
+
+    result = histogram(HistogramRequest(from_="a@example.com", by="size", workers=2), service=object())
+
+    assert (result.query, result.by, result.total) == ("from:a@example.com", "size", 7)
+    assert result.calls == len(estimated)
+    # Every match sits below 10 KB, so that bucket is bisected down to the minimum width.
+    assert result.buckets[0] == {
+        "lo": 0,
+        "hi": 1280,
+        "estimate": 7,
+        "query": "from:a@example.com smaller:1280",
+    }
+
+    with pytest.raises(ValueError, match="by must be"):
+        histogram(HistogramRequest(from_="a@example.com", by="label"), service=object())